@@ -0,0 +1,152 @@
+"""
+Find the fastest inference configuration of this machine.
+
+Every available engine, model (original and INT8 if quantize.py was run),
+input size, thread count and latency/throughput hint is benchmarked on sample
+frames. The configuration with the most frames per second whose p95 latency is
+under the ceiling is written to the tuning cache, keyed by the CPU model, the
+runtime version and the hash of the chosen model, and loaded at startup when
+use_tuned_config is set at constants.py.
+
+usage: python autotune.py [recording] [--ceiling 60] [--sizes 384x640 320x544]
+"""
+
+import os
+import argparse
+import numpy as np
+from time import perf_counter
+from threading import Lock, Event
+from constants import Constants
+from modules.backends import create_backend
+from modules.preprocess import Letterbox
+from modules.postprocess import YoloPostprocessor
+from modules.replaycapture import iter_recording
+from modules.tuning import save_tuned_config
+from modules.print import bcolors
+
+def load_frames(recording, count):
+    """
+    sample frames of a recording, random frames if there is none
+    """
+    frames = []
+    if recording:
+        for frame in iter_recording(recording, step=10):
+            frames.append(frame)
+            if len(frames) == count:
+                break
+    if not frames:
+        rng = np.random.default_rng(0)
+        frames = [rng.integers(0, 256, (720, 1280, 3), dtype=np.uint8) for _ in range(count)]
+    return frames
+
+def candidates(sizes, cores):
+    """
+    :return: list of engine, model_path, imgsz, options and async_requests
+    """
+    configs = []
+    threads = sorted({0, cores, max(cores//2, 1)})
+    openvino_models = [Constants.openvino_model_path]
+    if os.path.isdir(Constants.quantized_model_path):
+        openvino_models.append(Constants.quantized_model_path)
+    for model_path in openvino_models:
+        for imgsz in sizes:
+            for count in threads:
+                config = {"PERFORMANCE_HINT": "LATENCY"}
+                if count:
+                    config["INFERENCE_NUM_THREADS"] = str(count)
+                configs.append(("openvino", model_path, imgsz, {"config": config}, 0))
+            for streams in (2, 4):
+                config = {"PERFORMANCE_HINT": "THROUGHPUT", "NUM_STREAMS": str(streams)}
+                configs.append(("openvino", model_path, imgsz, {"config": config}, streams))
+    # the onnx model is exported with a fixed input size
+    onnx_path = "yolov8_model/yolov8.onnx"
+    if os.path.exists(onnx_path):
+        for engine in ("onnxruntime", "opencv"):
+            for count in threads:
+                configs.append((engine, onnx_path, Constants.imgsz, {"threads": count}, 0))
+    else:
+        print(bcolors.WARNING + f"{onnx_path} not found, the onnxruntime and opencv engines are skipped. "
+              "\nRun python export_onnx.py to create it" + bcolors.ENDC)
+    return configs
+
+def benchmark(engine, frames, async_requests, runs):
+    """
+    time preprocessing, inference and postprocessing of every frame
+
+    :return: frames per second and p95 latency in ms
+    """
+    letterbox = Letterbox((frames[0].shape[1], frames[0].shape[0]), engine.imgsz)
+    postprocessor = YoloPostprocessor(Constants.threshold)
+    if async_requests == 0:
+        for frame in frames[:5]:
+            postprocessor(engine.infer(letterbox.preprocess(frame)))
+        latencies = []
+        start = perf_counter()
+        for i in range(runs):
+            frame_start = perf_counter()
+            postprocessor(engine.infer(letterbox.preprocess(frames[i % len(frames)])))
+            latencies.append(perf_counter() - frame_start)
+        elapsed = perf_counter() - start
+        return runs/elapsed, 1000*np.percentile(latencies, 95)
+
+    tensors = [letterbox.new_tensor() for _ in range(async_requests)]
+    outputs = [postprocessor.new_output() for _ in range(async_requests)]
+    submitted = {}
+    latencies = []
+    lock = Lock()
+    done = Event()
+    def complete(output, userdata):
+        job, i = userdata
+        postprocessor(output, outputs[job])
+        lock.acquire()
+        latencies.append(perf_counter() - submitted[i])
+        if len(latencies) == runs:
+            done.set()
+        lock.release()
+    engine.start_async(tensors, complete)
+    start = perf_counter()
+    for i in range(runs):
+        job = engine.idle_job()
+        letterbox.preprocess(frames[i % len(frames)], tensors[job])
+        submitted[i] = perf_counter()
+        engine.submit((job, i))
+    engine.wait_all()
+    done.wait(timeout=10)
+    elapsed = perf_counter() - start
+    return runs/elapsed, 1000*np.percentile(latencies, 95)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the fastest inference configuration of this machine")
+    parser.add_argument("recording", nargs="?", help="session directory, video, image directory or .npy stack")
+    parser.add_argument("--ceiling", type=float, default=60, help="maximum p95 latency in ms")
+    parser.add_argument("--sizes", nargs="+", default=["384x640"], help="input sizes to try, height x width")
+    parser.add_argument("--runs", type=int, default=100, help="frames per configuration")
+    args = parser.parse_args()
+
+    sizes = [tuple(int(size) for size in text.split("x")) for text in args.sizes]
+    frames = load_frames(args.recording, 20)
+    best = None
+    best_fps = 0
+    for engine_name, model_path, imgsz, options, async_requests in candidates(sizes, os.cpu_count() or 1):
+        name = f"{engine_name} {os.path.basename(model_path)} {imgsz} {options} async={async_requests}"
+        try:
+            engine = create_backend(engine_name, model_path, imgsz=imgsz, **options)
+            fps, latency = benchmark(engine, frames, async_requests, args.runs)
+        except Exception as e:
+            print(bcolors.WARNING + f"{name}: skipped ({e})" + bcolors.ENDC)
+            continue
+        within = latency <= args.ceiling
+        print((bcolors.OKGREEN if within else bcolors.FAIL) + f"{name}: {fps:.1f} FPS, p95 {latency:.1f} ms" + bcolors.ENDC)
+        if within and fps > best_fps:
+            best_fps = fps
+            best = {"engine": engine_name, "model_path": model_path, "imgsz": list(imgsz),
+                    "options": options, "async_requests": async_requests,
+                    "fps": round(fps, 2), "p95_ms": round(latency, 2)}
+        del engine
+
+    if best is None:
+        raise Exception(f"No configuration has a p95 latency under {args.ceiling} ms")
+    key = save_tuned_config(Constants.tuning_cache_path, best)
+    print(bcolors.OKGREEN + f"Saved {best} for {key} at {Constants.tuning_cache_path}" + bcolors.ENDC)
+    if not Constants.use_tuned_config:
+        print("Set use_tuned_config = True at constants.py to use it")
@@ -0,0 +1,154 @@
+"""
+Measure the accuracy and the speed of the detection on labeled frames.
+
+The detector is built with the settings of constants.py and run on every frame
+of a YOLO format dataset (images/ and labels/). The report has the per class
+precision and recall at the configured thresholds, AP50 and AP50-95, and the
+p50/p95/p99 latency of preprocessing, inference and post-processing, written
+as json so runs on other machines or models can be compared.
+
+With --cache the candidates down to a 0.001 confidence floor are saved with
+their label matches, threshold_sweep.py then tunes the class thresholds from
+the cache without running the model again.
+
+usage: python benchmark.py dataset [--output benchmark.json] [--cache predictions.npz]
+"""
+
+import os
+import json
+import argparse
+import platform
+import numpy as np
+from itertools import islice
+from time import perf_counter
+from datetime import datetime
+from constants import Constants
+from modules.detection import Detection
+from modules.dataset import list_dataset, iter_dataset
+from modules.postprocess import YoloPostprocessor
+from modules.metrics import match_thresholds, evaluate, IOU_THRESHOLDS
+from modules.predictioncache import PredictionCache
+from modules.tuning import cpu_model, model_hash
+from modules.print import bcolors
+
+# confidence floor of the predictions used for the AP
+CONFIDENCE_FLOOR = 0.001
+
+def predict_stages(detector, floor, screenshot):
+    """
+    run the detector on a screenshot and time each stage
+
+    :return: boxes at the confidence floor, their class scores (None if unknown),
+             results kept by the detector and the latency of each stage in ms
+    """
+    if detector.engine is not None and not detector.cascade:
+        start = perf_counter()
+        tensor = detector.prepare(screenshot)
+        prepared = perf_counter()
+        output = detector.engine.infer(tensor)
+        inferred = perf_counter()
+        kept = detector.to_window(detector.postprocessor(output)).copy()
+        results = detector.build_results(kept)[0]
+        done = perf_counter()
+        candidates = detector.letterbox.to_window(floor(output)).copy()
+        scores = output[0][4:, floor.anchors].T
+        candidates = detector.region.to_window(candidates)
+        keep = detector.region.keep(candidates)
+        return candidates[keep], scores[keep], results, {"preprocess": 1000*(prepared - start), "inference": 1000*(inferred - prepared),
+                                     "postprocess": 1000*(done - inferred), "total": 1000*(done - start)}
+    if detector.engine is None:
+        # ultralytics times its own stages
+        if not Constants.fused_preprocess:
+            prediction = detector.model.predict(detector.region.crop(screenshot), imgsz=Constants.imgsz,
+                                                conf=CONFIDENCE_FLOOR, half=Constants.half, verbose=False)[0]
+            candidates = detector.region.filter(detector.region.to_window(prediction.boxes.data.cpu().numpy()))
+            stages = dict(prediction.speed)
+        else:
+            # same path as Detection.predict, the letterbox is timed as the preprocessing
+            start = perf_counter()
+            tensor = detector.torch.from_numpy(detector.prepare(screenshot))
+            prepared = perf_counter()
+            prediction = detector.model.predict(tensor, imgsz=Constants.imgsz, conf=CONFIDENCE_FLOOR,
+                                                half=Constants.half, verbose=False)[0]
+            candidates = detector.to_window(prediction.boxes.data.cpu().numpy())
+            stages = dict(prediction.speed)
+            stages["preprocess"] += 1000*(prepared - start)
+        start = perf_counter()
+        results = detector.build_results(candidates)[0]
+        stages["postprocess"] += 1000*(perf_counter() - start)
+        stages["total"] = sum(stages.values())
+        return candidates, None, results, stages
+    # the cascade runs two dependent passes, only the total is timed
+    start = perf_counter()
+    kept = detector.predict(screenshot).copy()
+    results = detector.build_results(kept)[0]
+    stages = {"total": 1000*(perf_counter() - start)}
+    return kept, None, results, stages
+
+def latency_report(latencies):
+    return {stage: {"p50": round(float(np.percentile(values, 50)), 3),
+                    "p95": round(float(np.percentile(values, 95)), 3),
+                    "p99": round(float(np.percentile(values, 99)), 3),
+                    "mean": round(float(np.mean(values)), 3)}
+            for stage, values in latencies.items()}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the detection on labeled frames")
+    parser.add_argument("dataset", help="YOLO format dataset directory")
+    parser.add_argument("--output", help="json file of the report, printed if not set")
+    parser.add_argument("--cache", help="npz file to save the candidates to for threshold_sweep.py")
+    parser.add_argument("--warmup", type=int, default=5, help="frames run before timing")
+    args = parser.parse_args()
+
+    frames = list_dataset(args.dataset)
+    first = next(iter_dataset(args.dataset))[1]
+    windowSize = (first.shape[1], first.shape[0])
+    detector = Detection(windowSize, Constants.model_file_path, Constants.classes, Constants.heightScaleFactor)
+    # the tracker and the static frame check do not apply to unrelated frames
+    detector.tracker = None
+    floor = YoloPostprocessor([CONFIDENCE_FLOOR]*len(Constants.classes))
+    cache = None
+    if args.cache:
+        cache = PredictionCache(Constants.classes, IOU_THRESHOLDS, CONFIDENCE_FLOOR,
+                                {"model_hash": model_hash(Constants.model_file_path), "dataset": args.dataset})
+
+    for _, image, _ in islice(iter_dataset(args.dataset, windowSize), args.warmup):
+        predict_stages(detector, floor, image)
+
+    confidences, classes, matches, target_classes = [], [], [], []
+    latencies = {}
+    kept_count = 0
+    for _, image, labels in iter_dataset(args.dataset, windowSize):
+        candidates, scores, results, stages = predict_stages(detector, floor, image)
+        for stage, value in stages.items():
+            latencies.setdefault(stage, []).append(value)
+        tp = match_thresholds(candidates, labels)
+        if cache is not None:
+            cache.append(candidates, tp, labels, scores)
+        confidences.append(candidates[:, 4])
+        classes.append(candidates[:, 5].astype(np.int64))
+        matches.append(tp)
+        target_classes.append(labels[:, 4].astype(np.int64))
+        kept_count += len(results.classes)
+
+    report = evaluate(np.concatenate(confidences), np.concatenate(classes), np.concatenate(matches),
+                      np.concatenate(target_classes), Constants.classes, Constants.threshold)
+    report = {"date": datetime.now().isoformat(timespec="seconds"),
+              "machine": {"cpu": cpu_model(), "platform": platform.platform(), "cores": os.cpu_count()},
+              "model": {"path": Constants.model_file_path, "hash": model_hash(Constants.model_file_path),
+                        "engine": type(detector.engine).__name__ if detector.engine is not None else "ultralytics",
+                        "imgsz": list(detector.imgsz) if not isinstance(detector.imgsz, int) else detector.imgsz},
+              "dataset": {"path": args.dataset, "frames": len(frames), "detections": kept_count},
+              **report,
+              "latency_ms": latency_report(latencies)}
+
+    if cache is not None:
+        cache.save(args.cache)
+        print(bcolors.OKGREEN + f"Candidates saved at {args.cache}" + bcolors.ENDC)
+    text = json.dumps(report, indent=1)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text)
+        print(bcolors.OKGREEN + f"Benchmark saved at {args.output}" + bcolors.ENDC)
+    else:
+        print(text)
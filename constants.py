@@ -40,6 +40,42 @@ class Constants:
     window_name = "Bluestacks App Player"
     # Make this False if detection_test is outputting a blank screen, otherwise True.
     focused_window = False
+    """
+    multi_window: run a bot on every window whose name starts with window_name
+    (up to max_windows) with one model, the frames of all the windows go through
+    the model as one batch. The bots share the mouse and keyboard.
+    To exit, move the cursor to the top left corner of the screen.
+    """
+    multi_window = False
+    max_windows = 4
+
+    #! Frame source
+    """
+    "window" captures the bluestacks window, "x11" captures the window called
+    window_name on a Linux X server (x11_display e.g. ":99", None uses $DISPLAY)
+    through shared memory, "stream" decodes an H.264 stream pushed by the emulator
+    to stream_address (needs ffmpeg, frames are scaled to stream_size and
+    stream_offsets is the screen position of the emulator), "replay" plays back a recording
+    (video file, directory of PNGs or a .npy stack) located at replay_path.
+    replay_realtime plays the recording at its recorded pace (replay_fps, or the
+    video's own rate), otherwise frames are delivered as fast as possible.
+    replay_lockstep gives the next frame only once the detection of the last one
+    reached the bot, so every frame is detected and a replay is reproducible
+    (replay_realtime is ignored). A replay sends no inputs and only shows the
+    DEBUG window if there is a display, so it also runs on a headless server.
+    """
+    capture_backend = "window"
+    x11_display = None
+    stream_address = "tcp://127.0.0.1:27183?listen=1"
+    stream_size = (1280,720)
+    stream_offsets = (0,0)
+    replay_path = "recordings/gameplay.mp4"
+    replay_realtime = True
+    replay_fps = None
+    replay_loop = False
+    replay_lockstep = False
+    # number of preallocated frames the capture thread cycles through
+    ring_slots = 4
 
     #! Change this to True if you have Nvidia graphics card and CUDA installed
     nvidia_gpu = False
@@ -50,6 +86,125 @@ class Constants:
     """
     DEBUG = False
 
+    #! Session recording
+    """
+    Record the frames, detections, state transitions and actions of
+    the bot to record_directory (main.py only)
+    """
+    record_session = False
+    record_directory = "recordings"
+
+    #! Detection
+    """
+    Skip inference while the scene is static (menus, loading and end screens)
+    and republish the last results flagged as reused. change_threshold is the
+    luminance difference (0-255) of any of the 32x18 blocks of the frame that
+    counts as a change, the model still runs at least every max_reuse_time
+    seconds. Off by default, a still player could miss an enemy for up to
+    max_reuse_time.
+    """
+    skip_static_frames = False
+    change_threshold = 6.0
+    max_reuse_time = 1.0
+    # Letterbox frames straight into a reused input tensor instead of letting ultralytics do it
+    fused_preprocess = True
+    # Run the model in a separate process so it does not slow down the bot (main.py only)
+    detection_process = False
+    """
+    inference_server: send the frames to inference_server.py instead of
+    loading the model, so the bots of several main.py share one model.
+    The server batches the frames that arrive within server_max_wait seconds,
+    up to server_max_batch frames. server_address is the Unix socket (named pipe
+    on Windows) of the server, None uses the default one.
+    """
+    inference_server = False
+    server_address = None
+    server_max_batch = 4
+    server_max_wait = 0.005
+    """
+    inference_engine: "ultralytics", "openvino", "onnxruntime" or "opencv"
+    The last three run the exported model directly without importing
+    ultralytics or torch: "openvino" loads the OpenVINO model, "onnxruntime"
+    and "opencv" (cv2.dnn) load yolov8_model/yolov8.onnx, created from the
+    weights with python export_onnx.py. Which one is the fastest depends on
+    the CPU.
+    """
+    inference_engine = "ultralytics"
+    """
+    async_requests: number of frames in flight with the openvino engine
+    Frames are submitted without waiting for the previous results, every
+    result is published with the id of its frame and results older than the
+    ones already published are dropped. 0 runs one frame at a time.
+    """
+    async_requests = 0
+    # Load the INT8 OpenVINO model made by quantize.py (openvino model only)
+    quantized_model = False
+    """
+    use_tuned_config: use the inference configuration autotune.py measured
+    on this machine (engine, model, input size, threads, ...) instead of the
+    settings above, every replaced setting is printed at startup. Run
+    python autotune.py once per machine to create the tuning_cache_path file.
+    """
+    use_tuned_config = False
+    tuning_cache_path = "tuning_cache.json"
+    """
+    cascade: run the model on the whole frame at cascade_imgsz, then at native
+    resolution on a crop of the frame around the player, and merge both.
+    Finds small and distant objects for less than a high resolution pass.
+    Needs the openvino inference_engine, the only one that can run the model
+    at another input size, the other engines run a single pass.
+    """
+    cascade = False
+    cascade_imgsz = (256,416)
+    """
+    hud_masking: run the model without the HUD
+    hud_crop is the fraction of the window removed at the left, top, right
+    and bottom before inference, hud_masks are x1, y1, x2, y2 fractions of
+    the window hidden from the model (joystick, attack buttons, kill counter).
+    Detections on the HUD are dropped. hud_profiles overrides both for a
+    window size e.g. {(1600,900): ((0,0.05,0,0.03), [(0,0.6,0.22,1)])}.
+    """
+    hud_masking = False
+    hud_crop = (0,0.05,0,0.03)
+    hud_masks = [
+        (0,0.62,0.22,1), # joystick
+        (0.74,0.58,1,1), # attack, super and gadget buttons
+        (0.9,0.1,1,0.24), # kill counter
+    ]
+    hud_profiles = {}
+    """
+    tracking: give every detection a stable id and a velocity (results.tracks)
+    A track is kept for track_max_age seconds without detection and follows
+    detections up to track_max_distance (fraction of the window width) away.
+    """
+    tracking = False
+    track_max_age = 0.5
+    track_max_distance = 0.06
+
+    #! Frame rate governor
+    """
+    Pace the capture and the detection from the state of the bot (main.py only)
+    governor_rates are the capture and inference fps of each bot state, of the
+    menus (bot stopped) and of the loading screen, None does not pace.
+    cpu_budget is the number of cores the bot may use, every rate is scaled
+    down while it is exceeded: the rates of a state not under governor_min_scale
+    of them, the unpaced states (None) from the rate they reach unpaced but not
+    under governor_min_fps.
+    """
+    frame_governor = False
+    governor_rates = {
+        "INITIALIZING": (15, 10),
+        "SEARCHING": (30, 20),
+        "MOVING": (None, None),
+        "ATTACKING": (None, None),
+        "HIDING": (10, 5),
+        "MENU": (4, 2),
+        "LOAD": (2, 1),
+    }
+    cpu_budget = None
+    governor_min_fps = 10
+    governor_min_scale = 0.25
+
     #! Do not change these
     # Detector constants
     classes = ["Player","Bush","Enemy","Cubebox"]
@@ -98,6 +253,17 @@ class Constants:
         model_file_path = "yolov8_model/yolov8_openvino_model"
         half = True
         imgsz = (384,640)
+    openvino_model_path = "yolov8_model/yolov8_openvino_model"
+    quantized_model_path = "yolov8_model/yolov8_int8_openvino_model"
+    # models of the engines that do not go through ultralytics
+    if inference_engine == "openvino":
+        model_file_path = openvino_model_path
+        imgsz = (384,640)
+    elif inference_engine in ("onnxruntime", "opencv"):
+        model_file_path = "yolov8_model/yolov8.onnx"
+        imgsz = (384,640)
+    if quantized_model and model_file_path == openvino_model_path:
+        model_file_path = quantized_model_path
     #bot constant
     movement_key = "middle"
     midpoint_offset = 12
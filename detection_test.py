@@ -1,10 +1,10 @@
 import cv2 as cv
 from time import sleep
-from modules.windowcapture import WindowCapture
+from modules.framesource import create_frame_source
 from modules.detection import Detection
 from constants import Constants
 
-wincap = WindowCapture(Constants.window_name)
+wincap = create_frame_source()
 # get window dimension
 windowSize = wincap.get_dimension()
 # set target window as foreground
@@ -21,11 +21,18 @@ print(f"Resolution: {wincap.screen_resolution}")
 print(f"Window Size: {windowSize}")
 print(f"Scaling: {wincap.scaling*100}%")
 
+version = 0
 while(True):
-    screenshot = wincap.screenshot
-    if screenshot is None:
+    if wincap.finished:
+        print(f"Replay finished - Wincap: {round(wincap.avg_fps,2)} FPS, Detect: {round(detector.avg_fps,2)} FPS")
+        detector.stop()
+        cv.destroyAllWindows()
+        break
+    # wait for a new frame
+    version, frame = wincap.frames.wait(version, timeout=0.1)
+    if frame is None:
         continue
-    detector.update(screenshot)
+    detector.update(frame.image, frame)
     detector.annotate_detection_midpoint()
     detector.annotate_fps(wincap.avg_fps)
     cv.imshow("Detection test",detector.screenshot)
@@ -0,0 +1,36 @@
+"""
+Export the YOLOv8 weights to the ONNX model used by the "onnxruntime" and
+"opencv" inference engines (yolov8_model/yolov8.onnx).
+
+The model is exported with a fixed input size, the imgsz of constants.py
+unless --imgsz is given. Run it again after changing the input size.
+
+usage: python export_onnx.py [--weights yolov8_model/yolov8.pt] [--imgsz 384 640]
+requires: pip install ultralytics onnx
+"""
+
+import os
+import shutil
+import argparse
+from constants import Constants
+from modules.print import bcolors
+
+ONNX_MODEL_PATH = "yolov8_model/yolov8.onnx"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the YOLOv8 weights to ONNX")
+    parser.add_argument("--weights", default="yolov8_model/yolov8.pt", help="ultralytics weights to export")
+    parser.add_argument("--imgsz", type=int, nargs=2, default=None, help="input height and width")
+    parser.add_argument("--opset", type=int, default=12, help="ONNX opset, cv2.dnn needs 12 or lower")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.weights):
+        raise Exception(f"{args.weights} not found. \nPlease copy the YOLOv8 weights (.pt) into yolov8_model")
+    imgsz = tuple(args.imgsz) if args.imgsz else Constants.imgsz
+
+    from ultralytics import YOLO
+    exported = YOLO(args.weights, task="detect").export(format="onnx", imgsz=imgsz, opset=args.opset,
+                                                          dynamic=False, simplify=False)
+    if os.path.abspath(exported) != os.path.abspath(ONNX_MODEL_PATH):
+        shutil.move(exported, ONNX_MODEL_PATH)
+    print(bcolors.OKGREEN + f"ONNX model saved at {ONNX_MODEL_PATH} with input size {imgsz}" + bcolors.ENDC)
@@ -0,0 +1,23 @@
+"""
+Load the model once and serve the bots of several main.py processes.
+Set inference_server = True at constants.py for the bots to use it, the
+batching policy is set with server_max_batch and server_max_wait.
+
+usage: python inference_server.py
+"""
+
+from time import sleep
+from threading import Thread
+from constants import Constants
+from modules.inferenceserver import InferenceServer
+
+if __name__ == "__main__":
+    server = InferenceServer(Constants.model_file_path, Constants.server_address,
+                             Constants.server_max_batch, Constants.server_max_wait)
+    t = Thread(target=server.serve_forever, daemon=True)
+    t.start()
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
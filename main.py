@@ -1,15 +1,25 @@
 import cv2 as cv
 from time import time,sleep
-from modules.windowcapture import WindowCapture
+from modules.framesource import create_frame_source
 from modules.bot import Brawlbot, BotState
 from modules.screendetect import Screendetect, Detectstate
 from modules.detection import Detection
+from modules.detectionprocess import DetectionProcess
+from modules.batchdetection import BatchDetection
+from modules.detectionclient import DetectionClient
+from modules.regionprobe import RegionProbe
+from modules.recorder import SessionRecorder, hook_pyautogui
+from modules.channel import Listener
+from modules.governor import FrameGovernor
 from modules.print import bcolors
-import pyautogui as py
+from modules.inputs import py, has_display
 import os
 from constants import Constants
 
-def stop_all_thread(wincap,screendetect,bot,detector):
+# the debug window needs a display, a replay can run without one
+show_window = Constants.DEBUG and has_display()
+
+def stop_all_thread(wincap,screendetect,bot,detector,recorder=None):
     """
     stop all thread from running
     """
@@ -18,7 +28,18 @@ def stop_all_thread(wincap,screendetect,bot,detector):
     detector.stop()
     screendetect.stop()
     bot.stop()
-    cv.destroyAllWindows()
+    if recorder:
+        recorder.stop()
+    if show_window:
+        cv.destroyAllWindows()
+
+def wait_key():
+    """
+    :return (int): key pressed in the debug window, -1 without window
+    """
+    if show_window:
+        return cv.waitKey(1)
+    return -1
 
 def add_two_tuple(tup1,tup2):
     """
@@ -27,21 +48,144 @@ def add_two_tuple(tup1,tup2):
     if not(tup1 is None or tup2 is None):
         return tuple(map(sum, zip(tup1, tup2)))
 
+def update_bot(bot,detector,wincap,screenshot):
+    """
+    give the bot what its state needs from the detection
+    """
+    if bot.state == BotState.INITIALIZING:
+        bot.update_results(detector.results)
+    elif bot.state == BotState.SEARCHING:
+        bot.update_results(detector.results)
+    elif bot.state == BotState.MOVING:
+        bot.update_screenshot(screenshot)
+        bot.update_results(detector.results)
+    elif bot.state == BotState.HIDING:
+        bot.update_results(detector.results)
+        bot.update_player(add_two_tuple(detector.player_topleft,wincap.offsets)
+                          ,add_two_tuple(detector.player_bottomright,wincap.offsets))
+    elif bot.state == BotState.ATTACKING:
+        bot.update_results(detector.results)
+
+def check_screendetect(screendetect,bot):
+    """
+    stop or start the bot with the screendetect state
+    """
+    if (screendetect.state ==  Detectstate.EXIT
+        or screendetect.state ==  Detectstate.PLAY_AGAIN
+        or screendetect.state ==  Detectstate.CONNECTION
+        or screendetect.state ==  Detectstate.PLAY
+        or screendetect.state == Detectstate.PROCEED):
+        py.mouseUp(button = Constants.movement_key)
+        bot.stop()
+    elif screendetect.state ==  Detectstate.LOAD:
+        if bot.stopped:
+            #wait for game to load
+            sleep(4)
+            print("starting bot")
+            # reset timestamp and state
+            bot.timestamp = time()
+            bot.state = BotState.INITIALIZING
+            bot.start()
+
+def main_multi():
+    """
+    run a bot on every bluestacks window with one batched model
+    """
+    from modules.windowcapture import WindowCapture
+    windows = WindowCapture.find_windows(Constants.window_name)[:Constants.max_windows]
+    if not windows:
+        raise Exception(f"No window starting with {Constants.window_name} found. \nPlease change the window_name at constants.py")
+    wincaps = [WindowCapture(hwnd=hwnd) for hwnd, _ in windows]
+    windowSizes = [wincap.get_dimension() for wincap in wincaps]
+    batch = BatchDetection(windowSizes,Constants.model_file_path,Constants.classes,Constants.heightScaleFactor)
+    detectors = batch.instances
+    screendetects = [Screendetect(windowSize,wincap.offsets,RegionProbe(wincap))
+                     for windowSize, wincap in zip(windowSizes, wincaps)]
+    bots = [Brawlbot(windowSize, wincap.offsets, Constants.speed, Constants.attack_range, RegionProbe(wincap))
+            for windowSize, wincap in zip(windowSizes, wincaps)]
+    instances = list(zip(wincaps, detectors, screendetects, bots))
+
+    for wincap in wincaps:
+        wincap.start()
+    batch.start()
+    for screendetect in screendetects:
+        screendetect.start()
+    for (_, title), windowSize in zip(windows, windowSizes):
+        print(f"{title}: {windowSize}")
+
+    # 4 channels per window: frames, detections, screendetect and bot states
+    listener = Listener(*[channel for wincap, detector, screendetect, bot in instances
+                          for channel in (wincap.frames, detector.detections, screendetect.states, bot.states)])
+    while True:
+        changed = listener.wait(timeout=0.1)
+        for i, (wincap, detector, screendetect, bot) in enumerate(instances):
+            new_frame, new_results, _, new_bot_state = changed[4*i:4*i + 4]
+            frame = wincap.get_frame()
+            if frame is None:
+                continue
+            if new_frame:
+                detector.update(frame.image, frame)
+            screendetect.update_bot_stop(bot.stopped)
+            if new_results or new_bot_state:
+                update_bot(bot,detector,wincap,frame.image)
+            check_screendetect(screendetect,bot)
+            if show_window and detector.screenshot is not None:
+                detector.annotate_detection_midpoint()
+                detector.annotate_fps(wincap.avg_fps)
+                cv.imshow(f"Brawl Stars Bot {i}",detector.screenshot)
+
+        key = wait_key()
+        x_mouse, y_mouse = py.position()
+        if key == ord('q') or (x_mouse <= 1 and y_mouse <= 1):
+            break
+    print(bcolors.WARNING +'Cursor currently on the top left corner, exiting bot...' +bcolors.ENDC)
+    listener.close()
+    for wincap, detector, screendetect, bot in instances:
+        stop_all_thread(wincap,screendetect,bot,detector)
+    batch.stop()
+
 def main():
-    # initialize the WindowCapture class
-    wincap = WindowCapture(Constants.window_name)
+    if Constants.multi_window:
+        return main_multi()
+    # initialize the frame source (window capture or replay)
+    wincap = create_frame_source()
     # get window dimension
     windowSize = wincap.get_dimension()
     # set target window as foreground
     sleep(0.5)
     wincap.set_window()
 
-    # initialize detection class
-    detector = Detection(windowSize,Constants.model_file_path,Constants.classes,Constants.heightScaleFactor)
-    # initialize screendectect class
-    screendetect = Screendetect(windowSize,wincap.offsets)
+    # initialize detection class, optionally running the model in its own process or in the inference server
+    if Constants.inference_server:
+        detector = DetectionClient(windowSize,Constants.model_file_path,Constants.classes,Constants.heightScaleFactor,
+                                   Constants.server_address)
+    elif Constants.detection_process:
+        detector = DetectionProcess(windowSize,Constants.model_file_path,Constants.classes,Constants.heightScaleFactor)
+    else:
+        detector = Detection(windowSize,Constants.model_file_path,Constants.classes,Constants.heightScaleFactor)
+    # initialize screendectect class, the probe grabs all of its pixels at once
+    screendetect = Screendetect(windowSize,wincap.offsets,RegionProbe(wincap))
     # initialize bot class
-    bot = Brawlbot(windowSize, wincap.offsets, Constants.speed, Constants.attack_range)
+    bot = Brawlbot(windowSize, wincap.offsets, Constants.speed, Constants.attack_range, RegionProbe(wincap))
+    
+    # record the frames, detections, states and actions of the session
+    recorder = None
+    if Constants.record_session:
+        recorder = SessionRecorder(Constants.record_directory, windowSize)
+        wincap.recorder = recorder
+        detector.recorder = recorder
+        screendetect.recorder = recorder
+        bot.recorder = recorder
+        hook_pyautogui(recorder)
+        recorder.start()
+    
+    # pace the capture and the detection with the state of the bot
+    governor = None
+    if Constants.frame_governor:
+        governor = FrameGovernor(Constants.governor_rates, Constants.cpu_budget, Constants.governor_min_fps,
+                                 Constants.governor_min_scale)
+        wincap.governor = governor
+        detector.governor = governor
     
     # move cursor to the middle of bluestacks
     middle_of_window = (int(wincap.w/2+wincap.offset_x),int(wincap.h/2+wincap.offset_y))
@@ -60,55 +204,49 @@ def main():
     if aspect_ratio > 1.79:
         print(bcolors.WARNING + "Please make sure to disable ads on bluestack and close the right sidebar for the bot to work as intended." + bcolors.ENDC)
 
+    # wake the main loop only when a frame, detection results or a state is published
+    listener = Listener(wincap.frames, detector.detections, screendetect.states, bot.states)
     while True:
-        screenshot = wincap.screenshot
-        if screenshot is None:
+        if wincap.finished:
+            # the replay has no frames left, or e.g. the stream was closed
+            if Constants.capture_backend == "replay":
+                reason = "Replay finished"
+            else:
+                reason = f"The {Constants.capture_backend} capture stopped giving frames"
+            print(bcolors.WARNING + f"{reason}, detection averaged {round(detector.avg_fps,2)} FPS, exiting bot..." + bcolors.ENDC)
+            stop_all_thread(wincap,screendetect,bot,detector,recorder)
+            return
+        new_frame, new_results, _, new_bot_state = listener.wait(timeout=0.1)
+        frame = wincap.get_frame()
+        if frame is None:
             continue
+        screenshot = frame.image
         # update screenshot for dectector
-        detector.update(screenshot)
+        if new_frame:
+            detector.update(screenshot, frame)
         screendetect.update_bot_stop(bot.stopped)
         # check bot state
-        if bot.state == BotState.INITIALIZING:
-            bot.update_results(detector.results)
-        elif bot.state == BotState.SEARCHING:
-            bot.update_results(detector.results)
-        elif bot.state == BotState.MOVING:
-            bot.update_screenshot(screenshot)
-            bot.update_results(detector.results)
-        elif bot.state == BotState.HIDING:
-            bot.update_results(detector.results)
-            bot.update_player(add_two_tuple(detector.player_topleft,wincap.offsets)
-                              ,add_two_tuple(detector.player_bottomright,wincap.offsets))
-        elif bot.state == BotState.ATTACKING:
-            bot.update_results(detector.results)
+        if new_results or new_bot_state:
+            update_bot(bot,detector,wincap,screenshot)
+        if new_results:
+            # in lockstep the next frame is captured once the bot has the results of this one
+            wincap.consume(detector.frame_id)
 
+        # set the frame rates before the bot waits for the game to load
+        if governor:
+            governor.update(bot,screendetect)
         # check screendetect state
-        if (screendetect.state ==  Detectstate.EXIT
-            or screendetect.state ==  Detectstate.PLAY_AGAIN
-            or screendetect.state ==  Detectstate.CONNECTION
-            or screendetect.state ==  Detectstate.PLAY
-            or screendetect.state == Detectstate.PROCEED):
-            py.mouseUp(button = Constants.movement_key)
-            bot.stop()
-        elif screendetect.state ==  Detectstate.LOAD:
-            if bot.stopped:
-                #wait for game to load
-                sleep(4)
-                print("starting bot")
-                # reset timestamp and state
-                bot.timestamp = time()
-                bot.state = BotState.INITIALIZING
-                bot.start()
+        check_screendetect(screendetect,bot)
 
         # display annotated window with FPS
-        if Constants.DEBUG:
+        if show_window:
             detector.annotate_detection_midpoint()
             detector.annotate_border(bot.border_size,bot.tile_w,bot.tile_h)
             detector.annotate_fps(wincap.avg_fps)
             cv.imshow("Brawl Stars Bot",detector.screenshot)
 
         # Press q to exit the script
-        key = cv.waitKey(1)
+        key = wait_key()
         x_mouse, y_mouse = py.position()
         if wincap.screen_resolution[1] == (windowSize[1]+wincap.titlebar_pixels+1):
             stop_bool = x_mouse > (wincap.offset_x + wincap.w)
@@ -119,10 +257,10 @@ def main():
         
         if (key == ord('q') or stop_bool):
             #stop all threads
-            stop_all_thread(wincap,screendetect,bot,detector)
+            stop_all_thread(wincap,screendetect,bot,detector,recorder)
             break
     print(bcolors.WARNING +'Cursor currently not on Bluestacks, exiting bot...' +bcolors.ENDC)
-    stop_all_thread(wincap,screendetect,bot,detector)
+    stop_all_thread(wincap,screendetect,bot,detector,recorder)
 
 if __name__ == "__main__":
     print(" ")
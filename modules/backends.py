@@ -0,0 +1,46 @@
+"""
+The backends module is the registry of the inference engines Detection can run
+the model with instead of ultralytics. Engines are imported only when they are
+selected, so e.g. the opencv engine works without openvino or onnxruntime.
+
+Every engine follows the same contract:
+    Engine(model_path, imgsz=(384,640), **options)
+    engine.imgsz            - height and width of the model input
+    engine.infer(tensor)    - run the (1, 3, h, w) float32 tensor and return the
+                              raw (1, 4 + nc, anchors) output, the output may be
+                              overwritten by the next call
+    engine.supports_async   - True if start_async, idle_job, submit and wait_all
+                              are available to keep several frames in flight
+"""
+
+from importlib import import_module
+
+# name: (module, class)
+BACKENDS = {
+    "openvino": ("modules.openvinoengine", "OpenVINOEngine"),
+    "onnxruntime": ("modules.onnxengine", "ONNXEngine"),
+    "opencv": ("modules.opencvengine", "OpenCVEngine"),
+}
+
+def register_backend(name, module, class_name):
+    """
+    add an engine to the registry
+
+    :param name (string): name used by Constants.inference_engine
+    :param module (string): module to import when the engine is selected
+    :param class_name (string): engine class in the module
+    """
+    BACKENDS[name] = (module, class_name)
+
+def create_backend(name, model_path, **options):
+    """
+    import and create the engine registered under name
+
+    :param name (string): name of the engine e.g. openvino, onnxruntime or opencv
+    :param model_path (string): model file or directory
+    :return: engine
+    """
+    if name not in BACKENDS:
+        raise Exception(f"Unknown inference engine \"{name}\", available: {', '.join(BACKENDS)}. \nPlease change the inference_engine at constants.py")
+    module, class_name = BACKENDS[name]
+    return getattr(import_module(module), class_name)(model_path, **options)
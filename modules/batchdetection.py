@@ -0,0 +1,170 @@
+"""
+The batchdetection module serves several game windows from one model. Each
+window gets a BatchInstance, a Detection that does not load the model but keeps
+everything else per window (letterbox, HUD region, thresholds, tracker, results
+and channels), so Brawlbot, Screendetect and the annotations use it like a
+Detection. One thread collects the latest frame of every window and runs them
+as a single batch: the openvino engine takes a dynamic batch of the windows
+with a new frame, ultralytics takes a list of images and the other engines run
+the frames one after the other on the same model.
+"""
+
+from threading import Thread, Lock
+from time import time
+from constants import Constants
+from modules.detection import Detection, inference_settings
+from modules.channel import Listener
+
+class BatchInstance(Detection):
+    def __init__(self, imgsz, windowSize, model_file_path, classes, heightScaleFactor):
+        """
+        Constructor for the BatchInstance class
+
+        :param imgsz (tuple): input size of the shared model
+        """
+        self.shared_imgsz = imgsz
+        super().__init__(windowSize, model_file_path, classes, heightScaleFactor)
+
+    def load_model(self, model_file_path):
+        """
+        the model is loaded once by the BatchDetection
+        """
+        self.engine = None
+        self.imgsz = self.shared_imgsz
+        self.async_requests = 0
+
+    def start(self):
+        """
+        the frames are run by the BatchDetection thread
+        """
+        self.stopped = False
+        self.loop_time = time()
+        self.count = 0
+
+class BatchDetection:
+    # threading properties
+    stopped = True
+    lock = None
+
+    def __init__(self, windowSizes, model_file_path, classes, heightScaleFactor):
+        """
+        Constructor for the BatchDetection class
+
+        :param windowSizes (list): width and height of each window
+        """
+        self.lock = Lock()
+        self.batch = len(windowSizes)
+        self.load_model(model_file_path)
+        self.instances = [BatchInstance(self.imgsz, windowSize, model_file_path, classes, heightScaleFactor)
+                          for windowSize in windowSizes]
+        self.tensor = None
+        if self.batched:
+            # the windows with a new frame fill the first slots of the batch
+            self.tensor = self.instances[0].letterbox.new_tensor(self.batch)
+            # the same view object for each batch size so the input stays bound while the size does not change
+            self.views = [self.tensor[:size] for size in range(1, self.batch + 1)]
+            # letterbox geometry of the frame last written to each slot, the tensor starts as padding only
+            self.slot_geometry = [None]*self.batch
+
+    def load_model(self, model_file_path):
+        """
+        load the model shared by every window
+        """
+        self.engine = None
+        self.batched = False
+        # the same engine as a Detection with these constants, tuned config included
+        settings = inference_settings(model_file_path)
+        self.imgsz = settings["imgsz"]
+        if settings["engine"] == "ultralytics":
+            from ultralytics import YOLO
+            self.model = YOLO(settings["model_path"],task="detect")
+            return
+        from modules.backends import create_backend
+        options = dict(settings["options"])
+        if settings["engine"] == "openvino":
+            # the model runs the windows with a new frame at once
+            options["batch"] = -1
+            options["config"] = {**options.get("config", {}), "PERFORMANCE_HINT": "THROUGHPUT"}
+            self.batched = True
+        self.engine = create_backend(settings["engine"], settings["model_path"], imgsz=self.imgsz, **options)
+        self.imgsz = self.engine.imgsz
+
+    def predict(self, jobs):
+        """
+        run the model on the screenshot of every job
+
+        :param jobs (list): index of the window, screenshot, frame and frame id
+        :return (list): (n,6) boxes in window coordinates of each job
+        """
+        if self.engine is None:
+            instances = [self.instances[index] for index, _, _, _ in jobs]
+            images = [instance.region.crop(screenshot) for instance, (_, screenshot, _, _) in zip(instances, jobs)]
+            results = self.model.predict(images, imgsz=Constants.imgsz, conf=instances[0].min_threshold,
+                                         half=Constants.half, verbose=False)
+            return [instance.region.filter(instance.region.to_window(result.boxes.data.cpu().numpy()))
+                    for instance, result in zip(instances, results)]
+        boxes = []
+        if self.batched:
+            for i, (index, screenshot, _, _) in enumerate(jobs):
+                letterbox = self.instances[index].letterbox
+                # windows of another aspect ratio would leave their pixels in the padding
+                if self.slot_geometry[i] != letterbox.geometry:
+                    letterbox.fill_padding(self.tensor[i])
+                    self.slot_geometry[i] = letterbox.geometry
+                self.instances[index].prepare(screenshot, self.tensor[i])
+            output = self.engine.infer(self.views[len(jobs) - 1])
+            for i, (index, _, _, _) in enumerate(jobs):
+                instance = self.instances[index]
+                boxes.append(instance.to_window(instance.postprocessor(output[i:i + 1])).copy())
+            return boxes
+        for index, screenshot, _, _ in jobs:
+            instance = self.instances[index]
+            output = self.engine.infer(instance.prepare(screenshot))
+            boxes.append(instance.to_window(instance.postprocessor(output)).copy())
+        return boxes
+
+    def start(self):
+        """
+        start detection
+        """
+        self.stopped = False
+        for instance in self.instances:
+            instance.start()
+        t = Thread(target=self.run, daemon=True)
+        t.start()
+
+    def stop(self):
+        """
+        stop detection
+        """
+        self.stopped = True
+        for instance in self.instances:
+            instance.stop()
+
+    def run(self):
+        listener = Listener(*[instance.inputs for instance in self.instances])
+        while not self.stopped:
+            # wait for a new screenshot of any window
+            changed = listener.wait(timeout=0.1)
+            jobs = []
+            for index, instance in enumerate(self.instances):
+                if not changed[index]:
+                    continue
+                _, value = instance.inputs.get()
+                if value is None:
+                    continue
+                job = instance.claim(value)
+                if job is not None:
+                    jobs.append((index, *job))
+            if not jobs:
+                continue
+            # only the windows with a new frame are run and published
+            boxes = self.predict(jobs)
+            for (index, _, frame, frame_id), window_boxes in zip(jobs, boxes):
+                timestamp = None
+                if frame is not None:
+                    timestamp = frame.timestamp
+                    frame.release()
+                instance = self.instances[index]
+                instance.publish(*instance.build_results(window_boxes, frame_id, timestamp))
+        listener.close()
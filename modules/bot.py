@@ -1,10 +1,11 @@
 from time import time,sleep
 from threading import Thread, Lock
 from math import *
-import pyautogui as py
+from modules.inputs import py
 import numpy as np
 import random
 from constants import Constants
+from modules.channel import Channel
 """
 INITIALIZING: Initialize the bot
 SEARCHING: Find the nearby bush to player
@@ -19,6 +20,7 @@ class BotState:
     MOVING = 2
     HIDING = 3
     ATTACKING = 4
+    names = ["INITIALIZING","SEARCHING","MOVING","HIDING","ATTACKING"]
 
 class Brawlbot:
     # In game tile width and height ratio with respect aspect ratio
@@ -31,6 +33,8 @@ class Brawlbot:
     # Either go to the closest bush to the player or the center
     centerOrder = Constants.centerOrder
     IGNORE_RADIUS = 0.5
+    # below this speed (tiles per second) of the bushes on screen the camera, so the player, is not moving
+    STOPPED_SPEED = 0.3
     movement_screenshot = None
     screenshot = None
     INITIALIZING_SECONDS = 2
@@ -47,12 +51,19 @@ class Brawlbot:
     avg_fps = 0
     enemy_move_key = None
     timeFactor = 1
+    # SessionRecorder the state transitions are recorded to
+    recorder = None
     
     # time to move increase by 5% if maps have sharps corner
     if sharpCorner: timeFactor = 1.05
 
-    def __init__(self,windowSize,offsets,speed,attack_range) -> None:
+    def __init__(self,windowSize,offsets,speed,attack_range,probe=None) -> None:
         self.lock = Lock()
+        # every state transition and every new detection results
+        self.states = Channel()
+        self.results_channel = Channel()
+        # RegionProbe used to read the player's health bar, pyautogui is used if None
+        self.probe = probe
         
         # "brawler" chracteristic
         self.speed = speed
@@ -94,7 +105,17 @@ class Brawlbot:
         self.player_index = 0
         self.bush_index = 1
         self.enemy_index = 2
-        
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.states.publish(state)
+        if self.recorder:
+            self.recorder.record_event("bot", "state", BotState.names[state])
 
     # translate a pixel position on a screenshot image to a pixel position on the screen.
     # pos = (x, y)
@@ -125,7 +146,7 @@ class Brawlbot:
         # if there is a detection
         if self.results:
             # there player detection
-            if self.results[self.player_index]:
+            if len(self.results[self.player_index]):
                 x_border = (self.window_w/self.tile_w)*self.border_size
                 y_border = (self.window_h/self.tile_h)*self.border_size
                 # coordinate of the middle of the screen
@@ -163,7 +184,7 @@ class Brawlbot:
         # if there is detection
         if self.results:
             # if there is player detection
-            if self.results[self.player_index]:
+            if len(self.results[self.player_index]):
                 # predict the storm direction
                 direction = self.guess_storm_direction()
                 if direction[0] == self.direction[2]:
@@ -225,18 +246,28 @@ class Brawlbot:
             elif direction == [self.direction[1],self.direction[3]]:
                 return [[1,3],[0,2]]
         
+    def sort_by_distance(self, positions, player_position):
+        """
+        sort positions by tile distance to the player without modifying the detection results
+
+        :param positions: (x,y) positions
+        :param player_position(tuple): position of the player
+        :return (List): list of (x,y) tuples, the closest first
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        distance = np.hypot((positions[:,0] - player_position[0])/(self.window_w/self.tile_w),
+                            (positions[:,1] - player_position[1])/(self.window_h/self.tile_h))
+        return [(int(x),int(y)) for x,y in positions[np.argsort(distance, kind="stable")]]
+
     # bush method
     def ordered_bush_by_distance(self, index):
         # our character is always in the center of the screen
         # if player position in result is empty
         # assume that player is in the middle of the screen
-        if not(self.results[self.player_index]) or self.centerOrder:
+        if not len(self.results[self.player_index]) or self.centerOrder:
             player_position = self.center_window
         else:
             player_position = self.results[self.player_index][0]
-        def tile_distance(position):
-            return sqrt(((position[0] - player_position[0])/(self.window_w/self.tile_w))**2 
-                        + ((position[1] - player_position[1])/(self.window_h/self.tile_h))**2)
         # list of bush location is the in index 1 of results
         unfilteredResults = self.results[index]
         filteredResult = []
@@ -250,28 +281,22 @@ class Brawlbot:
                 if ((x > quadrant[0][0]*x_scale and x <= quadrant[0][1]*x_scale)
                     and (y > quadrant[1][0]*y_scale and y <= quadrant[1][1]*y_scale)):
                     filteredResult.append((x,y))
-            filteredResult.sort(key=tile_distance)
+            filteredResult = self.sort_by_distance(filteredResult, player_position)
             if filteredResult:
                 return filteredResult
         # if quadrant is False or filteredResult is empty
         if not(quadrant) or not(filteredResult):
-            unfilteredResults.sort(key=tile_distance)
-            return unfilteredResults
+            return self.sort_by_distance(unfilteredResults, player_position)
     
     def ordered_enemy_by_distance(self,index):
         # our character is always in the center of the screen
         # if player position in result is empty 
         # assume that player is in the middle of the screen
-        if not(self.results[self.player_index]):
+        if not len(self.results[self.player_index]):
             player_position = self.center_window
         else:
             player_position = self.results[self.player_index][0]
-        def tile_distance(position):
-            return sqrt(((position[0] - player_position[0])/(self.window_w/self.tile_w))**2 
-                        + ((position[1] - player_position[1])/(self.window_h/self.tile_h))**2)
-        sortedResults = self.results[index]
-        sortedResults.sort(key=tile_distance)
-        return sortedResults
+        return self.sort_by_distance(self.results[index], player_position)
         
     def tile_distance(self,player_position,position):
         """
@@ -306,7 +331,7 @@ class Brawlbot:
             # else:
             #     index = 0
             x,y = self.bushResult[0]
-            if not(self.results[self.player_index]):
+            if not len(self.results[self.player_index]):
                 player_pos = self.center_window
             else:
                 player_pos = self.results[self.player_index][0]
@@ -377,13 +402,13 @@ class Brawlbot:
         x_key = ""
         y_key = ""
         if self.results:
-            if self.results[self.player_index]:
+            if len(self.results[self.player_index]):
                 player_pos = self.results[self.player_index][0]
             # if player position in result is empty
             # assume that player is in the middle of the screen
             else:
                 player_pos = self.center_window
-            if self.results[index]:
+            if len(self.results[index]):
                 # enemy index
                 if index == self.enemy_index:
                     p0 = self.enemyResults[0]
@@ -426,14 +451,14 @@ class Brawlbot:
         """
         if self.results:
             # player coordinate
-            if self.results[self.player_index]:
+            if len(self.results[self.player_index]):
                 player_pos = self.results[self.player_index][0]
             # if player position in result is empty
             # assume that player is in the middle of the screen
             else:
                 player_pos = self.center_window
             # enemy coordinate
-            if self.results[self.enemy_index]:
+            if len(self.results[self.enemy_index]):
                 self.enemyResults = self.ordered_enemy_by_distance(self.enemy_index)
                 if self.enemyResults:
                     enemyDistance = self.tile_distance(player_pos,self.enemyResults[0])
@@ -441,6 +466,27 @@ class Brawlbot:
                     return enemyDistance
         return None
     
+    def is_enemy_approaching(self):
+        """
+        Check if the closest enemy is moving towards the player
+        :return (boolean): True or False, None without tracks
+        """
+        tracks = getattr(self.results, "tracks", None)
+        if tracks is None:
+            return None
+        enemies = tracks.of_class(self.enemy_index)
+        if not len(enemies):
+            return None
+        players = tracks.of_class(self.player_index)
+        if len(players):
+            player_pos = tracks.positions[players[np.argmax(tracks.ages[players])]]
+        else:
+            player_pos = np.array(self.center_window)
+        offsets = player_pos - tracks.positions[enemies]
+        closest = np.argmin(np.hypot(offsets[:, 0], offsets[:, 1]))
+        # positive when the enemy velocity points at the player
+        return bool(np.dot(offsets[closest], tracks.velocities[enemies[closest]]) > 0)
+
     def is_enemy_in_range(self):
         """
         Check if enemy is in range of the player
@@ -451,7 +497,9 @@ class Brawlbot:
             # ranges in tiles
             if (enemyDistance > self.attack_range
                 and enemyDistance <= self.alert_range):
-                self.enemy_move_key = self.get_movement_key(self.enemy_index)
+                # no need to dodge an enemy that is moving away
+                if self.is_enemy_approaching() is not False:
+                    self.enemy_move_key = self.get_movement_key(self.enemy_index)
             elif (enemyDistance > self.gadget_range 
                   and enemyDistance <= self.attack_range):
                 self.attack()
@@ -487,8 +535,12 @@ class Brawlbot:
             w2 = int(self.topleft[0] + 2*(width/3))
             h = int(self.topleft[1] - height/2)
             try:
-                if (py.pixelMatchesColor(w1,h,(204, 34, 34),tolerance=20)
-                    or py.pixelMatchesColor(w2,h,(204, 34, 34),tolerance=20)):
+                if self.probe:
+                    damaged = self.probe.pixels_match_color([(w1,h),(w2,h)],(204, 34, 34),tolerance=20)
+                else:
+                    damaged = (py.pixelMatchesColor(w1,h,(204, 34, 34),tolerance=20)
+                               or py.pixelMatchesColor(w2,h,(204, 34, 34),tolerance=20))
+                if damaged:
                     print(f"player is damaged")
                     return True
             except OSError:
@@ -500,9 +552,26 @@ class Brawlbot:
         Check if player have stop moving
         :return (boolean): True or False
         """
+        tracks = getattr(self.results, "tracks", None)
+        if tracks is not None:
+            # the camera follows the player, so the player stays in the center of the
+            # screen and the scene moves instead: use the speed of the bushes
+            bushes = tracks.of_class(self.bush_index)
+            # a new track has no velocity yet
+            bushes = bushes[tracks.ages[bushes] > 0]
+            if len(bushes):
+                if np.median(tracks.speeds()[bushes])/self.tileSize < self.STOPPED_SPEED:
+                    self.counter += 1
+                    if self.counter == 2:
+                        print("have stopped moving or stuck")
+                        return True
+                else:
+                    # reset counter
+                    self.counter = 0
+                return False
         if self.results:
-            if self.results[self.player_index]:
-                player_pos = self.results[self.player_index][0]
+            if len(self.results[self.player_index]):
+                player_pos = tuple(self.results[self.player_index][0])
                 if self.last_player_pos is None:
                     self.last_player_pos = player_pos
                 else:
@@ -525,6 +594,7 @@ class Brawlbot:
         self.lock.acquire()
         self.results = results
         self.lock.release()
+        self.results_channel.publish(results)
     
     def update_player(self,topleft,bottomright):
         """
@@ -563,8 +633,10 @@ class Brawlbot:
         self.last_player_pos = None
 
     def run(self):
+        version = self.results_channel.version
         while not self.stopped:
-            sleep(0.01)
+            # wake up on new detection results, or at least every 50ms for the timed states
+            version, _ = self.results_channel.wait(version, timeout=0.05)
             if self.state == BotState.INITIALIZING:
                 # do no bot actions until the startup waiting period is complete
                 if time() > self.timestamp + self.INITIALIZING_SECONDS:
@@ -0,0 +1,52 @@
+"""
+The changedetect module tells if a frame differs from the last frame that was
+run through the model, using a tiny downsampled luminance signature.
+Menus, loading screens and end screens are static so their inference can be skipped.
+"""
+
+import numpy as np
+import cv2 as cv
+
+class ChangeDetector:
+    def __init__(self, threshold=6.0, size=(32,18)):
+        """
+        Constructor for the ChangeDetector class
+
+        :param threshold (float): luminance difference (0-255) of any block that counts as a change
+        :param size (tuple): width and height of the signature
+        """
+        self.threshold = threshold
+        self.size = size
+        # preallocated buffers, the signature is only replaced when a change is reported
+        self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+        self.signature = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.last_signature = np.empty((size[1], size[0]), dtype=np.uint8)
+        self.empty = True
+        self.difference = 0
+
+    def is_changed(self, screenshot, force=False):
+        """
+        compare the screenshot with the last changed frame
+
+        :param screenshot (ndarray): BGR image
+        :param force (boolean): report a change and take the screenshot as the new reference
+        :return (boolean): True if the scene changed
+        """
+        cv.resize(screenshot, self.size, dst=self.small, interpolation=cv.INTER_AREA)
+        cv.cvtColor(self.small, cv.COLOR_BGR2GRAY, dst=self.signature)
+        if self.empty or force:
+            changed = True
+        else:
+            # the largest block difference, a small object moving changes a few blocks but barely the mean
+            self.difference = cv.norm(self.signature, self.last_signature, cv.NORM_INF)
+            changed = self.difference > self.threshold
+        if changed:
+            np.copyto(self.last_signature, self.signature)
+            self.empty = False
+        return changed
+
+    def reset(self):
+        """
+        forget the reference frame
+        """
+        self.empty = True
@@ -0,0 +1,103 @@
+"""
+The channel module is a small publish/subscribe layer of versioned latest-value
+channels. A publisher replaces the value and bumps the version, consumers block
+until a newer version than the one they have seen arrives (or a timeout fires)
+instead of spinning on a shared attribute.
+"""
+
+from threading import Condition, Lock
+
+class Channel:
+    def __init__(self, value=None):
+        """
+        Constructor for the Channel class
+        """
+        self.lock = Lock()
+        self.version = 0
+        self.value = value
+        # conditions notified on every publish
+        self.condition = Condition()
+        self.listeners = [self.condition]
+
+    def publish(self, value):
+        """
+        replace the value and wake every consumer
+        :return (int): new version
+        """
+        self.lock.acquire()
+        self.value = value
+        self.version += 1
+        version = self.version
+        listeners = list(self.listeners)
+        self.lock.release()
+        for condition in listeners:
+            condition.acquire()
+            condition.notify_all()
+            condition.release()
+        return version
+
+    def get(self):
+        """
+        :return (tuple): latest version and value
+        """
+        self.lock.acquire()
+        version, value = self.version, self.value
+        self.lock.release()
+        return version, value
+
+    def wait(self, version, timeout=None):
+        """
+        block until the channel has a newer version than version
+
+        :param version (int): last version seen by the consumer
+        :param timeout (float): seconds to wait, None waits forever
+        :return (tuple): latest version and value, the version is unchanged on timeout
+        """
+        self.condition.acquire()
+        self.condition.wait_for(lambda: self.version != version, timeout)
+        self.condition.release()
+        return self.get()
+
+    def subscribe(self, condition):
+        self.lock.acquire()
+        self.listeners.append(condition)
+        self.lock.release()
+
+    def unsubscribe(self, condition):
+        self.lock.acquire()
+        if condition in self.listeners:
+            self.listeners.remove(condition)
+        self.lock.release()
+
+class Listener:
+    def __init__(self, *channels):
+        """
+        Constructor for the Listener class, waits on several channels at once
+        """
+        self.channels = channels
+        self.versions = [channel.version for channel in channels]
+        self.condition = Condition()
+        for channel in channels:
+            channel.subscribe(self.condition)
+
+    def changed(self):
+        return [channel.version != version for channel, version in zip(self.channels, self.versions)]
+
+    def wait(self, timeout=None):
+        """
+        block until any of the channels publishes a new version
+
+        :param timeout (float): seconds to wait, None waits forever
+        :return (list): for each channel, True if it has a new version
+        """
+        self.condition.acquire()
+        self.condition.wait_for(lambda: any(self.changed()), timeout)
+        self.condition.release()
+        versions = [channel.version for channel in self.channels]
+        changed = [new != old for new, old in zip(versions, self.versions)]
+        self.versions = versions
+        return changed
+
+    def close(self):
+        for channel in self.channels:
+            channel.unsubscribe(self.condition)
@@ -0,0 +1,51 @@
+"""
+The dataset module reads labeled frames in the YOLO format: an images directory
+and a labels directory with one .txt per image, each line being
+"class_id cx cy w h" normalised to the image size. Images and labels can also
+sit in the same directory.
+"""
+
+import os
+import numpy as np
+import cv2 as cv
+
+image_extensions = (".png", ".jpg", ".jpeg", ".bmp")
+
+def load_labels(path, w, h):
+    """
+    :param path (string): YOLO label file, missing means no objects
+    :param w (int): image width
+    :param h (int): image height
+    :return (ndarray): (m,5) x1, y1, x2, y2 in pixels and class id
+    """
+    if not os.path.exists(path):
+        return np.zeros((0, 5), dtype=np.float32)
+    labels = np.loadtxt(path, dtype=np.float32, ndmin=2).reshape(-1, 5)
+    cx, cy, bw, bh = labels[:, 1]*w, labels[:, 2]*h, labels[:, 3]*w, labels[:, 4]*h
+    return np.stack([cx - bw/2, cy - bh/2, cx + bw/2, cy + bh/2, labels[:, 0]], axis=1)
+
+def list_dataset(path):
+    """
+    :param path (string): dataset directory
+    :return (list): image path and label path of every frame
+    """
+    images_path = os.path.join(path, "images")
+    labels_path = os.path.join(path, "labels")
+    if not os.path.isdir(images_path):
+        images_path = labels_path = path
+    names = sorted(name for name in os.listdir(images_path) if name.lower().endswith(image_extensions))
+    if not names:
+        raise Exception(f"No images found in {images_path}")
+    return [(os.path.join(images_path, name), os.path.join(labels_path, os.path.splitext(name)[0] + ".txt"))
+            for name in names]
+
+def iter_dataset(path, size=None):
+    """
+    :param size (tuple): width and height the images are resized to, the labels follow
+    :return: generator of image path, BGR image and (m,5) labels
+    """
+    for image_path, label_path in list_dataset(path):
+        image = cv.imread(image_path, cv.IMREAD_COLOR)
+        if size is not None and (image.shape[1], image.shape[0]) != tuple(size):
+            image = cv.resize(image, tuple(size))
+        yield image_path, image, load_labels(label_path, image.shape[1], image.shape[0])
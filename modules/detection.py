@@ -1,8 +1,28 @@
 from threading import Thread, Lock
 from time import time
+import numpy as np
 import cv2 as cv
 from constants import Constants
-from ultralytics import YOLO
+from modules.changedetect import ChangeDetector
+from modules.channel import Channel
+from modules.preprocess import Letterbox
+from modules.hudmask import InferenceRegion
+from modules.tracker import Tracker
+from modules.detectionresults import DetectionResults
+from modules.postprocess import YoloPostprocessor, merge_boxes
+from modules.tuning import apply_tuned_config
+from modules.print import bcolors
+
+def inference_settings(model_file_path):
+    """
+    :return (dict): engine, model_path, imgsz, options and async_requests of constants.py,
+                    replaced by the configuration autotune.py measured on this machine if use_tuned_config is set
+    """
+    settings = {"engine": Constants.inference_engine, "model_path": model_file_path, "imgsz": Constants.imgsz,
+                "options": {}, "async_requests": Constants.async_requests}
+    if Constants.use_tuned_config:
+        settings = apply_tuned_config(settings, Constants.tuning_cache_path)
+    return settings
 
 class Detection:
     # threading properties
@@ -11,7 +31,24 @@ class Detection:
 
     # properties
     screenshot = None
+    frame = None
+    # sequence number of the frame the results came from
+    frame_id = 0
+    # sequence number of the last frame given to the model and of the last results published
+    submitted_id = 0
+    published_id = 0
     results = None
+    # True when the results were republished for a static frame without inference
+    reused = False
+    inference_time = 0
+    # SessionRecorder the results are recorded to
+    recorder = None
+    # FrameGovernor pacing the inference, None runs every new frame
+    governor = None
+    # player midpoint the cascade crop is centred on when the results are kept by another process
+    crop_center = None
+    # low resolution engine of the cascade, None runs a single pass
+    coarse_engine = None
     fps = 0
     avg_fps = 0
     player_topleft = None
@@ -24,21 +61,93 @@ class Detection:
         """
         # create a thread lock object
         self.lock = Lock()
+        # screenshots to run the model on and the published results
+        self.inputs = Channel()
+        self.detections = Channel()
         # load the trained model
-        self.model = YOLO(model_file_path,task="detect")
+        self.load_model(model_file_path)
         self.classes = classes
         self.windowSize = windowSize
         self.w = windowSize[0]
         self.h = windowSize[1]
         self.height = heightScaleFactor * self.h
+        # per class confidence threshold and midpoint height adjustment
+        self.thresholds = np.array(Constants.threshold, dtype=np.float32)
+        # ultralytics drops the boxes below every class threshold before NMS
+        self.min_threshold = float(self.thresholds.min()) - 0.005
+        self.player_index = classes.index("Player")
+        self.midpoint_y_offsets = np.zeros(len(classes), dtype=np.int32)
+        self.midpoint_y_offsets[self.player_index] = int(self.height)
+        self.midpoint_y_offsets[classes.index("Enemy")] = int(0.05*self.h)
+        # part of the window the model runs on, without the HUD
+        crop, masks = Constants.hud_profiles.get(tuple(windowSize), (Constants.hud_crop, Constants.hud_masks))
+        if not Constants.hud_masking:
+            crop, masks = (0, 0, 0, 0), ()
+        self.region = InferenceRegion(windowSize, crop, masks)
+        # cached letterbox mapping and preallocated input tensor
+        self.letterbox = Letterbox(self.region.size, self.imgsz)
+        self.tensor_masks = self.region.tensor_masks(self.letterbox)
+        # decodes the raw output of the engines with the class thresholds
+        self.postprocessor = YoloPostprocessor(self.thresholds)
+        # full frame at low resolution, then the area around the player at native resolution
+        self.cascade = self.coarse_engine is not None
+        if self.cascade:
+            self.crop_size = (min(self.imgsz[1], self.region.w), min(self.imgsz[0], self.region.h))
+            self.crop_letterbox = Letterbox(self.crop_size, self.imgsz)
+            self.coarse_letterbox = Letterbox(self.region.size, self.coarse_engine.imgsz)
+            self.coarse_masks = self.region.tensor_masks(self.coarse_letterbox)
+            self.center_window = (self.w//2, self.h//2 + self.midpoint_offset)
+        # one input tensor and one box buffer per in flight request in async mode
+        self.async_tensors = None
+        if self.engine is not None and self.engine.supports_async and self.async_requests > 0 and not self.cascade:
+            self.async_tensors = [self.letterbox.new_tensor() for _ in range(self.async_requests)]
+            self.async_boxes = [self.postprocessor.new_output() for _ in range(self.async_requests)]
+            self.engine.start_async(self.async_tensors, self.complete)
+        # stable ids and velocities of the detections
+        self.tracker = None
+        if Constants.tracking:
+            self.tracker = Tracker(Constants.track_max_age, Constants.track_max_distance*self.w)
+        # skip inference while the scene is static
+        self.change_detector = None
+        if Constants.skip_static_frames:
+            self.change_detector = ChangeDetector(Constants.change_threshold)
 
-    def find_midpoint(self,x1,y1,x2,y2):
-        #x2 > x1
-        #y2 > y1
+    def load_model(self, model_file_path):
         """
-        find the midpoint between two
+        load the trained model
         """
-        return [(x1+int((x2-x1)/2),y1+int((y2-y1)/2))]
+        self.engine = None
+        settings = inference_settings(model_file_path)
+        engine = settings["engine"]
+        model_file_path = settings["model_path"]
+        self.imgsz = settings["imgsz"]
+        options = dict(settings["options"])
+        self.async_requests = settings["async_requests"]
+        if engine != "ultralytics":
+            # runs the model without importing ultralytics or torch
+            from modules.backends import create_backend
+            if engine == "openvino" and self.async_requests > 0 and "config" not in options:
+                options["config"] = {"PERFORMANCE_HINT": "THROUGHPUT",
+                                     "PERFORMANCE_HINT_NUM_REQUESTS": str(self.async_requests)}
+            self.engine = create_backend(engine, model_file_path, imgsz=self.imgsz, **options)
+            self.imgsz = self.engine.imgsz
+            if Constants.cascade and engine == "openvino":
+                # low resolution model for the full frame pass
+                self.coarse_engine = create_backend(engine, model_file_path, imgsz=Constants.cascade_imgsz, **options)
+            elif Constants.cascade:
+                # the other engines run an exported model at the input size it was exported with
+                print(bcolors.WARNING + f"The cascade needs the openvino inference_engine to run the model at cascade_imgsz, "
+                      f"{engine} runs a single pass" + bcolors.ENDC)
+            return
+        if Constants.cascade:
+            # warned where the model is loaded, not by the detections that run it in another process
+            print(bcolors.WARNING + "The cascade needs the openvino inference_engine, ultralytics runs a single pass" + bcolors.ENDC)
+        from ultralytics import YOLO
+        self.model = YOLO(model_file_path,task="detect")
+        if Constants.fused_preprocess:
+            # the letterboxed tensor is given to ultralytics as a torch tensor
+            import torch
+            self.torch = torch
 
     def annotate_detection_midpoint(self):
         """
@@ -49,8 +158,9 @@ class Detection:
         if self.results:
             for i in range(len(self.results)):
                     #if the list is not empty
-                    if self.results[i]:
-                        for cord in self.results[i]:
+                    if len(self.results[i]):
+                        for x, y in self.results[i]:
+                            cord = (int(x), int(y))
                             cv.drawMarker(self.screenshot, cord,
                                            red ,thickness=thickness,
                                            markerType= cv.MARKER_CROSS,
@@ -109,13 +219,33 @@ class Detection:
                     org=(0+spacing+int(scale*140),self.windowSize[1]-spacing),fontFace=cv.FONT_HERSHEY_SIMPLEX,fontScale=0.5*fontScale,
                     color=(255,255,255),thickness=thickness)
     
-    def update(self, screenshot):
+    def update(self, screenshot, frame=None):
         """
         update screen for detection
+
+        :param screenshot (ndarray): BGR image
+        :param frame (Frame): ring frame the screenshot belongs to, if any
         """
         self.lock.acquire()
         self.screenshot = screenshot
+        self.frame = frame
         self.lock.release()
+        self.inputs.publish((screenshot, frame))
+
+    def is_static(self, screenshot, frame):
+        """
+        check if the screenshot can reuse the last results
+        :return (boolean): True if the frame is the same or the scene has not changed
+        """
+        if self.results is None:
+            return False
+        if frame is not None and frame.seq == self.frame_id:
+            return True
+        if self.change_detector is None:
+            return False
+        # run the model once in a while even if the scene looks static
+        force = time() > self.inference_time + Constants.max_reuse_time
+        return not self.change_detector.is_changed(screenshot, force)
 
     def start(self):
         """
@@ -134,41 +264,210 @@ class Detection:
         """
         self.stopped = True
 
+    def predict(self, screenshot):
+        """
+        run the model on a screenshot
+        :return: (n,6) array of x1, y1, x2, y2, confidence and class id in window coordinates
+        """
+        if self.cascade:
+            return self.predict_cascade(screenshot)
+        if self.engine is not None:
+            output = self.engine.infer(self.prepare(screenshot))
+            return self.to_window(self.postprocessor(output))
+        if not Constants.fused_preprocess:
+            results = self.model.predict(self.region.crop(screenshot), imgsz=Constants.imgsz, conf=self.min_threshold,
+                                         half=Constants.half, verbose=False)
+            return self.region.filter(self.region.to_window(results[0].boxes.data.cpu().numpy()))
+        # ultralytics skips its own preprocessing for tensors, the boxes come back in tensor space
+        tensor = self.torch.from_numpy(self.prepare(screenshot))
+        results = self.model.predict(tensor, imgsz=Constants.imgsz, conf=self.min_threshold,
+                                     half=Constants.half, verbose=False)
+        return self.to_window(results[0].boxes.data.cpu().numpy())
+
+    def prepare(self, screenshot, tensor=None):
+        """
+        letterbox the inference region of the screenshot and hide the HUD
+        :return (ndarray): input tensor
+        """
+        tensor = self.letterbox.preprocess(self.region.crop(screenshot), tensor)
+        return self.region.paint(tensor, self.tensor_masks)
+
+    def to_window(self, boxes):
+        """
+        map boxes from input tensor to window coordinates and drop the ones on the HUD
+        """
+        return self.region.filter(self.region.to_window(self.letterbox.to_window(boxes)))
+
+    def player_center(self):
+        """
+        :return (tuple): midpoint of the most confident player of the last results, None if there is none
+        """
+        results = self.results
+        if results is not None and results.count(self.player_index):
+            return tuple(int(value) for value in results[self.player_index][0])
+        return None
+
+    def crop_origin(self):
+        """
+        :return (tuple): top left corner of the crop around the player
+        """
+        center = self.crop_center if self.crop_center is not None else self.player_center()
+        if center is None:
+            center = self.center_window
+        crop_w, crop_h = self.crop_size
+        # keep the crop inside the inference region
+        x = min(max(int(center[0]) - crop_w//2, self.region.x), self.region.x + self.region.w - crop_w)
+        y = min(max(int(center[1]) - crop_h//2, self.region.y), self.region.y + self.region.h - crop_h)
+        return x, y
+
+    def predict_cascade(self, screenshot):
+        """
+        run the low resolution model on the whole screenshot and the model on a
+        native resolution crop around the player, then merge both with NMS
+        :return: (n,6) array of x1, y1, x2, y2, confidence and class id in window coordinates
+        """
+        tensor = self.coarse_letterbox.preprocess(self.region.crop(screenshot))
+        output = self.coarse_engine.infer(self.region.paint(tensor, self.coarse_masks))
+        # the postprocessor buffer is reused by the second pass
+        coarse = self.region.to_window(self.coarse_letterbox.to_window(self.postprocessor(output)).copy())
+        x, y = self.crop_origin()
+        crop_w, crop_h = self.crop_size
+        crop = screenshot[y:y + crop_h, x:x + crop_w]
+        fine = self.crop_letterbox.to_window(self.postprocessor(self.engine.infer(self.crop_letterbox.preprocess(crop))))
+        fine[:, [0, 2]] += x
+        fine[:, [1, 3]] += y
+        return self.region.filter(merge_boxes(coarse, fine))
+
+    def build_results(self, boxes, frame_id=0, timestamp=None):
+        """
+        filter the boxes with the class thresholds and get the midpoint of each detection
+        :param boxes (ndarray): (n,6) x1, y1, x2, y2, confidence and class id
+        :param timestamp (float): capture time of the frame
+        :return: DetectionResults, player top left and bottom right
+        """
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 6)
+        classes = boxes[:, 5].astype(np.int64)
+        confidences = boxes[:, 4]
+        keep = np.round(confidences, 2) >= self.thresholds[classes]
+        xyxy = np.round(boxes[keep, :4]).astype(np.int32)
+        classes = classes[keep]
+        confidences = confidences[keep]
+        midpoints = xyxy[:, :2] + (xyxy[:, 2:] - xyxy[:, :2])//2
+        # move the player midpoint from the name tag to the feet and standardise the enemy height
+        midpoints[:, 1] += self.midpoint_y_offsets[classes]
+        results = DetectionResults(xyxy, midpoints, classes, confidences, len(self.classes), frame_id, timestamp)
+
+        # Constantly update player name tag position to check if
+        # player is damaged in bot module while in hiding state
+        player_topleft = None
+        player_bottomright = None
+        player_boxes = results.boxes_of(self.player_index)
+        if len(player_boxes):
+            player_topleft = (int(player_boxes[0][0]), int(player_boxes[0][1]))
+            player_bottomright = (int(player_boxes[0][2]), int(player_boxes[0][3]))
+        return results, player_topleft, player_bottomright
+
+    def publish(self, results, player_topleft, player_bottomright):
+        """
+        publish new results
+        :return (boolean): False if newer results were already published
+        """
+        # lock the thread while updating the results
+        self.lock.acquire()
+        # a request that finishes after one started later must not take the results back in time
+        if results.frame_id <= self.published_id:
+            self.lock.release()
+            return False
+        self.published_id = results.frame_id
+        if self.tracker is not None:
+            # the velocities are measured between capture times, not between the end of the inferences
+            timestamp = time() if results.timestamp is None else results.timestamp
+            results.tracks = self.tracker.update(results, timestamp)
+        self.results = results
+        if player_topleft is not None:
+            self.player_topleft = player_topleft
+            self.player_bottomright = player_bottomright
+        self.frame_id = results.frame_id
+        self.reused = False
+        # async requests can complete on several threads at once
+        self.fps = (1 / max(time() - self.loop_time, 1e-6))
+        self.loop_time = time()
+        self.count += 1
+        if self.count == 1:
+            self.avg_fps = self.fps
+        else:
+            self.avg_fps = (self.avg_fps*self.count+self.fps)/(self.count + 1)
+        self.lock.release()
+        self.detections.publish((results, results.frame_id))
+        if self.recorder:
+            self.recorder.record_detections(results.frame_id, results)
+        return True
+
+    def complete(self, output, userdata):
+        """
+        callback of a finished async request
+        """
+        job, frame_id, timestamp = userdata
+        boxes = self.to_window(self.postprocessor(output, self.async_boxes[job]))
+        self.publish(*self.build_results(boxes, frame_id, timestamp))
+
+    def claim(self, value):
+        """
+        borrow the frame of an input and check if it needs inference
+
+        :param value (tuple): screenshot and frame published to inputs
+        :return (tuple): screenshot, frame and frame id, None if the previous results are reused
+        """
+        screenshot, frame = value
+        # borrow the ring slot so the capture thread cannot overwrite it during inference
+        if frame is not None and not frame.acquire():
+            return None
+        if self.is_static(screenshot, frame):
+            if frame is not None:
+                frame.release()
+            # republish the previous results for this frame, flagged as reused
+            self.lock.acquire()
+            results = self.results
+            if frame is not None and frame.seq > self.published_id:
+                results = results.as_reused(frame.seq, frame.timestamp)
+                self.results = results
+                self.frame_id = self.published_id = frame.seq
+            self.reused = True
+            self.lock.release()
+            if results.reused:
+                self.detections.publish((results, results.frame_id))
+            return None
+        self.inference_time = time()
+        frame_id = self.submitted_id + 1 if frame is None else frame.seq
+        self.submitted_id = frame_id
+        return screenshot, frame, frame_id
+
     def run(self):
+        version = 0
         while not self.stopped:
-            if not self.screenshot is None:
-                # create empty nested list
-                tempList = len(self.classes)*[[]]
-                results = self.model.predict(self.screenshot, imgsz=Constants.imgsz,
-                                             half=Constants.half, verbose=False)
-                result = results[0]
-                for box in result.boxes:
-                    x1, y1, x2, y2 = [round(x) for x in box.xyxy[0].tolist()]
-                    class_id = int(box.cls[0].item())
-                    prob = round(box.conf[0].item(), 2)
-                    threshold = Constants.threshold[class_id]
-                    if prob >= threshold:
-                        midpoint = self.find_midpoint(x1,y1,x2,y2)
-                        if self.classes[class_id] == "Player":
-                            # Constantly update player name tag position to check if
-                            # player is damaged in bot module while in hiding state
-                            self.player_topleft = (x1,y1)
-                            self.player_bottomright = (x2,y2)
-                            midpoint =  [( midpoint[0][0], int(midpoint[0][1] + self.height))]
-                        if self.classes[class_id] == "Enemy":
-                            #standardised enemy height and their label
-                            enemy_height = y2 - y1
-                            y1 = y1 + (enemy_height+0.2*self.h)
-                            midpoint = [( midpoint[0][0], int(midpoint[0][1] + 0.05*self.h))]
-                        tempList[class_id] = tempList[class_id] + midpoint
-                # lock the thread while updating the results
-                self.lock.acquire()
-                self.results = tempList
-                self.lock.release()
-                self.fps = (1 / (time() - self.loop_time))
-                self.loop_time = time()
-                self.count += 1
-                if self.count == 1:
-                    self.avg_fps = self.fps
-                else:
-                    self.avg_fps = (self.avg_fps*self.count+self.fps)/(self.count + 1)
\ No newline at end of file
+            # wait for a new screenshot
+            version, value = self.inputs.wait(version, timeout=0.1)
+            if value is None:
+                continue
+            job = self.claim(value)
+            if job is None:
+                continue
+            screenshot, frame, frame_id = job
+            start = time()
+            timestamp = start if frame is None else frame.timestamp
+            if self.async_tensors is not None:
+                # wait for a free request, the frame is copied into its tensor so the slot is released before inference
+                request = self.engine.idle_job()
+                self.prepare(screenshot, self.async_tensors[request])
+                if frame is not None:
+                    frame.release()
+                self.engine.submit((request, frame_id, timestamp))
+            else:
+                boxes = self.predict(screenshot)
+                if frame is not None:
+                    frame.release()
+                self.publish(*self.build_results(boxes, frame_id, timestamp))
+            if self.governor:
+                self.governor.pace(start, inference=True)
+        if self.async_tensors is not None:
+            self.engine.wait_all()
@@ -0,0 +1,121 @@
+"""
+The detectionclient module runs the detection through the inference server
+(inference_server.py) so several bots share one model. The frame is copied into a
+shared memory block and the boxes come back through another one, only the frame
+sequence number and the box count go through the socket. DetectionClient has the
+same results, player_topleft and player_bottomright interface as Detection.
+When the server goes away the client publishes empty results, so the bot does
+not act on stale detections, and reconnects once the server is back.
+"""
+
+import numpy as np
+from threading import Lock
+from time import time
+from constants import Constants
+from modules.detection import Detection
+from modules.sharedarray import SharedArray
+from multiprocessing import AuthenticationError
+from modules.inferenceserver import connect, MAX_DETECTIONS
+from modules.print import bcolors
+
+class DetectionClient(Detection):
+    conn = None
+    shared_frame = None
+    # seconds between two connection attempts while the server is away
+    RECONNECT_INTERVAL = 1.0
+    connect_time = 0
+
+    def __init__(self, windowSize, model_file_path, classes, heightScaleFactor, address=None):
+        """
+        Constructor for the DetectionClient class
+
+        :param address (string): address of the server, the default one if None
+        """
+        super().__init__(windowSize, model_file_path, classes, heightScaleFactor)
+        self.address = address
+        # held while the shared memory is in use
+        self.client_lock = Lock()
+
+    def load_model(self, model_file_path):
+        """
+        the model is loaded by the inference server
+        """
+        self.engine = None
+        self.imgsz = Constants.imgsz
+        self.async_requests = 0
+
+    def start(self):
+        """
+        connect to the inference server, then start the detection thread
+        """
+        self.shared_frame = SharedArray((self.h, self.w, 3), np.uint8)
+        self.shared_boxes = SharedArray((MAX_DETECTIONS, 6), np.float32)
+        if not self.connect_server():
+            self.shared_frame.close()
+            self.shared_boxes.close()
+            self.shared_frame = None
+            raise Exception("The inference server is not running. \nPlease start it with python inference_server.py")
+        super().start()
+
+    def connect_server(self):
+        """
+        connect to the server and share the memory blocks with it
+        :return (boolean): False if the server could not be reached
+        """
+        self.connect_time = time()
+        conn = None
+        try:
+            conn = connect(self.address)
+            # the server decodes the boxes with the thresholds of this client
+            conn.send(("hello", self.shared_frame.spec(), self.shared_boxes.spec(), self.windowSize,
+                       self.thresholds.tolist()))
+            # wait for the server to attach to the shared memory
+            conn.recv()
+        except (EOFError, OSError, AuthenticationError):
+            if conn is not None:
+                conn.close()
+            return False
+        self.conn = conn
+        return True
+
+    def stop(self):
+        """
+        stop detection and disconnect from the server
+        """
+        super().stop()
+        self.client_lock.acquire()
+        if self.conn is not None:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.conn.close()
+            self.conn = None
+        if self.shared_frame is not None:
+            self.shared_frame.close()
+            self.shared_boxes.close()
+            self.shared_frame = None
+        self.client_lock.release()
+
+    def predict(self, screenshot):
+        """
+        run the model on the inference server
+        :return: the boxes, none while the server is away
+        """
+        boxes = np.zeros((0, 6), dtype=np.float32)
+        self.client_lock.acquire()
+        if (self.conn is None and self.shared_frame is not None
+            and time() > self.connect_time + self.RECONNECT_INTERVAL and self.connect_server()):
+            print(bcolors.OKGREEN + "Reconnected to the inference server" + bcolors.ENDC)
+        if self.conn is not None:
+            np.copyto(self.shared_frame.array, screenshot)
+            try:
+                self.conn.send(self.submitted_id)
+                count = self.conn.recv()
+                boxes = self.shared_boxes.array[:count].copy()
+            except (EOFError, BrokenPipeError, OSError):
+                print(bcolors.FAIL + "The inference server has stopped, reconnecting..." + bcolors.ENDC)
+                self.conn.close()
+                self.conn = None
+        self.client_lock.release()
+        return boxes
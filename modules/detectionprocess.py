@@ -0,0 +1,134 @@
+"""
+The detectionprocess module runs the model in a separate process so inference no
+longer competes for the GIL with capture, screendetect, the bot and the main loop.
+Frames are copied into a shared memory slot and the raw boxes come back through
+another shared memory block, only the frame sequence number and the box count go
+through the pipe. DetectionProcess has the same results, player_topleft and
+player_bottomright interface as Detection.
+"""
+
+import numpy as np
+from threading import Lock
+from time import time
+from multiprocessing import Process, Pipe
+from modules.detection import Detection
+from modules.sharedarray import SharedArray
+from modules.print import bcolors
+from constants import Constants
+
+# maximum number of boxes returned per frame
+MAX_DETECTIONS = 300
+# seconds the inference process has to load the model
+LOAD_TIMEOUT = 120
+
+def inference_worker(windowSize, model_file_path, classes, heightScaleFactor, frame_spec, boxes_spec, conn):
+    """
+    entry point of the inference process
+    """
+    frame = SharedArray.attach(frame_spec)
+    boxes = SharedArray.attach(boxes_spec)
+    detector = Detection(windowSize, model_file_path, classes, heightScaleFactor)
+    conn.send("ready")
+    while True:
+        message = conn.recv()
+        # None is sent to stop the worker
+        if message is None:
+            break
+        # the results are published by the main process, the cascade crop follows its player
+        detector.submitted_id, detector.crop_center = message
+        prediction = detector.predict(frame.array)
+        count = min(len(prediction), MAX_DETECTIONS)
+        boxes.array[:count] = prediction[:count]
+        conn.send(count)
+    frame.close()
+    boxes.close()
+
+class DetectionProcess(Detection):
+    process = None
+
+    def __init__(self, windowSize, model_file_path, classes, heightScaleFactor):
+        """
+        Constructor for the DetectionProcess class
+        """
+        super().__init__(windowSize, model_file_path, classes, heightScaleFactor)
+        self.heightScaleFactor = heightScaleFactor
+        # held while the shared memory is in use
+        self.process_lock = Lock()
+
+    def load_model(self, model_file_path):
+        """
+        the model is loaded by the inference process when the detection starts
+        """
+        self.model_file_path = model_file_path
+        self.engine = None
+        self.imgsz = Constants.imgsz
+
+    def start(self):
+        """
+        start the inference process, then the detection thread
+        """
+        self.shared_frame = SharedArray((self.h, self.w, 3), np.uint8)
+        self.shared_boxes = SharedArray((MAX_DETECTIONS, 6), np.float32)
+        self.conn, child_conn = Pipe()
+        self.process = Process(target=inference_worker,
+                               args=(self.windowSize, self.model_file_path, self.classes, self.heightScaleFactor,
+                                     self.shared_frame.spec(), self.shared_boxes.spec(), child_conn),
+                               daemon=True)
+        self.process.start()
+        # the parent end of the child connection must be closed to get EOF when the process dies
+        child_conn.close()
+        # wait for the model to be loaded
+        deadline = time() + LOAD_TIMEOUT
+        ready = False
+        while not ready and self.process.is_alive() and time() < deadline:
+            if self.conn.poll(0.1):
+                try:
+                    ready = self.conn.recv() == "ready"
+                except EOFError:
+                    break
+        if not ready:
+            self.process.terminate()
+            self.process = None
+            self.conn.close()
+            self.shared_frame.close()
+            self.shared_boxes.close()
+            raise Exception("The inference process could not load the model. \nPlease check the model path and the inference_engine at constants.py")
+        super().start()
+
+    def stop(self):
+        """
+        stop detection and the inference process
+        """
+        super().stop()
+        self.process_lock.acquire()
+        if self.process is not None:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self.process.join(timeout=5)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+            self.shared_frame.close()
+            self.shared_boxes.close()
+        self.process_lock.release()
+
+    def predict(self, screenshot):
+        """
+        run the model in the inference process
+        """
+        boxes = np.zeros((0, 6), dtype=np.float32)
+        self.process_lock.acquire()
+        if self.process is not None:
+            np.copyto(self.shared_frame.array, screenshot)
+            try:
+                # id of the frame being sent and the player the cascade crop is centred on
+                self.conn.send((self.submitted_id, self.player_center()))
+                count = self.conn.recv()
+                boxes = self.shared_boxes.array[:count].copy()
+            except (EOFError, BrokenPipeError, OSError):
+                print(bcolors.FAIL + "The inference process has stopped" + bcolors.ENDC)
+                self.stopped = True
+        self.process_lock.release()
+        return boxes
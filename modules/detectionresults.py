@@ -0,0 +1,80 @@
+"""
+The detectionresults module holds DetectionResults, the read-only snapshot the
+detection publishes for every frame. Detections are stored as a struct of arrays
+sorted by class and then by confidence, so results[class_id] is a slice (no copy)
+of the midpoints of that class with the most confident detection first.
+"""
+
+import copy
+import numpy as np
+
+class DetectionResults:
+    # Tracks of the tracker after this frame, None if tracking is disabled
+    tracks = None
+    # True when the detections of an earlier frame are republished for a static frame
+    reused = False
+
+    def __init__(self, boxes, midpoints, classes, confidences, num_classes, frame_id=0, timestamp=None):
+        """
+        Constructor for the DetectionResults class
+
+        :param boxes (ndarray): (n,4) x1, y1, x2, y2 in window coordinates
+        :param midpoints (ndarray): (n,2) x, y used by the bot
+        :param classes (ndarray): (n,) class id of each detection
+        :param confidences (ndarray): (n,) confidence of each detection
+        :param num_classes (int): number of classes of the model
+        :param frame_id (int): sequence number of the frame the detections came from
+        :param timestamp (float): capture time of that frame, None if unknown
+        """
+        order = np.lexsort((-confidences, classes))
+        self.boxes = boxes[order]
+        self.midpoints = midpoints[order]
+        self.classes = classes[order]
+        self.confidences = confidences[order]
+        self.num_classes = num_classes
+        self.frame_id = frame_id
+        self.timestamp = timestamp
+        # start and end of each class in the sorted arrays
+        self.offsets = np.searchsorted(self.classes, np.arange(num_classes + 1))
+        for array in (self.boxes, self.midpoints, self.classes, self.confidences, self.offsets):
+            array.flags.writeable = False
+
+    def as_reused(self, frame_id, timestamp=None):
+        """
+        :return (DetectionResults): the same detections republished for a static frame, the arrays are shared
+        """
+        results = copy.copy(self)
+        results.frame_id = frame_id
+        results.timestamp = timestamp
+        results.reused = True
+        return results
+
+    @classmethod
+    def empty(cls, num_classes, frame_id=0):
+        return cls(np.zeros((0, 4), dtype=np.int32), np.zeros((0, 2), dtype=np.int32),
+                   np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32), num_classes, frame_id)
+
+    def __len__(self):
+        return self.num_classes
+
+    def __getitem__(self, class_id):
+        """
+        midpoints of a class, most confident first
+        """
+        return self.midpoints[self.offsets[class_id]:self.offsets[class_id + 1]]
+
+    def __iter__(self):
+        for class_id in range(self.num_classes):
+            yield self[class_id]
+
+    def class_slice(self, class_id):
+        return slice(self.offsets[class_id], self.offsets[class_id + 1])
+
+    def boxes_of(self, class_id):
+        return self.boxes[self.class_slice(class_id)]
+
+    def confidences_of(self, class_id):
+        return self.confidences[self.class_slice(class_id)]
+
+    def count(self, class_id):
+        return int(self.offsets[class_id + 1] - self.offsets[class_id])
@@ -0,0 +1,112 @@
+"""
+The framering module holds a fixed number of preallocated BGR frame slots.
+The capture thread fills the slots in place and every published frame gets a
+monotonically increasing sequence number and a capture timestamp, so consumers
+can borrow a frame without copying it and know which frame a result came from.
+"""
+
+import numpy as np
+from threading import Lock
+
+class Frame:
+    """
+    A published slot of a FrameRing
+    """
+    def __init__(self, ring, slot, seq, timestamp):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.image = ring.images[slot]
+
+    def acquire(self):
+        """
+        pin the slot so the capture thread does not overwrite it while in use
+        :return (boolean): False if the slot already holds a newer frame
+        """
+        return self.ring.pin(self.slot, self.seq)
+
+    def release(self):
+        """
+        unpin the slot
+        """
+        self.ring.unpin(self.slot)
+
+class FrameRing:
+    def __init__(self, w, h, slots=4, channels=3):
+        """
+        Constructor for the FrameRing class
+
+        :param w (int): frame width
+        :param h (int): frame height
+        :param slots (int): number of preallocated frames
+        :param channels (int): 3 for BGR frames
+        """
+        assert slots >= 3, "FrameRing needs at least 3 slots (writing, latest and borrowed)"
+        self.lock = Lock()
+        self.images = np.zeros((slots, h, w, channels), dtype=np.uint8)
+        # sequence number and capture time of the frame in each slot, 0 means empty
+        self.seqs = np.zeros(slots, dtype=np.int64)
+        self.timestamps = np.zeros(slots, dtype=np.float64)
+        self.pins = np.zeros(slots, dtype=np.int32)
+        self.last_seq = 0
+        self.latest_slot = None
+
+    def claim(self):
+        """
+        get the slot the capture thread should fill next: the oldest slot
+        that is neither pinned nor the latest published frame
+        :return (int): slot index or None if every slot is in use
+        """
+        self.lock.acquire()
+        slot = None
+        for i in np.argsort(self.seqs):
+            if self.pins[i] == 0 and i != self.latest_slot:
+                slot = int(i)
+                break
+        if slot is not None:
+            # the slot is about to be overwritten
+            self.seqs[slot] = 0
+        self.lock.release()
+        return slot
+
+    def publish(self, slot, timestamp):
+        """
+        make a filled slot the latest frame
+        :return (Frame): the published frame
+        """
+        self.lock.acquire()
+        self.last_seq += 1
+        self.seqs[slot] = self.last_seq
+        self.timestamps[slot] = timestamp
+        self.latest_slot = slot
+        frame = Frame(self, slot, self.last_seq, timestamp)
+        self.lock.release()
+        return frame
+
+    def latest(self):
+        """
+        get the latest frame without pinning it
+        :return (Frame): latest frame or None if nothing was published yet
+        """
+        self.lock.acquire()
+        frame = None
+        if self.latest_slot is not None:
+            slot = self.latest_slot
+            frame = Frame(self, slot, int(self.seqs[slot]), float(self.timestamps[slot]))
+        self.lock.release()
+        return frame
+
+    def pin(self, slot, seq):
+        self.lock.acquire()
+        success = self.seqs[slot] == seq
+        if success:
+            self.pins[slot] += 1
+        self.lock.release()
+        return bool(success)
+
+    def unpin(self, slot):
+        self.lock.acquire()
+        if self.pins[slot] > 0:
+            self.pins[slot] -= 1
+        self.lock.release()
@@ -0,0 +1,238 @@
+"""
+The framesource module holds the common interface of every capture backend.
+A frame source owns a capture thread that fills a FrameRing, keeps self.screenshot
+pointing at the latest frame and reports the window dimension and offsets the rest
+of the bot relies on.
+e.g. WindowCapture grabs the Bluestacks window, ReplayCapture plays back a recording.
+"""
+
+import numpy as np
+from threading import Thread, Lock, Condition
+from time import time, sleep
+from constants import Constants
+from modules.framering import FrameRing
+from modules.channel import Channel
+
+class FrameSource:
+    # threading properties
+    stopped = True
+    lock = None
+    screenshot = None
+    # latest published Frame of the ring and its sequence number
+    ring = None
+    frame = None
+    frame_id = 0
+    # SessionRecorder the frames are recorded to
+    recorder = None
+    # FrameGovernor pacing the capture, None captures as fast as possible
+    governor = None
+    # set when the source has no more frames to give (e.g. end of a replay)
+    finished = False
+    # capture the next frame only once the last one was consumed, so a replay gives the same results on every run
+    lockstep = False
+    consumed_id = 0
+    # properties
+    w = 0
+    h = 0
+    offset_x = 0
+    offset_y = 0
+    offsets = (0,0)
+    fps = 0
+    avg_fps = 0
+    # window geometry used by main.py to decide when to exit the bot
+    scaling = 1
+    border_pixels = 0
+    titlebar_pixels = 0
+    left = 0
+    top = 0
+    right = 0
+    bottom = 0
+    screen_resolution = (0,0)
+
+    def __init__(self):
+        """
+        Constructor for the FrameSource class
+        """
+        # create a thread lock object
+        self.lock = Lock()
+        # every published Frame
+        self.frames = Channel()
+        # wakes the capture thread in lockstep when a frame is consumed
+        self.consumed = Condition()
+
+    def set_window(self):
+        """
+        focus the source window, nothing to do by default
+        """
+        pass
+
+    def get_dimension(self):
+        """
+        get the width and the height of the frames
+        """
+        return self.w,self.h
+
+    def grab(self, out):
+        """
+        fill out (a preallocated h x w x 3 BGR array) with the next frame in place
+
+        :return (boolean): False when the source is exhausted
+        """
+        raise NotImplementedError
+
+    def release(self):
+        """
+        free the resources held by the capture thread, called when it exits
+        """
+        pass
+
+    def get_screenshot(self):
+        """
+        take a single screenshot into a new array
+        """
+        img = np.empty((self.h, self.w, 3), dtype=np.uint8)
+        if not self.grab(img):
+            return None
+        return img
+
+    def grab_regions(self, regions, outs):
+        """
+        copy a list of small regions of the window into preallocated arrays at once,
+        by default they are sliced out of the latest frame: a stream or a replay has no
+        other pixels than its frames, so the probes are as fresh as the capture (paced
+        by the governor, a few fps in the menus). Sources that can read the window
+        directly (WindowCapture, X11Capture) override it so the probes do not wait for the capture
+
+        :param regions (list): (x, y, w, h) tuples in window coordinates
+        :param outs (list): h x w x 3 BGR arrays, one per region
+        :return (boolean): False when no frame is available
+        """
+        # only the capture thread grabs, the regions wait for its first frame
+        for _ in range(3):
+            frame = self.frame
+            if frame is None:
+                return False
+            # pin the slot so the capture thread does not overwrite it during the copy
+            if frame.acquire():
+                break
+        else:
+            return False
+        for (x, y, w, h), out in zip(regions, outs):
+            np.copyto(out, frame.image[y:y+h, x:x+w])
+        frame.release()
+        return True
+
+    def consume(self, frame_id):
+        """
+        mark the frames up to frame_id as processed (detected and given to the bot),
+        in lockstep the next frame is only captured then
+        """
+        self.consumed.acquire()
+        self.consumed_id = max(self.consumed_id, frame_id)
+        self.consumed.notify_all()
+        self.consumed.release()
+
+    def wait_consumed(self):
+        """
+        wait until the last published frame was consumed or the source is stopped
+        """
+        self.consumed.acquire()
+        while not self.stopped and self.frame_id > self.consumed_id:
+            self.consumed.wait(0.1)
+        self.consumed.release()
+
+    def get_frame(self):
+        """
+        get the latest Frame (image, seq and timestamp) without copying it
+        """
+        return self.frame
+
+    @staticmethod
+    def list_window_names():
+        """
+        print the name of the windows this source can capture
+        """
+        pass
+
+    # threading methods
+    def start(self):
+        """
+        start the capture thread
+        """
+        self.stopped = False
+        self.loop_time = time()
+        self.count = 0
+        if self.ring is None:
+            self.ring = FrameRing(self.w, self.h, Constants.ring_slots)
+        t = Thread(target=self.run)
+        t.setDaemon(True)
+        t.start()
+
+    def stop(self):
+        """
+        stop the capture thread
+        """
+        self.stopped = True
+
+    def run(self):
+        while not self.stopped:
+            if self.lockstep:
+                self.wait_consumed()
+                if self.stopped:
+                    break
+            start = time()
+            slot = self.ring.claim()
+            if slot is None:
+                # every slot is borrowed, wait for a consumer to release one
+                sleep(0.001)
+                continue
+            # get an updated image of the game straight into the ring
+            if not self.grab(self.ring.images[slot]):
+                self.finished = True
+                self.stopped = True
+                break
+            frame = self.ring.publish(slot, time())
+            # lock the thread while updating the results
+            self.lock.acquire()
+            self.frame = frame
+            self.frame_id = frame.seq
+            self.screenshot = frame.image
+            self.lock.release()
+            self.frames.publish(frame)
+            if self.recorder:
+                self.recorder.record_frame(frame.image, frame.seq, frame.timestamp)
+            if self.governor:
+                self.governor.pace(start)
+
+            self.fps = (1 / max(time() - self.loop_time, 1e-6))
+            self.loop_time = time()
+            self.count += 1
+            if self.count == 1:
+                self.avg_fps = self.fps
+            else:
+                self.avg_fps = (self.avg_fps*self.count+self.fps)/(self.count + 1)
+        self.release()
+
+def create_frame_source(backend=None):
+    """
+    create the frame source selected at constants.py
+
+    :param backend (string): name of the backend, defaults to Constants.capture_backend
+    :return: FrameSource
+    """
+    backend = backend or Constants.capture_backend
+    # backends are imported lazily so that e.g. replay works without win32
+    if backend == "window":
+        from modules.windowcapture import WindowCapture
+        return WindowCapture(Constants.window_name)
+    elif backend == "x11":
+        from modules.x11capture import X11Capture
+        return X11Capture(Constants.window_name, Constants.x11_display)
+    elif backend == "stream":
+        from modules.streamcapture import StreamCapture
+        return StreamCapture(Constants.stream_address, Constants.stream_size, Constants.stream_offsets)
+    elif backend == "replay":
+        from modules.replaycapture import ReplayCapture
+        return ReplayCapture(Constants.replay_path, realtime=Constants.replay_realtime,
+                             fps=Constants.replay_fps, loop=Constants.replay_loop, lockstep=Constants.replay_lockstep)
+    raise Exception(f"Unknown capture backend \"{backend}\". \nPlease change the capture_backend at constants.py")
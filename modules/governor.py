@@ -0,0 +1,130 @@
+"""
+The governor module paces the capture and the detection threads from what the
+bot is doing. Fights (MOVING and ATTACKING) run at full rate, while HIDING, the
+menus and the loading screen run at a few frames per second since almost
+nothing changes there. The CPU time of the process is measured and every rate
+is scaled down when it goes over the CPU budget, so more instances fit on one
+host. States without a rate of their own are capped from the rate they reached
+unpaced, and never go under min_fps to keep the reaction of the bot in fights.
+"""
+
+from threading import Condition
+from time import time, process_time
+from modules.bot import BotState
+from modules.screendetect import Detectstate
+
+class FrameGovernor:
+    # frame rates of the threads, None is not paced
+    capture_fps = None
+    inference_fps = None
+    # fraction of the rates allowed by the CPU budget
+    scale = 1.0
+    cpu_usage = 0
+
+    def __init__(self, rates, cpu_budget=None, min_fps=10, min_scale=0.25, window=1.0):
+        """
+        Constructor for the FrameGovernor class
+
+        :param rates (dict): capture and inference fps of each state, a BotState name,
+                             "MENU" or "LOAD", a state without rates is not paced
+        :param cpu_budget (float): cores the process may use, None for no budget
+        :param min_fps (float): the budget does not bring the states without a rate under this
+        :param min_scale (float): the budget does not bring the rate of a state under this fraction of it
+        :param window (float): seconds over which the cpu usage is measured
+        """
+        self.rates = rates
+        self.cpu_budget = cpu_budget
+        self.min_fps = min_fps
+        self.min_scale = min_scale
+        self.window = window
+        self.state = None
+        # wakes the paced threads when the rates change
+        self.condition = Condition()
+        self.cpu_time = process_time()
+        self.measure_time = time()
+        # frames of each thread in the current window, and their rate while nothing paces them
+        self.frames = {False: 0, True: 0}
+        self.free_fps = {False: None, True: None}
+
+    @staticmethod
+    def state_name(bot, screendetect):
+        """
+        :return (string): BotState name while the bot plays, "LOAD" or "MENU" otherwise
+        """
+        if not bot.stopped:
+            return BotState.names[bot.state]
+        if screendetect.state == Detectstate.LOAD:
+            return "LOAD"
+        return "MENU"
+
+    def scaled(self, fps, inference=False):
+        """
+        :return (float): rate allowed by the budget, None is not paced
+        """
+        if fps is None:
+            free_fps = self.free_fps[inference]
+            if self.scale >= 1 or free_fps is None:
+                return None
+            return max(free_fps*self.scale, self.min_fps)
+        return fps*max(self.scale, self.min_scale)
+
+    def measure(self):
+        """
+        update the cpu usage and the budget scale once per window
+        :return (boolean): True if the scale changed
+        """
+        now = time()
+        if self.cpu_budget is None or now - self.measure_time < self.window:
+            return False
+        cpu_time = process_time()
+        elapsed = now - self.measure_time
+        self.cpu_usage = (cpu_time - self.cpu_time)/elapsed
+        for inference in self.frames:
+            # the rate reached while unpaced is the reference of the cap
+            if (self.inference_fps if inference else self.capture_fps) is None:
+                self.free_fps[inference] = self.frames[inference]/elapsed
+            self.frames[inference] = 0
+        self.cpu_time = cpu_time
+        self.measure_time = now
+        scale = self.scale
+        if self.cpu_usage > self.cpu_budget:
+            self.scale = max(0.1, self.scale*self.cpu_budget/self.cpu_usage)
+        elif self.cpu_usage < 0.8*self.cpu_budget:
+            # recover slowly so the usage does not oscillate around the budget
+            self.scale = min(1.0, self.scale*1.25)
+        return self.scale != scale
+
+    def update(self, bot, screendetect):
+        """
+        set the rates of the current state, called from the main loop
+        """
+        state = self.state_name(bot, screendetect)
+        if not self.measure() and state == self.state:
+            return
+        capture_fps, inference_fps = self.rates.get(state, (None, None))
+        self.condition.acquire()
+        self.state = state
+        self.capture_fps = self.scaled(capture_fps)
+        self.inference_fps = self.scaled(inference_fps, inference=True)
+        self.condition.notify_all()
+        self.condition.release()
+
+    def pace(self, loop_start, inference=False):
+        """
+        sleep until the next frame of a thread is due, the sleep ends early
+        if the rates change (e.g. a fight starts while hiding)
+
+        :param loop_start (float): time the last frame of the thread started
+        :param inference (boolean): pace the detection thread instead of the capture thread
+        """
+        self.condition.acquire()
+        self.frames[inference] += 1
+        while True:
+            fps = self.inference_fps if inference else self.capture_fps
+            if not fps:
+                break
+            remaining = loop_start + 1/fps - time()
+            if remaining <= 0:
+                break
+            self.condition.wait(remaining)
+        self.condition.release()
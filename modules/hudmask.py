@@ -0,0 +1,110 @@
+"""
+The hudmask module removes the fixed HUD from what the model sees. The inference
+region drops the HUD bands at the edges of the window before the frame is
+letterboxed, so fewer pixels are processed, and the HUD elements inside the region
+(joystick, attack buttons, kill counter) are painted with the padding colour in the
+input tensor. Detections whose midpoint falls on the HUD are dropped.
+"""
+
+import numpy as np
+
+class InferenceRegion:
+    def __init__(self, windowSize, crop=(0, 0, 0, 0), masks=()):
+        """
+        Constructor for the InferenceRegion class
+
+        :param windowSize (tuple): width and height of the window
+        :param crop (tuple): fraction of the window removed at the left, top, right and bottom
+        :param masks (list): x1, y1, x2, y2 fractions of the window covered by the HUD
+        """
+        self.window_w, self.window_h = windowSize
+        w, h = windowSize
+        self.x = round(w*crop[0])
+        self.y = round(h*crop[1])
+        self.w = w - round(w*crop[2]) - self.x
+        self.h = h - round(h*crop[3]) - self.y
+        if self.w <= 0 or self.h <= 0:
+            raise Exception(f"The HUD crop {crop} removes the whole window")
+        self.size = (self.w, self.h)
+        # HUD rectangles in window coordinates
+        self.masks = np.array([[round(w*x1), round(h*y1), round(w*x2), round(h*y2)] for x1, y1, x2, y2 in masks],
+                              dtype=np.int32).reshape(-1, 4)
+
+    def crop(self, screenshot):
+        """
+        :return (ndarray): view of the inference region of the screenshot
+        """
+        return screenshot[self.y:self.y + self.h, self.x:self.x + self.w]
+
+    def to_window(self, boxes):
+        """
+        map x1, y1, x2, y2 boxes from region to window coordinates in place
+        """
+        boxes[:, [0, 2]] += self.x
+        boxes[:, [1, 3]] += self.y
+        return boxes
+
+    def tensor_masks(self, letterbox):
+        """
+        :param letterbox (Letterbox): letterbox of the region into the input tensor
+        :return (list): y and x slices of the tensor covered by each mask
+        """
+        boxes = self.masks.astype(np.float32)
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]] - self.x, 0, self.w)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]] - self.y, 0, self.h)
+        boxes = letterbox.to_input(boxes)
+        slices = []
+        for x1, y1, x2, y2 in boxes:
+            if x2 > x1 and y2 > y1:
+                slices.append((slice(int(y1), int(np.ceil(y2))), slice(int(x1), int(np.ceil(x2)))))
+        return slices
+
+    @staticmethod
+    def paint(tensor, slices, value=114/255):
+        """
+        fill the masked parts of a (1, 3, h, w) or (3, h, w) tensor with the padding colour
+        """
+        for rows, columns in slices:
+            tensor[..., rows, columns] = value
+        return tensor
+
+    def on_hud(self, points):
+        """
+        :param points (ndarray): (n,2) x, y in window coordinates
+        :return (ndarray): (n,) True for the points outside the region or on a mask
+        """
+        points = np.asarray(points).reshape(-1, 2)
+        x = points[:, 0:1]
+        y = points[:, 1:2]
+        outside = ((x[:, 0] < self.x) | (x[:, 0] >= self.x + self.w) |
+                   (y[:, 0] < self.y) | (y[:, 0] >= self.y + self.h))
+        masked = ((x >= self.masks[:, 0]) & (x < self.masks[:, 2]) &
+                  (y >= self.masks[:, 1]) & (y < self.masks[:, 3])).any(axis=1)
+        return outside | masked
+
+    def keep(self, boxes):
+        """
+        :return (ndarray): (n,) True for the boxes whose centre is not on the HUD
+        """
+        return ~self.on_hud((boxes[:, :2] + boxes[:, 2:4])/2)
+
+    def filter(self, boxes):
+        """
+        drop the boxes whose centre is on the HUD
+        """
+        if len(self.masks) == 0 or len(boxes) == 0:
+            return boxes
+        return boxes[self.keep(boxes)]
+
+    def tile_mask(self, tile_w, tile_h):
+        """
+        express the region in the tile grid of the bot
+
+        :param tile_w (int): tiles across the window
+        :param tile_h (int): tiles down the window
+        :return (ndarray): (tile_h, tile_w) True for the tiles whose centre is not on the HUD
+        """
+        columns, rows = np.meshgrid((np.arange(tile_w) + 0.5)*self.window_w/tile_w,
+                                    (np.arange(tile_h) + 0.5)*self.window_h/tile_h)
+        centres = np.stack([columns.ravel(), rows.ravel()], axis=1)
+        return ~self.on_hud(centres).reshape(tile_h, tile_w)
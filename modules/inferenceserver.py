@@ -0,0 +1,302 @@
+"""
+The inferenceserver module loads the model once and serves the bots running in
+other processes. Each client shares a frame block and a box block (SharedArray)
+and only sends the frame sequence number over a Unix domain socket (a named pipe
+on Windows); the server replies with the number of boxes written.
+
+Requests of several clients are batched dynamically: the first request waits at
+most max_wait seconds for others, up to max_batch frames, then the batch goes
+through the model at once (openvino takes any batch size, the other engines run
+the frames one after the other on the same model). Each client sends its class
+thresholds when it connects, the HUD region comes from the constants.py of the
+server.
+
+The server writes a random key readable only by its user next to the socket,
+clients authenticate with it so other local users cannot make the server
+attach to and write into their shared memory.
+"""
+
+import os
+import socket
+import tempfile
+from queue import Queue, Empty
+from threading import Thread, Lock
+from time import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+from constants import Constants
+from modules.sharedarray import SharedArray
+from modules.preprocess import Letterbox
+from modules.hudmask import InferenceRegion
+from modules.postprocess import YoloPostprocessor
+from modules.detection import inference_settings
+from modules.print import bcolors
+
+# maximum number of boxes returned per frame
+MAX_DETECTIONS = 300
+
+def server_address(address=None):
+    """
+    :return (tuple): address and connection family of the server
+    """
+    if os.name == "nt":
+        return address or r"\\.\pipe\brawlbot_inference", "AF_PIPE"
+    return address or "/tmp/brawlbot_inference.sock", "AF_UNIX"
+
+def authkey_path(address):
+    """
+    :return (string): file of the key the clients authenticate with
+    """
+    if os.name == "nt":
+        return os.path.join(tempfile.gettempdir(), os.path.basename(address) + ".key")
+    return address + ".key"
+
+def connect(address=None):
+    """
+    connect a client to the server
+    """
+    address, family = server_address(address)
+    with open(authkey_path(address), "rb") as file:
+        authkey = file.read()
+    return Client(address, family=family, authkey=authkey)
+
+class ClientSession:
+    def __init__(self, conn, frame_spec, boxes_spec, windowSize, thresholds, imgsz):
+        """
+        Constructor for the ClientSession class, the state the server keeps per client
+
+        :param thresholds (list): class thresholds of the client
+        """
+        w, h = windowSize
+        # the declared blocks must be the ones a DetectionClient of this window creates
+        if (tuple(frame_spec[0]), frame_spec[1]) != ((h, w, 3), "|u1") or \
+           (tuple(boxes_spec[0]), boxes_spec[1]) != ((MAX_DETECTIONS, 6), "<f4"):
+            raise ValueError(f"Unexpected shared memory of a client with window size {windowSize}")
+        self.conn = conn
+        self.postprocessor = YoloPostprocessor(thresholds)
+        # ultralytics drops the boxes below every class threshold before NMS
+        self.min_threshold = float(min(thresholds)) - 0.005
+        self.frame = SharedArray.attach(frame_spec)
+        self.boxes = SharedArray.attach(boxes_spec)
+        # same inference region as the Detection of the client
+        crop, masks = Constants.hud_profiles.get(tuple(windowSize), (Constants.hud_crop, Constants.hud_masks))
+        if not Constants.hud_masking:
+            crop, masks = (0, 0, 0, 0), ()
+        self.region = InferenceRegion(windowSize, crop, masks)
+        self.letterbox = Letterbox(self.region.size, imgsz)
+        self.tensor_masks = self.region.tensor_masks(self.letterbox)
+
+    def prepare(self, tensor=None):
+        """
+        letterbox the inference region of the shared frame and hide the HUD
+        """
+        tensor = self.letterbox.preprocess(self.region.crop(self.frame.array), tensor)
+        return self.region.paint(tensor, self.tensor_masks)
+
+    def to_window(self, boxes):
+        """
+        map boxes from the input tensor to the window and drop the ones on the HUD
+        """
+        return self.region.filter(self.region.to_window(self.letterbox.to_window(boxes))).copy()
+
+    def reply(self, boxes):
+        count = min(len(boxes), MAX_DETECTIONS)
+        self.boxes.array[:count] = boxes[:count]
+        try:
+            self.conn.send(count)
+        except (BrokenPipeError, OSError):
+            pass
+
+    def close(self):
+        self.frame.close()
+        self.boxes.close()
+        self.conn.close()
+
+class InferenceServer:
+    stopped = True
+
+    def __init__(self, model_file_path, address=None, max_batch=4, max_wait=0.005):
+        """
+        Constructor for the InferenceServer class
+
+        :param model_file_path (string): model loaded once for every client
+        :param address (string): socket path (or pipe name on Windows), a default is used if None
+        :param max_batch (int): maximum frames per inference
+        :param max_wait (float): seconds the first request of a batch waits for the others
+        """
+        self.lock = Lock()
+        self.address, self.family = server_address(address)
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # (session, True) for a frame to run, (session, False) once the client has disconnected
+        self.requests = Queue()
+        self.sessions = []
+        self.batches = 0
+        self.frames = 0
+        self.load_model(model_file_path)
+        if self.batched:
+            self.tensor = Letterbox((self.imgsz[1], self.imgsz[0]), self.imgsz).new_tensor(max_batch)
+            # the same view object for each batch size so the input stays bound while the size does not change
+            self.views = [self.tensor[:size] for size in range(1, max_batch + 1)]
+            # letterbox geometry of the frame last written to each slot, the tensor starts as padding only
+            self.slot_geometry = [None]*max_batch
+
+    def load_model(self, model_file_path):
+        """
+        load the model shared by every client
+        """
+        self.engine = None
+        self.batched = False
+        # the same engine as a Detection with these constants, tuned config included
+        settings = inference_settings(model_file_path)
+        self.imgsz = settings["imgsz"]
+        if settings["engine"] == "ultralytics":
+            from ultralytics import YOLO
+            self.model = YOLO(settings["model_path"],task="detect")
+            return
+        from modules.backends import create_backend
+        options = dict(settings["options"])
+        if settings["engine"] == "openvino":
+            options["batch"] = -1
+            options["config"] = {**options.get("config", {}), "PERFORMANCE_HINT": "THROUGHPUT"}
+            self.batched = True
+        self.engine = create_backend(settings["engine"], settings["model_path"], imgsz=self.imgsz, **options)
+        self.imgsz = self.engine.imgsz
+
+    def predict(self, sessions):
+        """
+        run the frame of every session through the model
+        :return (list): (n,6) boxes in window coordinates of each session
+        """
+        if self.engine is None:
+            images = [session.region.crop(session.frame.array) for session in sessions]
+            results = self.model.predict(images, imgsz=Constants.imgsz, conf=min(session.min_threshold for session in sessions),
+                                         half=Constants.half, verbose=False)
+            return [session.region.filter(session.region.to_window(result.boxes.data.cpu().numpy()))
+                    for session, result in zip(sessions, results)]
+        if self.batched:
+            for i, session in enumerate(sessions):
+                # clients of another aspect ratio would leave their pixels in the padding
+                if self.slot_geometry[i] != session.letterbox.geometry:
+                    session.letterbox.fill_padding(self.tensor[i])
+                    self.slot_geometry[i] = session.letterbox.geometry
+                session.prepare(self.tensor[i])
+            output = self.engine.infer(self.views[len(sessions) - 1])
+            return [session.to_window(session.postprocessor(output[i:i + 1])) for i, session in enumerate(sessions)]
+        return [session.to_window(session.postprocessor(self.engine.infer(session.prepare()))) for session in sessions]
+
+    def next_batch(self):
+        """
+        wait for a request, then for more until the batch is full or max_wait has passed
+        :return (tuple): sessions of the batch and sessions that disconnected, both empty if no request came
+        """
+        sessions = []
+        closed = []
+        deadline = None
+        while len(sessions) < self.max_batch:
+            timeout = 0.1 if deadline is None else deadline - time()
+            if timeout <= 0:
+                break
+            try:
+                session, request = self.requests.get(timeout=timeout)
+            except Empty:
+                break
+            if request:
+                sessions.append(session)
+            else:
+                closed.append(session)
+            if deadline is None:
+                deadline = time() + self.max_wait
+        return sessions, closed
+
+    def run_batches(self):
+        while not self.stopped:
+            sessions, closed = self.next_batch()
+            if sessions:
+                for session, boxes in zip(sessions, self.predict(sessions)):
+                    session.reply(boxes)
+                self.batches += 1
+                self.frames += len(sessions)
+            # the requests of a session are queued before it is closed, so none is left
+            for session in closed:
+                session.close()
+
+    def handle_client(self, conn):
+        """
+        read the requests of a client until it disconnects
+        """
+        try:
+            _, frame_spec, boxes_spec, windowSize, thresholds = conn.recv()
+            session = ClientSession(conn, frame_spec, boxes_spec, windowSize, thresholds, self.imgsz)
+            conn.send("ready")
+        except (EOFError, OSError, ValueError):
+            conn.close()
+            return
+        self.lock.acquire()
+        self.sessions.append(session)
+        self.lock.release()
+        print(bcolors.OKBLUE + f"Client connected ({len(self.sessions)} connected)" + bcolors.ENDC)
+        while not self.stopped:
+            try:
+                message = conn.recv()
+            except (EOFError, OSError):
+                break
+            # None is sent by a client that stops
+            if message is None:
+                break
+            self.requests.put((session, True))
+        self.lock.acquire()
+        self.sessions.remove(session)
+        self.lock.release()
+        # the batch thread may still read the shared memory of a queued request, it closes the session
+        self.requests.put((session, False))
+        print(bcolors.OKBLUE + f"Client disconnected ({len(self.sessions)} connected)" + bcolors.ENDC)
+
+    def serve_forever(self):
+        """
+        accept clients until stop is called
+        """
+        if self.family == "AF_UNIX" and os.path.exists(self.address):
+            probe = socket.socket(socket.AF_UNIX)
+            try:
+                probe.connect(self.address)
+                running = True
+            except OSError:
+                running = False
+            probe.close()
+            if running:
+                raise Exception(f"An inference server is already running on {self.address}")
+            # left behind by a server that did not exit cleanly
+            os.remove(self.address)
+        authkey = os.urandom(32)
+        key_path = authkey_path(self.address)
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        # only the user running the server can read the key
+        fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as file:
+            file.write(authkey)
+        self.listener = Listener(self.address, family=self.family, authkey=authkey)
+        self.stopped = False
+        t = Thread(target=self.run_batches, daemon=True)
+        t.start()
+        print(bcolors.OKGREEN + f"Inference server listening on {self.address}" + bcolors.ENDC)
+        while not self.stopped:
+            try:
+                conn = self.listener.accept()
+            except (AuthenticationError, EOFError):
+                print(bcolors.WARNING + "Rejected a client that did not authenticate" + bcolors.ENDC)
+                continue
+            except OSError:
+                break
+            t = Thread(target=self.handle_client, args=(conn,), daemon=True)
+            t.start()
+
+    def stop(self):
+        self.stopped = True
+        self.listener.close()
+        key_path = authkey_path(self.address)
+        if os.path.exists(key_path):
+            os.remove(key_path)
+        if self.batches:
+            print(f"Served {self.frames} frames in {self.batches} batches ({self.frames/self.batches:.2f} frames per batch)")
@@ -0,0 +1,72 @@
+"""
+The inputs module gives the pyautogui the bot sends its clicks and key presses
+with. A replay has no window to play in and may run on a machine without a
+display (where importing pyautogui fails), so its inputs go to HeadlessInput,
+which keeps the cursor position and does nothing else.
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+from constants import Constants
+
+def has_display():
+    """
+    :return (boolean): False if windows cannot be shown e.g. on a Linux server without X or Wayland
+    """
+    if os.name == "nt" or sys.platform == "darwin":
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+class HeadlessInput:
+    """
+    the pyautogui functions used by the bot, without any effect
+    """
+    def __init__(self):
+        self.x = 0
+        self.y = 0
+
+    def position(self):
+        return self.x, self.y
+
+    def moveTo(self, x=None, y=None, *args, **kwargs):
+        if x is not None and y is not None:
+            self.x, self.y = x, y
+
+    def click(self, x=None, y=None, *args, **kwargs):
+        self.moveTo(x, y)
+
+    def mouseDown(self, x=None, y=None, *args, **kwargs):
+        self.moveTo(x, y)
+
+    def mouseUp(self, x=None, y=None, *args, **kwargs):
+        self.moveTo(x, y)
+
+    def press(self, *args, **kwargs):
+        pass
+
+    def keyDown(self, *args, **kwargs):
+        pass
+
+    def keyUp(self, *args, **kwargs):
+        pass
+
+    @contextmanager
+    def hold(self, *args, **kwargs):
+        yield
+
+    def pixelMatchesColor(self, *args, **kwargs):
+        # there is no screen to read, the RegionProbe reads the replay
+        return False
+
+def load_input():
+    """
+    :return: pyautogui, or a HeadlessInput when the capture_backend is "replay"
+    """
+    # a replay must not click on whatever is on the real screen
+    if Constants.capture_backend == "replay":
+        return HeadlessInput()
+    import pyautogui
+    return pyautogui
+
+py = load_input()
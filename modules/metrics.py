@@ -0,0 +1,143 @@
+"""
+The metrics module compares sets of (n,6) x1, y1, x2, y2, confidence, class id
+boxes, e.g. the detections of two models or of a model and the labels.
+"""
+
+import numpy as np
+
+def box_iou(a, b):
+    """
+    :param a (ndarray): (n,4+) boxes
+    :param b (ndarray): (m,4+) boxes
+    :return (ndarray): (n,m) intersection over union
+    """
+    a = np.asarray(a, dtype=np.float32)[:, None, :4]
+    b = np.asarray(b, dtype=np.float32)[None, :, :4]
+    w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    intersection = w*h
+    area_a = (a[..., 2] - a[..., 0])*(a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0])*(b[..., 3] - b[..., 1])
+    return intersection/np.maximum(area_a + area_b - intersection, 1e-9)
+
+def match_boxes(predictions, targets, iou_threshold=0.5):
+    """
+    greedily match the predictions to targets of the same class, most confident first
+
+    :param predictions (ndarray): (n,6) boxes
+    :param targets (ndarray): (m,5) or (m,6) boxes with the class id in the last column
+    :return (ndarray): (n,) True for the predictions matched to a target
+    """
+    predictions = np.asarray(predictions, dtype=np.float32).reshape(-1, 6)
+    targets = np.asarray(targets, dtype=np.float32)
+    matched = np.zeros(len(predictions), dtype=bool)
+    if len(predictions) == 0 or len(targets) == 0:
+        return matched
+    target_classes = targets[:, -1]
+    iou = box_iou(predictions, targets)
+    # a prediction can only match a target of its class
+    iou[predictions[:, 5][:, None] != target_classes[None, :]] = 0
+    used = np.zeros(len(targets), dtype=bool)
+    for i in np.argsort(-predictions[:, 4], kind="stable"):
+        candidates = np.where(used, 0, iou[i])
+        j = candidates.argmax()
+        if candidates[j] >= iou_threshold:
+            matched[i] = True
+            used[j] = True
+    return matched
+
+# IoU thresholds of mAP50-95
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+def match_thresholds(predictions, targets, iou_thresholds=IOU_THRESHOLDS):
+    """
+    :return (ndarray): (n, len(iou_thresholds)) True for the predictions matched at each IoU threshold
+    """
+    return np.stack([match_boxes(predictions, targets, iou) for iou in iou_thresholds], axis=1).reshape(-1, len(iou_thresholds))
+
+def average_precision(confidences, tp, n_targets):
+    """
+    area under the precision recall curve with 101 point interpolation
+
+    :param confidences (ndarray): (n,) confidence of the predictions of one class
+    :param tp (ndarray): (n,t) True for the predictions matched at each IoU threshold
+    :param n_targets (int): number of labels of the class
+    :return (ndarray): (t,) average precision at each IoU threshold
+    """
+    if n_targets == 0 or len(confidences) == 0:
+        return np.zeros(tp.shape[1])
+    order = np.argsort(-confidences, kind="stable")
+    tp = tp[order].astype(np.float64)
+    true_positives = np.cumsum(tp, axis=0)
+    false_positives = np.cumsum(1 - tp, axis=0)
+    recall = true_positives/n_targets
+    precision = true_positives/(true_positives + false_positives)
+    points = np.linspace(0, 1, 101)
+    ap = np.zeros(tp.shape[1])
+    for i in range(tp.shape[1]):
+        # precision envelope, then the precision at each recall point
+        envelope = np.flip(np.maximum.accumulate(np.flip(np.concatenate([[1.0], precision[:, i], [0.0]]))))
+        curve = np.concatenate([[0.0], recall[:, i], [1.0]])
+        ap[i] = np.mean(envelope[np.minimum(np.searchsorted(curve, points, side="left"), len(envelope) - 1)])
+    return ap
+
+def precision_recall(confidences, tp, n_targets, threshold):
+    """
+    precision and recall at IoU 0.5 of the predictions kept by a confidence threshold,
+    rounded like Detection.build_results
+    """
+    keep = np.round(confidences, 2) >= threshold
+    kept = int(keep.sum())
+    matched = int(tp[keep, 0].sum()) if kept else 0
+    precision = matched/kept if kept else 0.0
+    recall = matched/n_targets if n_targets else 0.0
+    return precision, recall
+
+def evaluate(confidences, classes, tp, target_classes, class_names, thresholds):
+    """
+    per class precision, recall, AP50 and AP50-95 of predictions matched with match_thresholds
+
+    :param confidences (ndarray): (n,) confidence of every prediction of every frame
+    :param classes (ndarray): (n,) class id of every prediction
+    :param tp (ndarray): (n,t) matches of every prediction
+    :param target_classes (ndarray): (m,) class id of every label
+    :param class_names (list): name of each class
+    :param thresholds (list): confidence threshold of each class
+    :return (dict): metrics of each class, mAP50 and mAP50_95
+    """
+    report = {"classes": {}}
+    aps = []
+    for class_id, name in enumerate(class_names):
+        mask = classes == class_id
+        n_targets = int((target_classes == class_id).sum())
+        ap = average_precision(confidences[mask], tp[mask], n_targets)
+        precision, recall = precision_recall(confidences[mask], tp[mask], n_targets, thresholds[class_id])
+        report["classes"][name] = {"labels": n_targets, "threshold": float(thresholds[class_id]),
+                                   "precision": round(precision, 4), "recall": round(recall, 4),
+                                   "AP50": round(float(ap[0]), 4), "AP50_95": round(float(ap.mean()), 4)}
+        if n_targets:
+            aps.append(ap)
+    aps = np.array(aps).reshape(-1, tp.shape[1])
+    report["mAP50"] = round(float(aps[:, 0].mean()), 4) if len(aps) else 0.0
+    report["mAP50_95"] = round(float(aps.mean()), 4) if len(aps) else 0.0
+    return report
+
+def threshold_curve(confidences, tp, n_targets, thresholds):
+    """
+    precision and recall at IoU 0.5 for every threshold in one pass
+
+    :param confidences (ndarray): (n,) confidence of the predictions of one class
+    :param tp (ndarray): (n,t) matches of each prediction
+    :param n_targets (int): number of labels of the class
+    :param thresholds (ndarray): (k,) thresholds, compared with the rounded confidences like Detection.build_results
+    :return: (k,) precision, recall and number of kept predictions
+    """
+    order = np.argsort(-confidences, kind="stable")
+    rounded = np.round(confidences[order], 2)
+    true_positives = np.concatenate([[0], np.cumsum(tp[order, 0])])
+    # predictions kept by each threshold are a prefix of the sorted predictions
+    kept = np.searchsorted(-rounded, -np.asarray(thresholds), side="right")
+    matched = true_positives[kept]
+    precision = np.where(kept > 0, matched/np.maximum(kept, 1), 0.0)
+    recall = matched/n_targets if n_targets else np.zeros(len(kept))
+    return precision, recall, kept
@@ -0,0 +1,56 @@
+"""
+The onnxengine module runs the exported ONNX model with ONNX Runtime on the CPU.
+The input tensor and a preallocated output buffer are bound to the session with
+IO binding, so a run neither copies the input nor allocates the output.
+"""
+
+import os
+import numpy as np
+
+class ONNXEngine:
+    supports_async = False
+
+    def __init__(self, model_path, imgsz=(384,640), threads=0):
+        """
+        Constructor for the ONNXEngine class
+
+        :param model_path (string): .onnx file
+        :param imgsz (tuple or int): height and width of the input if the model has dynamic axes
+        :param threads (int): intra op threads, 0 lets ONNX Runtime decide
+        """
+        if not os.path.exists(model_path):
+            raise Exception(f"{model_path} not found. \nPlease export it with python export_onnx.py")
+        import onnxruntime as ort
+        self.ort = ort
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.output_name = self.session.get_outputs()[0].name
+        # dynamic axes are given as strings
+        shape = model_input.shape
+        self.imgsz = tuple(shape[2:]) if all(isinstance(size, int) for size in shape[2:]) else tuple(imgsz)
+        # one warm up run to get the output shape
+        dummy = np.zeros((1, 3, *self.imgsz), dtype=np.float32)
+        output_shape = self.session.run([self.output_name], {self.input_name: dummy})[0].shape
+        self.output = np.empty(output_shape, dtype=np.float32)
+        self.binding = self.session.io_binding()
+        self.binding.bind_ortvalue_output(self.output_name, ort.OrtValue.ortvalue_from_numpy(self.output))
+        self.bound_input = None
+
+    def infer(self, tensor):
+        """
+        run the model on a preprocessed tensor
+
+        :param tensor (ndarray): (1, 3, h, w) float32 tensor, bound without copying
+        :return (ndarray): raw output, the preallocated buffer that is overwritten by the next call
+        """
+        if tensor is not self.bound_input:
+            self.binding.bind_ortvalue_input(self.input_name, self.ort.OrtValue.ortvalue_from_numpy(tensor))
+            self.bound_input = tensor
+        self.session.run_with_iobinding(self.binding)
+        return self.output
@@ -0,0 +1,39 @@
+"""
+The opencvengine module runs the exported ONNX model with OpenCV's dnn module.
+cv2 is already loaded by the bot, so this engine adds no import cost.
+"""
+
+import os
+import cv2 as cv
+
+class OpenCVEngine:
+    supports_async = False
+
+    def __init__(self, model_path, imgsz=(384,640), threads=0):
+        """
+        Constructor for the OpenCVEngine class
+
+        :param model_path (string): .onnx file
+        :param imgsz (tuple or int): height and width the model was exported with
+        :param threads (int): OpenCV threads, 0 keeps the OpenCV default
+        """
+        if not os.path.exists(model_path):
+            raise Exception(f"{model_path} not found. \nPlease export it with python export_onnx.py")
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        self.imgsz = tuple(imgsz)
+        if threads:
+            cv.setNumThreads(threads)
+        self.net = cv.dnn.readNetFromONNX(model_path)
+        self.net.setPreferableBackend(cv.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv.dnn.DNN_TARGET_CPU)
+
+    def infer(self, tensor):
+        """
+        run the model on a preprocessed tensor
+
+        :param tensor (ndarray): (1, 3, h, w) float32 tensor
+        :return (ndarray): raw output
+        """
+        self.net.setInput(tensor)
+        return self.net.forward()
@@ -0,0 +1,89 @@
+"""
+The openvinoengine module runs the shipped OpenVINO IR model directly with the
+OpenVINO runtime, without importing ultralytics or torch. The input and output
+tensors of the infer request are created once and reused for every frame.
+In async mode an AsyncInferQueue keeps several requests in flight, each bound to
+its own input tensor, and a callback receives every completed request.
+"""
+
+import os
+import glob
+
+class OpenVINOEngine:
+    supports_async = True
+
+    def __init__(self, model_path, imgsz=(384,640), device="CPU", config=None, batch=1):
+        """
+        Constructor for the OpenVINOEngine class
+
+        :param model_path (string): .xml file or the directory containing it
+        :param imgsz (tuple or int): height and width of the input, the model is reshaped if it differs
+        :param device (string): OpenVINO device e.g. CPU or GPU
+        :param config (dict): OpenVINO properties given to compile_model
+        :param batch (int): frames per inference, the model is reshaped if it differs, -1 accepts any batch size
+        """
+        import openvino as ov
+        self.ov = ov
+        if os.path.isdir(model_path):
+            files = glob.glob(os.path.join(model_path, "*.xml"))
+            if not files:
+                raise Exception(f"No .xml model found in {model_path}")
+            model_path = files[0]
+        self.model_path = model_path
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        core = ov.Core()
+        model = core.read_model(model_path)
+        # the convolutions work at any multiple of the stride, so the input size can be changed
+        partial_shape = model.input(0).partial_shape
+        if not partial_shape.is_static or tuple(partial_shape.to_shape()) != (batch, 3, *imgsz):
+            model.reshape([batch, 3, *imgsz])
+        self.compiled_model = core.compile_model(model, device, config or {})
+        self.request = self.compiled_model.create_infer_request()
+        # (batch, 3, h, w)
+        self.input_shape = (batch, 3, *imgsz)
+        self.imgsz = tuple(imgsz)
+        self.bound_input = None
+        self.queue = None
+
+    def infer(self, tensor):
+        """
+        run the model on a preprocessed tensor
+
+        :param tensor (ndarray): (batch, 3, h, w) float32 tensor, shared with the runtime without copying
+        :return (ndarray): raw output, a view of the output tensor that is overwritten by the next call
+        """
+        if tensor is not self.bound_input:
+            self.request.set_input_tensor(self.ov.Tensor(tensor, shared_memory=True))
+            self.bound_input = tensor
+        self.request.infer()
+        return self.request.get_output_tensor(0).data
+
+    def start_async(self, tensors, callback):
+        """
+        create one infer request per tensor to keep several frames in flight
+
+        :param tensors (list): (1, 3, h, w) float32 input tensor of each request
+        :param callback (function): called with the output and the userdata of every completed request
+        """
+        self.queue = self.ov.AsyncInferQueue(self.compiled_model, len(tensors))
+        for i, tensor in enumerate(tensors):
+            self.queue[i].set_input_tensor(self.ov.Tensor(tensor, shared_memory=True))
+        self.queue.set_callback(lambda request, userdata: callback(request.get_output_tensor(0).data, userdata))
+
+    def idle_job(self):
+        """
+        block until a request is free
+        :return (int): index of the request and of its input tensor
+        """
+        return self.queue.get_idle_request_id()
+
+    def submit(self, userdata):
+        """
+        start the idle request returned by idle_job on its input tensor
+        """
+        self.queue.start_async(userdata=userdata)
+
+    def wait_all(self):
+        if self.queue is not None:
+            self.queue.wait_all()
@@ -0,0 +1,89 @@
+"""
+The postprocess module decodes the raw YOLOv8 output tensor of shape
+(1, 4 + number of classes, anchors) into boxes, for the engines that do not go
+through ultralytics. Candidates below the threshold of their class are dropped
+before anything else, so only the few survivors are decoded and go through NMS.
+"""
+
+import numpy as np
+import cv2 as cv
+
+class YoloPostprocessor:
+    def __init__(self, thresholds, iou=0.7, max_det=300):
+        """
+        Constructor for the YoloPostprocessor class
+
+        :param thresholds (list): confidence threshold of each class
+        :param iou (float): NMS IoU threshold, same default as ultralytics
+        :param max_det (int): maximum number of boxes per frame
+        """
+        self.thresholds = np.asarray(thresholds, dtype=np.float32)
+        # the detection rounds confidences to 2 decimals before comparing them to the thresholds
+        self.limits = self.thresholds - 0.005
+        self.min_limit = self.limits.min()
+        self.iou = iou
+        self.max_det = max_det
+        self.out = self.new_output()
+        # anchor index of each box returned by the last call
+        self.anchors = np.zeros(0, dtype=np.int64)
+
+    def new_output(self):
+        return np.empty((self.max_det, 6), dtype=np.float32)
+
+    def __call__(self, output, out=None):
+        """
+        decode the raw output and run class aware NMS
+
+        :param output (ndarray): (1, 4 + nc, anchors) cx, cy, w, h and class scores
+        :param out (ndarray): (max_det, 6) buffer to write into, self.out if None
+        :return (ndarray): (n,6) view of out, x1, y1, x2, y2, confidence and class id in input tensor coordinates
+        """
+        out = self.out if out is None else out
+        prediction = output[0]
+        scores = prediction[4:]
+        if len(scores) != len(self.thresholds):
+            raise Exception(f"The model has {len(scores)} classes but {len(self.thresholds)} thresholds are set")
+        # cheap pass over every anchor with the lowest threshold
+        candidates = np.flatnonzero(scores.max(axis=0) >= self.min_limit)
+        self.anchors = candidates[:0]
+        if len(candidates) == 0:
+            return out[:0]
+        scores = scores[:, candidates]
+        classes = scores.argmax(axis=0)
+        confidences = scores[classes, np.arange(len(candidates))]
+        keep = confidences >= self.limits[classes]
+        candidates = candidates[keep]
+        if len(candidates) == 0:
+            return out[:0]
+        classes = classes[keep]
+        confidences = confidences[keep]
+        cx, cy, w, h = prediction[:4, candidates]
+        x1 = cx - w/2
+        y1 = cy - h/2
+        # NMSBoxesBatched takes x, y, w, h boxes and returns the kept indices by decreasing confidence
+        indices = cv.dnn.NMSBoxesBatched(np.stack([x1, y1, w, h], axis=1).tolist(), confidences.tolist(),
+                                         classes.tolist(), 0.0, self.iou)
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1)[:self.max_det]
+        n = len(indices)
+        self.anchors = candidates[indices]
+        out[:n, 0] = x1[indices]
+        out[:n, 1] = y1[indices]
+        out[:n, 2] = x1[indices] + w[indices]
+        out[:n, 3] = y1[indices] + h[indices]
+        out[:n, 4] = confidences[indices]
+        out[:n, 5] = classes[indices]
+        return out[:n]
+
+def merge_boxes(*boxes, iou=0.7):
+    """
+    merge the boxes of several passes over the same frame with class aware NMS
+
+    :param boxes (ndarray): (n,6) x1, y1, x2, y2, confidence and class id
+    :return (ndarray): (n,6) kept boxes by decreasing confidence
+    """
+    boxes = np.concatenate(boxes).astype(np.float32)
+    if len(boxes) == 0:
+        return boxes
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:4] - boxes[:, :2]], axis=1)
+    indices = cv.dnn.NMSBoxesBatched(xywh.tolist(), boxes[:, 4].tolist(), boxes[:, 5].astype(np.int64).tolist(), 0.0, iou)
+    return boxes[np.asarray(indices, dtype=np.int64).reshape(-1)]
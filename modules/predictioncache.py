@@ -0,0 +1,72 @@
+"""
+The predictioncache module stores the candidates of a benchmark run, so the class
+thresholds can be tuned without running the model again. Every candidate above the
+confidence floor is kept with its box, confidence, class, class scores and whether
+it matches a label at each IoU threshold of mAP50-95. The matches do not depend on
+the thresholds (candidates are matched most confident first), so they are
+computed once. The cache is a compressed .npz of columns.
+"""
+
+import json
+import numpy as np
+
+class PredictionCache:
+    def __init__(self, class_names, iou_thresholds, floor, meta=None):
+        """
+        Constructor for the PredictionCache class
+
+        :param class_names (list): name of each class
+        :param iou_thresholds (ndarray): IoU thresholds of the match columns
+        :param floor (float): confidence floor of the candidates
+        :param meta (dict): anything else worth keeping e.g. the model hash
+        """
+        self.class_names = list(class_names)
+        self.iou_thresholds = np.asarray(iou_thresholds, dtype=np.float32)
+        self.floor = floor
+        self.meta = meta or {}
+        self.columns = {"frame": [], "boxes": [], "confidence": [], "class_id": [], "tp": [], "scores": []}
+        self.labels = {"frame": [], "class_id": []}
+        self.frames = 0
+
+    def append(self, candidates, tp, labels, scores=None):
+        """
+        add the candidates and labels of the next frame
+
+        :param candidates (ndarray): (n,6) x1, y1, x2, y2, confidence and class id
+        :param tp (ndarray): (n,t) matches of each candidate
+        :param labels (ndarray): (m,5) x1, y1, x2, y2 and class id
+        :param scores (ndarray): (n,nc) score of every class, None if the engine does not give them
+        """
+        n = len(candidates)
+        self.columns["frame"].append(np.full(n, self.frames, dtype=np.int32))
+        self.columns["boxes"].append(candidates[:, :4].astype(np.float32))
+        self.columns["confidence"].append(candidates[:, 4].astype(np.float32))
+        self.columns["class_id"].append(candidates[:, 5].astype(np.int8))
+        self.columns["tp"].append(np.asarray(tp, dtype=bool).reshape(n, len(self.iou_thresholds)))
+        if scores is None:
+            scores = np.full((n, len(self.class_names)), np.nan)
+        self.columns["scores"].append(np.asarray(scores, dtype=np.float16))
+        self.labels["frame"].append(np.full(len(labels), self.frames, dtype=np.int32))
+        self.labels["class_id"].append(labels[:, 4].astype(np.int8))
+        self.frames += 1
+
+    def save(self, path):
+        meta = {"classes": self.class_names, "floor": self.floor, "frames": self.frames, **self.meta}
+        columns = {name: np.concatenate(values) if values else np.zeros(0) for name, values in self.columns.items()}
+        np.savez_compressed(path, **columns, label_frame=np.concatenate(self.labels["frame"]),
+                            label_class_id=np.concatenate(self.labels["class_id"]),
+                            iou_thresholds=self.iou_thresholds, meta=np.array(json.dumps(meta)))
+
+    @classmethod
+    def load(cls, path):
+        """
+        :return (PredictionCache): cache with the columns as single arrays
+        """
+        data = np.load(path)
+        meta = json.loads(str(data["meta"]))
+        cache = cls(meta.pop("classes"), data["iou_thresholds"], meta.pop("floor"))
+        cache.frames = meta.pop("frames")
+        cache.meta = meta
+        cache.columns = {name: data[name] for name in ("frame", "boxes", "confidence", "class_id", "tp", "scores")}
+        cache.labels = {"frame": data["label_frame"], "class_id": data["label_class_id"]}
+        return cache
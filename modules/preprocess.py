@@ -0,0 +1,92 @@
+"""
+The preprocess module turns a window frame into the model's input tensor.
+The letterbox mapping (scale and padding) is computed once per window size, the
+frame is resized into a preallocated buffer and a single numpy pass drops the
+alpha channel, converts BGR to RGB, transposes HWC to CHW and normalises into a
+preallocated float32 tensor. The inverse mapping brings boxes back to window space.
+"""
+
+import numpy as np
+import cv2 as cv
+
+class Letterbox:
+    pad_value = 114
+
+    def __init__(self, source_size, imgsz=(384,640)):
+        """
+        Constructor for the Letterbox class
+
+        :param source_size (tuple): width and height of the frames
+        :param imgsz (tuple or int): height and width of the model input
+        """
+        if isinstance(imgsz, int):
+            imgsz = (imgsz, imgsz)
+        self.source_w, self.source_h = source_size
+        self.input_h, self.input_w = imgsz
+        # same rounding as the ultralytics letterbox
+        self.scale = min(self.input_w/self.source_w, self.input_h/self.source_h)
+        self.resized_w = int(round(self.source_w*self.scale))
+        self.resized_h = int(round(self.source_h*self.scale))
+        self.left = int(round((self.input_w - self.resized_w)/2 - 0.1))
+        self.top = int(round((self.input_h - self.resized_h)/2 - 0.1))
+        # part of the input the frame is written to, the rest keeps the padding
+        self.geometry = (self.top, self.left, self.resized_h, self.resized_w)
+        self.norm = np.float32(1/255)
+        # resize buffers for BGR and BGRA frames
+        self.resized = {channels: np.empty((self.resized_h, self.resized_w, channels), dtype=np.uint8)
+                        for channels in (3, 4)}
+        self.tensor = self.new_tensor()
+
+    def new_tensor(self, batch=1):
+        """
+        allocate an input tensor with the padding already filled in
+        """
+        return np.full((batch, 3, self.input_h, self.input_w), self.pad_value/255, dtype=np.float32)
+
+    def fill_padding(self, out):
+        """
+        refill a shared tensor slot with the padding colour, needed when it held a
+        frame of another geometry since preprocess only writes the resized frame
+        """
+        out.fill(self.pad_value/255)
+        return out
+
+    def preprocess(self, image, out=None):
+        """
+        letterbox a BGR or BGRA frame into the input tensor
+
+        :param image (ndarray): frame of source_size
+        :param out (ndarray): (3, h, w) or (1, 3, h, w) tensor to write into, self.tensor if None
+        :return (ndarray): the filled tensor
+        """
+        out = self.tensor if out is None else out
+        if (image.shape[1], image.shape[0]) == (self.resized_w, self.resized_h):
+            resized = image
+        else:
+            resized = self.resized[image.shape[2]]
+            cv.resize(image, (self.resized_w, self.resized_h), dst=resized, interpolation=cv.INTER_LINEAR)
+        # drop alpha, BGR to RGB, HWC to CHW and scale to 0-1 in one pass
+        chw = out[0] if out.ndim == 4 else out
+        target = chw[:, self.top:self.top + self.resized_h, self.left:self.left + self.resized_w]
+        np.multiply(resized[..., 2::-1].transpose(2, 0, 1), self.norm, out=target)
+        return out
+
+    def to_window(self, boxes):
+        """
+        map x1, y1, x2, y2 boxes from input tensor to window coordinates in place
+        """
+        boxes[:, [0, 2]] -= self.left
+        boxes[:, [1, 3]] -= self.top
+        boxes[:, :4] /= self.scale
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, self.source_w)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, self.source_h)
+        return boxes
+
+    def to_input(self, boxes):
+        """
+        map x1, y1, x2, y2 boxes from window to input tensor coordinates in place
+        """
+        boxes[:, :4] *= self.scale
+        boxes[:, [0, 2]] += self.left
+        boxes[:, [1, 3]] += self.top
+        return boxes
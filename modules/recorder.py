@@ -0,0 +1,254 @@
+"""
+The recorder module records what the bot saw and did during a session.
+
+A session is a directory of chunks, each chunk holds:
+    frames.npy (.zlib once compressed) - memory mapped block of BGR frames
+    frames.npz     - frame_id and timestamp of every frame in the block
+    detections.npz - columnar table of timestamp, frame_id, class_id, x and y midpoints
+    events.npz     - columnar table of timestamp, source, name and value
+and index.json maps every chunk to its time range.
+
+Recording never blocks the capture thread: frames are copied into a small pool of
+staging buffers and written by a background thread, when every buffer is still
+waiting for the disk the frame is dropped and counted instead.
+"""
+
+import os
+import io
+import json
+import zlib
+import numpy as np
+from datetime import datetime
+from functools import wraps
+from queue import Queue, Empty
+from collections import deque
+from threading import Thread, Lock
+from time import time
+
+class SessionRecorder:
+    stopped = True
+
+    def __init__(self, directory, windowSize, chunk_frames=256, staging_frames=8, compression=1):
+        """
+        Constructor for the SessionRecorder class
+
+        :param directory (string): parent directory of the session
+        :param windowSize (tuple): width and height of the frames
+        :param chunk_frames (int): frames per memory mapped block
+        :param staging_frames (int): frames that can wait for the disk before frames are dropped
+        :param compression (int): zlib level of finished blocks, 0 keeps them uncompressed
+        """
+        self.lock = Lock()
+        self.w, self.h = windowSize
+        self.chunk_frames = chunk_frames
+        self.compression = compression
+        self.path = os.path.join(directory, datetime.now().strftime("session_%Y%m%d_%H%M%S"))
+        os.makedirs(self.path, exist_ok=True)
+
+        # staging buffers the hot path copies frames into
+        self.staging = np.empty((staging_frames, self.h, self.w, 3), dtype=np.uint8)
+        self.free_slots = deque(range(staging_frames))
+        self.frame_queue = Queue()
+        self.compress_queue = Queue()
+        self.dropped = 0
+        self.recorded = 0
+
+        # columns of the current chunk
+        self.chunk_index = 0
+        self.chunk = None
+        self.frame_ids = []
+        self.frame_times = []
+        self.detections = {"timestamp": [], "frame_id": [], "class_id": [], "x": [], "y": []}
+        self.events = {"timestamp": [], "source": [], "name": [], "value": []}
+        self.index = []
+
+    # hot path methods
+    def record_frame(self, image, frame_id, timestamp):
+        """
+        stage a frame for writing, drop it if the writer is behind
+        """
+        if self.stopped:
+            return
+        try:
+            slot = self.free_slots.popleft()
+        except IndexError:
+            self.dropped += 1
+            return
+        np.copyto(self.staging[slot], image)
+        self.frame_queue.put((slot, frame_id, timestamp))
+
+    def record_detections(self, frame_id, results, timestamp=None):
+        """
+        append the midpoints of a DetectionResults to the detection table,
+        at the capture time of its frame so they line up with the frame table
+        """
+        if self.stopped or results is None:
+            return
+        if timestamp is None:
+            timestamp = time() if results.timestamp is None else results.timestamp
+        count = len(results.classes)
+        self.lock.acquire()
+        self.detections["timestamp"].extend([timestamp]*count)
+        self.detections["frame_id"].extend([frame_id]*count)
+        self.detections["class_id"].extend(results.classes.tolist())
+        self.detections["x"].extend(results.midpoints[:, 0].tolist())
+        self.detections["y"].extend(results.midpoints[:, 1].tolist())
+        self.lock.release()
+
+    def record_event(self, source, name, value="", timestamp=None):
+        """
+        append an event (state transition, action, ...) to the event table
+        """
+        if self.stopped:
+            return
+        self.lock.acquire()
+        self.events["timestamp"].append(time() if timestamp is None else timestamp)
+        self.events["source"].append(source)
+        self.events["name"].append(name)
+        self.events["value"].append(str(value))
+        self.lock.release()
+
+    # writer methods
+    def chunk_path(self, index):
+        return os.path.join(self.path, f"chunk_{index:05d}")
+
+    def open_chunk(self):
+        path = self.chunk_path(self.chunk_index)
+        os.makedirs(path, exist_ok=True)
+        self.chunk = np.lib.format.open_memmap(os.path.join(path, "frames.npy"), mode="w+", dtype=np.uint8,
+                                               shape=(self.chunk_frames, self.h, self.w, 3))
+
+    def close_chunk(self):
+        """
+        write the tables of the current chunk and hand its frames to the compressor
+        """
+        path = self.chunk_path(self.chunk_index)
+        os.makedirs(path, exist_ok=True)
+        self.lock.acquire()
+        detections, self.detections = self.detections, {key: [] for key in self.detections}
+        events, self.events = self.events, {key: [] for key in self.events}
+        self.lock.release()
+        frame_ids, self.frame_ids = self.frame_ids, []
+        frame_times, self.frame_times = self.frame_times, []
+
+        np.savez(os.path.join(path, "frames.npz"), frame_id=np.array(frame_ids, dtype=np.int64),
+                 timestamp=np.array(frame_times, dtype=np.float64))
+        np.savez(os.path.join(path, "detections.npz"),
+                 timestamp=np.array(detections["timestamp"], dtype=np.float64),
+                 frame_id=np.array(detections["frame_id"], dtype=np.int64),
+                 class_id=np.array(detections["class_id"], dtype=np.int8),
+                 x=np.array(detections["x"], dtype=np.int32),
+                 y=np.array(detections["y"], dtype=np.int32))
+        np.savez(os.path.join(path, "events.npz"),
+                 timestamp=np.array(events["timestamp"], dtype=np.float64),
+                 source=np.array(events["source"], dtype=str),
+                 name=np.array(events["name"], dtype=str),
+                 value=np.array(events["value"], dtype=str))
+
+        times = frame_times + detections["timestamp"] + events["timestamp"]
+        self.index.append({"chunk": os.path.basename(path),
+                           "start": min(times) if times else None,
+                           "end": max(times) if times else None,
+                           "frames": len(frame_ids),
+                           "dropped": self.dropped})
+        with open(os.path.join(self.path, "index.json"), "w") as file:
+            json.dump({"width": self.w, "height": self.h, "chunks": self.index}, file, indent=1)
+
+        if self.chunk is not None:
+            self.chunk.flush()
+            self.chunk = None
+            if self.compression:
+                self.compress_queue.put(os.path.join(path, "frames.npy"))
+        self.chunk_index += 1
+
+    def write_frames(self):
+        while not self.stopped or not self.frame_queue.empty():
+            try:
+                slot, frame_id, timestamp = self.frame_queue.get(timeout=0.1)
+            except Empty:
+                continue
+            if self.chunk is None:
+                self.open_chunk()
+            self.chunk[len(self.frame_ids)] = self.staging[slot]
+            self.free_slots.append(slot)
+            self.frame_ids.append(frame_id)
+            self.frame_times.append(timestamp)
+            self.recorded += 1
+            if len(self.frame_ids) == self.chunk_frames:
+                self.close_chunk()
+        self.close_chunk()
+        # tell the compressor there are no more chunks
+        self.compress_queue.put(None)
+
+    def compress_chunks(self):
+        while True:
+            path = self.compress_queue.get()
+            if path is None:
+                break
+            compressor = zlib.compressobj(self.compression)
+            with open(path, "rb") as raw, open(path + ".zlib", "wb") as compressed:
+                for block in iter(lambda: raw.read(1 << 22), b""):
+                    compressed.write(compressor.compress(block))
+                compressed.write(compressor.flush())
+            os.remove(path)
+
+    # threading methods
+    def start(self):
+        """
+        start the writer and compressor threads
+        """
+        self.stopped = False
+        self.writer = Thread(target=self.write_frames)
+        self.writer.setDaemon(True)
+        self.writer.start()
+        self.compressor = Thread(target=self.compress_chunks)
+        self.compressor.setDaemon(True)
+        self.compressor.start()
+
+    def stop(self):
+        """
+        stop recording and wait for the staged frames to be written
+        """
+        if self.stopped:
+            return
+        self.stopped = True
+        self.writer.join()
+        self.compressor.join()
+        print(f"Session recorded at {self.path}: {self.recorded} frames, {self.dropped} dropped")
+
+def load_frames(chunk_path):
+    """
+    load the frames of a recorded chunk, memory mapped if it is not compressed
+    """
+    table = np.load(os.path.join(chunk_path, "frames.npz"))
+    count = len(table["frame_id"])
+    path = os.path.join(chunk_path, "frames.npy")
+    if count == 0:
+        # the last chunk of a session can hold detections and events but no frame block
+        return np.zeros((0, 0, 0, 3), dtype=np.uint8), table["frame_id"], table["timestamp"]
+    if os.path.exists(path):
+        frames = np.load(path, mmap_mode="r")
+    else:
+        with open(path + ".zlib", "rb") as file:
+            frames = np.load(io.BytesIO(zlib.decompress(file.read())))
+    return frames[:count], table["frame_id"], table["timestamp"]
+
+def hook_pyautogui(recorder, names=("click", "press", "mouseDown", "mouseUp", "keyDown", "keyUp", "hold", "moveTo")):
+    """
+    record every call of the given pyautogui functions as an "action" event
+    """
+    # the inputs the bot actually uses, a HeadlessInput during a replay
+    from modules.inputs import py as pyautogui
+    def record(function, name):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            recorder.record_event("action", name, repr((args, kwargs)))
+            return function(*args, **kwargs)
+        wrapper.recorder = recorder
+        return wrapper
+    for name in names:
+        function = getattr(pyautogui, name)
+        # do not record twice if the functions were already hooked
+        if getattr(function, "recorder", None) is not None:
+            function = function.__wrapped__
+        setattr(pyautogui, name, record(function, name))
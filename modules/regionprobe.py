@@ -0,0 +1,90 @@
+"""
+The regionprobe module polls a small set of named regions of interest (UI buttons,
+HUD pixels) through a single grab of the frame source, instead of one pyautogui
+screen grab per pixel. Regions are given in screen coordinates, like the
+coordinates used with pyautogui.pixelMatchesColor().
+"""
+
+import numpy as np
+from threading import Lock
+
+class RegionProbe:
+    def __init__(self, wincap):
+        """
+        Constructor for the RegionProbe class
+
+        :param wincap (FrameSource): frame source the regions are grabbed from
+        """
+        self.lock = Lock()
+        self.wincap = wincap
+        self.index = {}
+        # (x, y, w, h) in window coordinates and the BGR pixels of each region
+        self.regions = []
+        self.pixels = []
+
+    def to_region(self, cordinate, size=(1,1)):
+        """
+        convert a screen coordinate to a region clipped to the window
+        """
+        w = max(1, min(size[0], self.wincap.w))
+        h = max(1, min(size[1], self.wincap.h))
+        x = min(max(cordinate[0] - self.wincap.offset_x, 0), self.wincap.w - w)
+        y = min(max(cordinate[1] - self.wincap.offset_y, 0), self.wincap.h - h)
+        return (x, y, w, h)
+
+    def add_region(self, name, cordinate, size=(1,1)):
+        """
+        add a named region
+
+        :param name (string): name of the region
+        :param cordinate (tuple): screen coordinate of the top left corner of the region
+        :param size (tuple): width and height of the region
+        """
+        region = self.to_region(cordinate, size)
+        self.lock.acquire()
+        self.index[name] = len(self.regions)
+        self.regions.append(region)
+        self.pixels.append(np.zeros((region[3], region[2], 3), dtype=np.uint8))
+        self.lock.release()
+
+    def refresh(self):
+        """
+        grab every region at once
+        :return (boolean): False if the frame source could not be read
+        """
+        self.lock.acquire()
+        success = self.wincap.grab_regions(self.regions, self.pixels)
+        self.lock.release()
+        return success
+
+    def get(self, name):
+        """
+        get the BGR pixels of a region from the last refresh
+        """
+        return self.pixels[self.index[name]]
+
+    @staticmethod
+    def matches_color(pixels, color, tolerance):
+        """
+        True if any pixel is within tolerance of the RGB color on every channel
+        """
+        diff = np.abs(pixels.astype(np.int16) - np.array(color[::-1], dtype=np.int16))
+        return bool((diff <= tolerance).all(axis=-1).any())
+
+    def pixel_matches_color(self, name, color, tolerance=0):
+        """
+        pyautogui.pixelMatchesColor() for a named region
+
+        :param color (tuple): RGB color
+        """
+        return self.matches_color(self.get(name), color, tolerance)
+
+    def pixels_match_color(self, cordinates, color, tolerance=0):
+        """
+        grab the given screen coordinates at once and check if any of them matches the RGB color
+        """
+        regions = [self.to_region(cordinate) for cordinate in cordinates]
+        pixels = [np.zeros((1, 1, 3), dtype=np.uint8) for _ in regions]
+        if not self.wincap.grab_regions(regions, pixels):
+            return False
+        return any(self.matches_color(pixel, color, tolerance) for pixel in pixels)
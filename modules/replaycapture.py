@@ -0,0 +1,164 @@
+"""
+The replaycapture module plays back recorded gameplay so the bot can run offline.
+Supported recordings are video files (.mp4, .avi, ...), a directory of images
+(PNG sequence) and raw .npy stacks of shape (frames, height, width, 3 or 4).
+"""
+
+import os
+import numpy as np
+import cv2 as cv
+from time import time, sleep
+from modules.framesource import FrameSource
+
+class ReplayCapture(FrameSource):
+    image_extensions = (".png", ".jpg", ".jpeg", ".bmp")
+    default_fps = 30
+
+    def __init__(self, path, realtime=True, fps=None, loop=False, lockstep=False):
+        """
+        Constructor for the ReplayCapture class
+
+        :param path (string): video file, image directory or .npy stack
+        :param realtime (boolean): play at recorded pace, otherwise as fast as possible
+        :param fps (float): playback rate, defaults to the video's rate or 30
+        :param loop (boolean): restart from the first frame at the end of the recording
+        :param lockstep (boolean): give the next frame only once the last one was consumed, realtime is ignored
+        """
+        super().__init__()
+        if not os.path.exists(path):
+            raise Exception(f"{path} not found. \nPlease change the replay_path at constants.py")
+        self.path = path
+        # in lockstep the pace is the one of the detection
+        self.realtime = realtime and not lockstep
+        self.lockstep = lockstep
+        self.loop = loop
+        self.video = None
+        self.images = None
+        self.stack = None
+        recorded_fps = None
+
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(self.image_extensions))
+            if not self.images:
+                raise Exception(f"No images found in {path}")
+            self.length = len(self.images)
+            first = cv.imread(self.images[0], cv.IMREAD_UNCHANGED)
+        elif path.lower().endswith(".npy"):
+            # memory map the stack so long recordings are not loaded into RAM
+            self.stack = np.load(path, mmap_mode="r")
+            if self.stack.ndim != 4:
+                raise Exception(f"{path} should have the shape (frames, height, width, channels)")
+            self.length = self.stack.shape[0]
+            first = self.stack[0]
+        else:
+            self.video = cv.VideoCapture(path)
+            if not self.video.isOpened():
+                raise Exception(f"Could not open {path}")
+            self.length = int(self.video.get(cv.CAP_PROP_FRAME_COUNT))
+            recorded_fps = self.video.get(cv.CAP_PROP_FPS) or None
+            success, first = self.video.read()
+            if not success:
+                raise Exception(f"{path} does not contain any frame")
+            self.video.set(cv.CAP_PROP_POS_FRAMES, 0)
+
+        self.frame_fps = fps or recorded_fps or self.default_fps
+        self.h, self.w = first.shape[:2]
+        self.frame_index = 0
+        self.play_start = None
+
+        # a replay is shown as if it was a maximised window at the top left of the screen
+        self.right = self.w
+        self.bottom = self.h
+        self.screen_resolution = (self.w, self.h)
+
+    def copy_to(self, img, out):
+        """
+        copy a recorded frame into out, dropping the alpha channel of BGRA frames
+        """
+        if img.shape[:2] != out.shape[:2]:
+            img = cv.resize(img, (self.w, self.h))
+        if img.ndim == 2:
+            cv.cvtColor(img, cv.COLOR_GRAY2BGR, dst=out)
+        elif img.shape[2] == 4:
+            cv.cvtColor(img, cv.COLOR_BGRA2BGR, dst=out)
+        else:
+            np.copyto(out, img)
+
+    def read_frame(self, index):
+        """
+        read one frame of the recording, None when there is nothing left
+        """
+        if self.images is not None:
+            return cv.imread(self.images[index], cv.IMREAD_UNCHANGED)
+        elif self.stack is not None:
+            return self.stack[index]
+        success, img = self.video.read()
+        return img if success else None
+
+    def rewind(self):
+        """
+        go back to the first frame
+        """
+        self.frame_index = 0
+        self.play_start = None
+        if self.video is not None:
+            self.video.set(cv.CAP_PROP_POS_FRAMES, 0)
+
+    def grab(self, out):
+        """
+        copy the next frame of the recording into out
+        """
+        img = None
+        # the frame count of a video container is only an estimate, read until it fails
+        if self.video is not None or self.frame_index < self.length:
+            img = self.read_frame(self.frame_index)
+        if img is None:
+            # end of the recording
+            if self.loop and self.frame_index > 0:
+                self.rewind()
+                return self.grab(out)
+            return False
+
+        if self.realtime:
+            # wait until the frame is due
+            if self.play_start is None:
+                self.play_start = time()
+            delay = self.play_start + self.frame_index/self.frame_fps - time()
+            if delay > 0:
+                sleep(delay)
+        self.frame_index += 1
+        self.copy_to(img, out)
+        return True
+
+def iter_recording(path, step=1):
+    """
+    read every step-th frame of a recording without pacing, for offline tools
+
+    :param path (string): session directory of the SessionRecorder, video file, image directory or .npy stack
+    :return: generator of BGR frames
+    """
+    if os.path.exists(os.path.join(path, "index.json")):
+        # session recorded by the SessionRecorder
+        from modules.recorder import load_frames
+        index = 0
+        for chunk in sorted(name for name in os.listdir(path) if name.startswith("chunk_")):
+            chunk_path = os.path.join(path, chunk)
+            if not os.path.exists(os.path.join(chunk_path, "frames.npz")):
+                continue
+            # a chunk without frames has no frame block
+            if len(np.load(os.path.join(chunk_path, "frames.npz"))["frame_id"]) == 0:
+                continue
+            frames = load_frames(chunk_path)[0]
+            for frame in frames:
+                if index % step == 0:
+                    yield np.array(frame)
+                index += 1
+        return
+    replay = ReplayCapture(path, realtime=False)
+    out = np.empty((replay.h, replay.w, 3), dtype=np.uint8)
+    index = 0
+    while replay.grab(out):
+        if index % step == 0:
+            yield out.copy()
+        index += 1
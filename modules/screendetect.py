@@ -3,10 +3,11 @@ The screendetect module uses pyautogui to matches pixels' color and take specifi
 e.g. play again button - When play again button is detect by pyautogui.pixelMatchesColor() it will click the play again button.
 """
 
-import pyautogui as py
+from modules.inputs import py
 from threading import Thread, Lock
 from time import sleep
 from constants import Constants
+from modules.channel import Channel
 
 """
 IDLE: When state exit,play and load is finished, state is changed to IDLE so
@@ -38,6 +39,7 @@ class Detectstate:
     PLAY = 6
     PROCEED = 7
     STARDROP = 8
+    names = ["IDLE","DETECT","EXIT","PLAY_AGAIN","LOAD","CONNECTION","PLAY","PROCEED","STARDROP"]
     
 class Screendetect:
     #RGB value
@@ -47,11 +49,17 @@ class Screendetect:
     proceedColor = (35, 115, 255)
     connection_lost_color = (66, 66, 66)
     starDropColor = (222, 72, 227)
+    # SessionRecorder the state transitions are recorded to
+    recorder = None
 
-    def __init__(self,windowSize,offset) -> None:
+    def __init__(self,windowSize,offset,probe=None) -> None:
         """
         Constructor for the Screendectect class
+
+        :param probe (RegionProbe): grab every checked pixel at once, pyautogui is used if None
         """
+        # every state transition
+        self.states = Channel()
         self.state = Detectstate.DETECT
         self.lock = Lock()
         self.w = windowSize[0]
@@ -75,6 +83,33 @@ class Screendetect:
         self.connection_lost_cord = (round(self.w*0.4912)+self.offset_x,round(self.h*0.5525)+self.offset_y)
         self.reload_button = (round(self.w*0.2824)+self.offset_x,round(self.h*0.5812)+self.offset_y)
 
+        self.probe = probe
+        if self.probe:
+            for name in ["playAgainButton","loadButton","defeated1","defeated2","starDrop1",
+                         "starDrop2","playButton","proceedButton","connection_lost_cord"]:
+                self.probe.add_region(name,getattr(self,name))
+
+    def pixel_matches_color(self,name,color,tolerance):
+        """
+        check the color of the pixel at the coordinate called name
+        :param color (tuple): RGB value
+        """
+        if self.probe:
+            return self.probe.pixel_matches_color(name,color,tolerance)
+        cordinate = getattr(self,name)
+        return py.pixelMatchesColor(cordinate[0],cordinate[1],color,tolerance=tolerance)
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, state):
+        self._state = state
+        self.states.publish(state)
+        if self.recorder:
+            self.recorder.record_event("screendetect", "state", Detectstate.names[state])
+
     def update_bot_stop(self,bot_stopped):
         self.bot_stopped = bot_stopped
     
@@ -102,48 +137,50 @@ class Screendetect:
             
             elif self.state == Detectstate.DETECT:
                 try:
-                    if py.pixelMatchesColor(self.playAgainButton[0], self.playAgainButton[1],self.playColor,tolerance=15):
+                    # grab every pixel at once, the pixels of a failed grab are not checked
+                    if self.probe and not self.probe.refresh():
+                        continue
+
+                    if self.pixel_matches_color("playAgainButton",self.playColor,tolerance=15):
                         print("Playing again")
                         self.lock.acquire()
                         self.state = Detectstate.PLAY_AGAIN
                         self.lock.release()
                     
-                    elif py.pixelMatchesColor(self.loadButton[0], self.loadButton[1],self.loadColor,tolerance=30):
+                    elif self.pixel_matches_color("loadButton",self.loadColor,tolerance=30):
                         print("Loading in")
                         self.lock.acquire()
                         sleep(3)
                         self.state = Detectstate.LOAD
                         self.lock.release()
                     
-                    elif (py.pixelMatchesColor(self.defeated1[0], self.defeated1[1],
-                                                     self.defeatedColor,tolerance=15)
-                        or py.pixelMatchesColor(self.defeated2[0], self.defeated2[1],
-                                                     self.defeatedColor,tolerance=15)) and not(self.bot_stopped):
+                    elif (self.pixel_matches_color("defeated1",self.defeatedColor,tolerance=15)
+                        or self.pixel_matches_color("defeated2",self.defeatedColor,tolerance=15)) and not(self.bot_stopped):
                         print("Exiting match")
                         self.lock.acquire()
                         self.state = Detectstate.EXIT
                         self.lock.release()
                     
-                    # elif pyautogui.pixelMatchesColor(self.connection_lost_cord[0],self.connection_lost_cord[1],self.connection_lost_color,tolerance=1):
+                    # elif self.pixel_matches_color("connection_lost_cord",self.connection_lost_color,tolerance=1):
                     #     print("Connection Lost")
                     #     self.lock.acquire()
                     #     self.state = Detectstate.CONNECTION
                     #     self.lock.release()
                     
-                    elif (py.pixelMatchesColor(self.starDrop1[0], self.starDrop1[1], self.starDropColor,tolerance=15)
-                    or py.pixelMatchesColor(self.starDrop2[0], self.starDrop2[1], self.starDropColor,tolerance=15)):
+                    elif (self.pixel_matches_color("starDrop1",self.starDropColor,tolerance=15)
+                    or self.pixel_matches_color("starDrop2",self.starDropColor,tolerance=15)):
                         print("Collecting Star Drop")
                         self.lock.acquire()
                         self.state = Detectstate.STARDROP
                         self.lock.release()
                         
-                    elif py.pixelMatchesColor(self.playButton[0], self.playButton[1], self.playColor, tolerance=15):
+                    elif self.pixel_matches_color("playButton",self.playColor,tolerance=15):
                         print("Play")
                         self.lock.acquire()
                         self.state = Detectstate.PLAY
                         self.lock.release()
 
-                    elif py.pixelMatchesColor(self.proceedButton[0], self.proceedButton[1], self.proceedColor, tolerance=25):
+                    elif self.pixel_matches_color("proceedButton",self.proceedColor,tolerance=25):
                         print("Proceed")
                         self.lock.acquire()
                         self.state = Detectstate.PROCEED
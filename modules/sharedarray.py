@@ -0,0 +1,59 @@
+"""
+The sharedarray module wraps multiprocessing.shared_memory blocks as numpy arrays
+so frames and detections can move between processes without pickling.
+"""
+
+import os
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+class SharedArray:
+    def __init__(self, shape, dtype, name=None):
+        """
+        Constructor for the SharedArray class
+
+        :param shape (tuple): shape of the array
+        :param dtype: numpy dtype of the array
+        :param name (string): attach to an existing block, a new block is created if None
+        """
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                # only the creator should free the block, otherwise the resource
+                # tracker unlinks it when the attached process exits
+                resource_tracker.unregister(self.memory._name, "shared_memory")
+            if self.memory.size < size:
+                # never write past a block smaller than the declared shape
+                self.memory.close()
+                raise ValueError(f"Shared memory block {name} is smaller than {self.shape} {self.dtype}")
+        self.name = self.memory.name
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.memory.buf)
+
+    def spec(self):
+        """
+        arguments needed to attach to this block from another process
+        """
+        return (self.shape, self.dtype.str, self.name)
+
+    @classmethod
+    def attach(cls, spec):
+        shape, dtype, name = spec
+        return cls(shape, dtype, name)
+
+    def close(self):
+        """
+        detach from the block, the process that created it also frees it
+        """
+        if self.array is None:
+            return
+        # the numpy view has to be released before the memory can be closed
+        self.array = None
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
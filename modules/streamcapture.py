@@ -0,0 +1,126 @@
+"""
+The streamcapture module decodes an H.264 stream pushed by the emulator
+(scrcpy-style) instead of screen scraping its window. ffmpeg decodes the stream
+in software and a reader thread drains its raw BGR frames into a latest frame
+buffer as fast as they come, so a slow consumer (full ring, paced capture) never
+backs up the pipe. The capture thread copies only the newest complete frame into
+the ring slots and stale frames are simply overwritten.
+
+A local test stream can be generated with:
+ffmpeg -re -f lavfi -i testsrc=size=1280x720:rate=60 -c:v libx264 -tune zerolatency -f h264 tcp://127.0.0.1:27183
+"""
+
+import shutil
+import subprocess
+import numpy as np
+from threading import Thread, Condition
+from modules.framesource import FrameSource
+
+class StreamCapture(FrameSource):
+    process = None
+    # sequence number of the newest complete frame and of the last one grabbed
+    decoded_seq = 0
+    grabbed_seq = 0
+    # set when ffmpeg has no more frames to give
+    ended = False
+
+    def __init__(self, address, size, offsets=(0,0), input_format="h264"):
+        """
+        Constructor for the StreamCapture class
+
+        :param address (string): ffmpeg input url e.g. "tcp://127.0.0.1:27183?listen=1"
+        :param size (tuple): width and height of the decoded frames, the stream is scaled to it
+        :param offsets (tuple): screen position of the emulator's top left corner
+        :param input_format (string): container/codec of the stream given to ffmpeg
+        """
+        super().__init__()
+        self.ffmpeg = shutil.which("ffmpeg")
+        if self.ffmpeg is None:
+            raise Exception("ffmpeg not found. \nPlease install ffmpeg and add it to PATH to use the stream capture backend")
+        self.address = address
+        self.input_format = input_format
+        self.w, self.h = size
+        self.offset_x, self.offset_y = offsets
+        self.offsets = (self.offset_x, self.offset_y)
+        self.left = self.offset_x
+        self.top = self.offset_y
+        self.right = self.offset_x + self.w
+        self.bottom = self.offset_y + self.h
+        self.screen_resolution = (self.right, self.bottom)
+
+    def open_stream(self):
+        """
+        start ffmpeg decoding the stream to raw BGR frames on its stdout
+        """
+        command = [self.ffmpeg, "-loglevel", "error",
+                   # do not buffer or probe the input, decode frames as soon as they arrive
+                   "-fflags", "nobuffer", "-flags", "low_delay",
+                   "-probesize", "32", "-analyzeduration", "0",
+                   "-f", self.input_format, "-i", self.address,
+                   "-vf", f"scale={self.w}:{self.h}",
+                   "-f", "rawvideo", "-pix_fmt", "bgr24", "pipe:1"]
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, stdin=subprocess.DEVNULL,
+                                        bufsize=self.w*self.h*3)
+        # the reader fills the back buffer and swaps it with the latest one once complete
+        self.latest = np.empty((self.h, self.w, 3), dtype=np.uint8)
+        self.back = np.empty((self.h, self.w, 3), dtype=np.uint8)
+        self.condition = Condition()
+        self.ended = False
+        t = Thread(target=self.read_stream, args=(self.process,), daemon=True)
+        t.start()
+
+    def read_stream(self, process):
+        """
+        decode every frame of ffmpeg into the back buffer, runs on its own thread
+        """
+        while True:
+            view = memoryview(self.back).cast("B")
+            filled = 0
+            while filled < len(view):
+                try:
+                    count = process.stdout.readinto(view[filled:])
+                except (OSError, ValueError):
+                    count = 0
+                if not count:
+                    # the stream was closed by the sender or ffmpeg was stopped
+                    self.condition.acquire()
+                    self.ended = True
+                    self.condition.notify_all()
+                    self.condition.release()
+                    return
+                filled += count
+            self.condition.acquire()
+            self.latest, self.back = self.back, self.latest
+            self.decoded_seq += 1
+            self.condition.notify_all()
+            self.condition.release()
+
+    def grab(self, out):
+        """
+        copy the newest decoded frame into out (h x w x 3 array), frames decoded
+        since the last grab except the newest one are dropped
+        """
+        if self.process is None:
+            self.open_stream()
+        self.condition.acquire()
+        while self.decoded_seq == self.grabbed_seq and not self.ended and not self.stopped:
+            self.condition.wait(0.1)
+        if self.decoded_seq == self.grabbed_seq:
+            self.condition.release()
+            return False
+        np.copyto(out, self.latest)
+        self.grabbed_seq = self.decoded_seq
+        self.condition.release()
+        return True
+
+    def release(self):
+        """
+        stop ffmpeg
+        """
+        if self.process is not None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+            self.process = None
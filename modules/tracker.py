@@ -0,0 +1,178 @@
+"""
+The tracker module gives the detections a stable identity between frames.
+Every track keeps a constant velocity estimate (alpha-beta filter); detections
+are associated to the predicted position of the tracks of the same class by IoU
+or distance, and a track that is not detected is kept alive for max_age seconds
+before it is dropped. Each update publishes a read-only Tracks snapshot.
+"""
+
+import numpy as np
+from itertools import count
+from modules.metrics import box_iou
+
+class Tracks:
+    def __init__(self, ids, classes, positions, velocities, boxes, ages, missed):
+        """
+        Constructor for the Tracks class
+
+        :param ids (ndarray): (n,) id of each track
+        :param classes (ndarray): (n,) class id of each track
+        :param positions (ndarray): (n,2) filtered midpoint in window coordinates
+        :param velocities (ndarray): (n,2) pixels per second
+        :param boxes (ndarray): (n,4) x1, y1, x2, y2 of the last detection, moved with the velocity
+        :param ages (ndarray): (n,) seconds since the track was created
+        :param missed (ndarray): (n,) consecutive updates without a detection, 0 if detected this frame
+        """
+        self.ids = ids
+        self.classes = classes
+        self.positions = positions
+        self.velocities = velocities
+        self.boxes = boxes
+        self.ages = ages
+        self.missed = missed
+        for array in (ids, classes, positions, velocities, boxes, ages, missed):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.ids)
+
+    def of_class(self, class_id, detected=True):
+        """
+        :param detected (boolean): only the tracks detected in the last frame
+        :return (ndarray): indices of the tracks of a class
+        """
+        mask = self.classes == class_id
+        if detected:
+            mask &= self.missed == 0
+        return np.flatnonzero(mask)
+
+    def find(self, track_id):
+        """
+        :return (int): index of the track, None if it is gone
+        """
+        index = np.flatnonzero(self.ids == track_id)
+        return int(index[0]) if len(index) else None
+
+    def speeds(self):
+        return np.hypot(self.velocities[:, 0], self.velocities[:, 1])
+
+class Tracker:
+    def __init__(self, max_age=0.5, max_distance=80, iou_threshold=0.3, alpha=0.7, beta=0.3):
+        """
+        Constructor for the Tracker class
+
+        :param max_age (float): seconds a track is kept without detection
+        :param max_distance (float): pixels between the predicted and detected midpoint to associate them
+        :param iou_threshold (float): IoU between the predicted and detected box to associate them
+        :param alpha (float): weight of the detection in the filtered position
+        :param beta (float): weight of the detection in the filtered velocity
+        """
+        self.max_age = max_age
+        self.max_distance = max_distance
+        self.iou_threshold = iou_threshold
+        self.alpha = alpha
+        self.beta = beta
+        self.next_id = count(1)
+        self.timestamp = None
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.classes = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros((0, 2), dtype=np.float32)
+        self.velocities = np.zeros((0, 2), dtype=np.float32)
+        self.boxes = np.zeros((0, 4), dtype=np.float32)
+        self.first_seen = np.zeros(0, dtype=np.float64)
+        self.last_seen = np.zeros(0, dtype=np.float64)
+        self.missed = np.zeros(0, dtype=np.int32)
+
+    def associate(self, predicted, predicted_boxes, midpoints, boxes):
+        """
+        greedily pair the tracks and detections of one class, closest first
+        :return: track indices and detection indices of the pairs
+        """
+        distance = np.hypot(predicted[:, None, 0] - midpoints[None, :, 0], predicted[:, None, 1] - midpoints[None, :, 1])
+        iou = box_iou(predicted_boxes, boxes)
+        allowed = (distance <= self.max_distance) | (iou >= self.iou_threshold)
+        tracks, detections = [], []
+        used_tracks = set()
+        used_detections = set()
+        for flat in np.argsort(np.where(allowed, distance, np.inf), axis=None):
+            i, j = divmod(int(flat), distance.shape[1])
+            if not allowed[i, j]:
+                break
+            if i in used_tracks or j in used_detections:
+                continue
+            used_tracks.add(i)
+            used_detections.add(j)
+            tracks.append(i)
+            detections.append(j)
+        return np.array(tracks, dtype=np.int64), np.array(detections, dtype=np.int64)
+
+    def update(self, results, timestamp):
+        """
+        associate the detections of a frame with the tracks
+
+        :param results (DetectionResults): detections of the frame
+        :param timestamp (float): time of the frame in seconds
+        :return (Tracks): snapshot of the live tracks
+        """
+        dt = 0.0 if self.timestamp is None else max(timestamp - self.timestamp, 1e-3)
+        self.timestamp = timestamp
+        # constant velocity prediction
+        offset = self.velocities*dt
+        predicted = self.positions + offset
+        moved_boxes = self.boxes + np.tile(offset, 2)
+        matched = np.zeros(len(self.ids), dtype=bool)
+        new_boxes, new_midpoints, new_classes = [], [], []
+
+        for class_id in range(results.num_classes):
+            boxes = results.boxes_of(class_id).astype(np.float32)
+            midpoints = results[class_id].astype(np.float32)
+            if len(boxes) == 0:
+                continue
+            track_indices = np.flatnonzero(self.classes == class_id)
+            unmatched = np.ones(len(boxes), dtype=bool)
+            if len(track_indices):
+                pairs, detections = self.associate(predicted[track_indices], moved_boxes[track_indices],
+                                                   midpoints, boxes)
+                if len(pairs):
+                    tracks = track_indices[pairs]
+                    residual = midpoints[detections] - predicted[tracks]
+                    self.positions[tracks] = predicted[tracks] + self.alpha*residual
+                    if dt > 0:
+                        self.velocities[tracks] += self.beta*residual/dt
+                    self.boxes[tracks] = boxes[detections]
+                    self.last_seen[tracks] = timestamp
+                    self.missed[tracks] = 0
+                    matched[tracks] = True
+                    unmatched[detections] = False
+            new_boxes.append(boxes[unmatched])
+            new_midpoints.append(midpoints[unmatched])
+            new_classes.append(np.full(unmatched.sum(), class_id, dtype=np.int64))
+
+        # tracks without detection coast with their velocity
+        coasting = ~matched
+        self.positions[coasting] = predicted[coasting]
+        self.boxes[coasting] = moved_boxes[coasting]
+        self.missed[coasting] += 1
+        alive = timestamp - self.last_seen <= self.max_age
+        for name in ("ids", "classes", "positions", "velocities", "boxes", "first_seen", "last_seen", "missed"):
+            setattr(self, name, getattr(self, name)[alive])
+
+        # new tracks for the remaining detections
+        if new_classes:
+            classes = np.concatenate(new_classes)
+            n = len(classes)
+            if n:
+                self.ids = np.concatenate([self.ids, [next(self.next_id) for _ in range(n)]]).astype(np.int64)
+                self.classes = np.concatenate([self.classes, classes])
+                self.positions = np.concatenate([self.positions, np.concatenate(new_midpoints)])
+                self.velocities = np.concatenate([self.velocities, np.zeros((n, 2), dtype=np.float32)])
+                self.boxes = np.concatenate([self.boxes, np.concatenate(new_boxes)])
+                self.first_seen = np.concatenate([self.first_seen, np.full(n, timestamp)])
+                self.last_seen = np.concatenate([self.last_seen, np.full(n, timestamp)])
+                self.missed = np.concatenate([self.missed, np.zeros(n, dtype=np.int32)])
+
+        return Tracks(self.ids.copy(), self.classes.copy(), self.positions.copy(), self.velocities.copy(),
+                      self.boxes.copy(), timestamp - self.first_seen, self.missed.copy())
+
+    def reset(self):
+        self.__init__(self.max_age, self.max_distance, self.iou_threshold, self.alpha, self.beta)
@@ -0,0 +1,125 @@
+"""
+The tuning module stores the inference configuration chosen by autotune.py.
+The cache is a json file keyed by the CPU model, the engine and its runtime
+version and a hash of the chosen model file, so a configuration is only reused
+on the machine it was measured on and is ignored once the model is re-exported
+or the runtime is upgraded.
+"""
+
+import os
+import json
+import glob
+import hashlib
+import platform
+from functools import lru_cache
+from modules.print import bcolors
+
+@lru_cache(maxsize=None)
+def cpu_model():
+    """
+    :return (string): brand name of the CPU, read once from the registry or /proc/cpuinfo
+    (py-cpuinfo takes seconds to start)
+    """
+    if os.name == "nt":
+        try:
+            import winreg
+            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"HARDWARE\DESCRIPTION\System\CentralProcessor\0")
+            return winreg.QueryValueEx(key, "ProcessorNameString")[0].strip()
+        except OSError:
+            pass
+    if os.path.exists("/proc/cpuinfo"):
+        with open("/proc/cpuinfo") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    return platform.processor() or platform.machine()
+
+def model_hash(model_path):
+    """
+    :param model_path (string): model file or directory (e.g. OpenVINO .xml and .bin)
+    :return (string): sha1 of the model files
+    """
+    if os.path.isdir(model_path):
+        files = sorted(glob.glob(os.path.join(model_path, "*.xml")) + glob.glob(os.path.join(model_path, "*.bin")))
+    else:
+        files = [model_path]
+    digest = hashlib.sha1()
+    for path in files:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+def engine_version(engine):
+    """
+    :param engine (string): name of the inference engine
+    :return (string): installed version of the runtime of the engine, None if it is not installed
+    """
+    if engine == "opencv":
+        import cv2
+        return cv2.__version__
+    from importlib.metadata import version, PackageNotFoundError
+    packages = {"openvino": ["openvino"], "onnxruntime": ["onnxruntime", "onnxruntime-openvino", "onnxruntime-gpu"],
+                "ultralytics": ["ultralytics"]}
+    for package in packages.get(engine, []):
+        try:
+            return version(package)
+        except PackageNotFoundError:
+            pass
+    return None
+
+def cache_key(config):
+    """
+    :param config (dict): tuned configuration with its engine and model_path
+    :return (string): key of the configuration, changes with the CPU, the runtime version and the model file
+    """
+    if not os.path.exists(config["model_path"]):
+        return None
+    return f"{cpu_model()} | {config['engine']} {engine_version(config['engine'])} | {model_hash(config['model_path'])}"
+
+def read_cache(cache_path):
+    if not os.path.exists(cache_path):
+        return {}
+    with open(cache_path) as file:
+        return json.load(file)
+
+def load_tuned_config(cache_path):
+    """
+    :param cache_path (string): json cache written by autotune.py
+    :return (dict): engine, model_path, imgsz, options and async_requests, None if this machine was
+                    not tuned or the chosen model or its runtime changed since
+    """
+    for key, config in read_cache(cache_path).items():
+        if key.startswith(cpu_model() + " | ") and key == cache_key(config):
+            return config
+    return None
+
+def save_tuned_config(cache_path, config):
+    """
+    record the configuration of this machine, replacing the previous one
+    :return (string): key of the configuration
+    """
+    cache = {key: value for key, value in read_cache(cache_path).items() if not key.startswith(cpu_model() + " | ")}
+    key = cache_key(config)
+    cache[key] = config
+    with open(cache_path, "w") as file:
+        json.dump(cache, file, indent=1)
+    return key
+
+def apply_tuned_config(settings, cache_path):
+    """
+    replace the inference settings of constants.py with the ones autotune.py chose on this machine
+
+    :param settings (dict): engine, model_path, imgsz, options and async_requests
+    :return (dict): the settings, every replaced value is printed
+    """
+    tuned = load_tuned_config(cache_path)
+    if tuned is None:
+        return settings
+    settings = dict(settings)
+    for name in ("engine", "model_path", "imgsz", "options", "async_requests"):
+        value = tuple(tuned[name]) if name == "imgsz" else tuned[name]
+        if value != settings[name]:
+            print(bcolors.OKBLUE + f"Tuned config: {name} {settings[name]} -> {value}" + bcolors.ENDC)
+            settings[name] = value
+    return settings
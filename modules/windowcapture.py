@@ -1,30 +1,29 @@
 import numpy as np
+import cv2 as cv
 import win32gui, win32ui, win32con,win32com.client
-from threading import Thread, Lock
 from ctypes import windll
+from threading import local, Lock
 import tkinter
-from time import time
 from constants import Constants
+from modules.framesource import FrameSource
 
-class WindowCapture:
+class WindowCapture(FrameSource):
 
-    # threading properties
-    stopped = True
-    lock = None
-    screenshot = None
     # properties
-    w = 0
-    h = 0
     hwnd = None
     cropped_x = 0
     cropped_y = 0
-    offset_x = 0
-    offset_y = 0
-    fps = 0
-    avg_fps = 0
+    # reused GDI objects of the capture thread
+    cDC = None
+    dataBitMap = None
 
     # constructor
-    def __init__(self, window_name=None):
+    def __init__(self, window_name=None, hwnd=None):
+        """
+        :param window_name (string): title of the window, the entire screen if None
+        :param hwnd (int): handle of the window, used instead of the title e.g. for one of several instances
+        """
+        super().__init__()
         # Make program aware of DPI scaling
         # https://stackoverflow.com/a/45911849
         user32 = windll.user32
@@ -36,11 +35,11 @@ class WindowCapture:
         self.scaling = int(dpi/deafault_dpi)
         # close tkinter
         root.destroy()
-        # create a thread lock object
-        self.lock = Lock()
         # find the handle for the window we want to capture.
         # if no window name is given, capture the entire screen
-        if window_name is None:
+        if hwnd is not None:
+            self.hwnd = hwnd
+        elif window_name is None:
             self.hwnd = win32gui.GetDesktopWindow()
         else:
             self.hwnd = win32gui.FindWindow(None, window_name)
@@ -69,6 +68,11 @@ class WindowCapture:
         self.cropped_x = self.border_pixels
         self.cropped_y = self.titlebar_pixels
 
+        # strip bitmap used by grab_regions, one per thread, and every one created to free them
+        self.region_cache = local()
+        self.region_caches = []
+        self.region_lock = Lock()
+
         # set the cropped coordinates offset so we can translate screenshot
         # images into actual screen positions
         self.offset_x = window_rect[0] + self.cropped_x
@@ -92,50 +96,116 @@ class WindowCapture:
             shell.SendKeys('%')
             win32gui.SetForegroundWindow(self.hwnd)
 
-    def get_dimension(self):
+    def grab(self, out):
         """
-        get the width and the height of the select window
-        """
-        return self.w,self.h
-
-    def get_screenshot(self):
-        """
-        take a screenshot
+        take a screenshot straight into out (h x w x 3 BGR array)
         """
         # get the window image data
         wDC = win32gui.GetWindowDC(self.window)
         dcObj = win32ui.CreateDCFromHandle(wDC)
-        cDC = dcObj.CreateCompatibleDC()
-        dataBitMap = win32ui.CreateBitmap()
-        dataBitMap.CreateCompatibleBitmap(dcObj, self.w, self.h)
-        cDC.SelectObject(dataBitMap)
-        cDC.BitBlt((0, 0), (self.w, self.h), dcObj, self.cropped, win32con.SRCCOPY)
+        # the memory DC and its bitmap are created once and reused for every frame
+        if self.dataBitMap is None:
+            self.cDC = dcObj.CreateCompatibleDC()
+            self.dataBitMap = win32ui.CreateBitmap()
+            self.dataBitMap.CreateCompatibleBitmap(dcObj, self.w, self.h)
+            self.cDC.SelectObject(self.dataBitMap)
+        self.cDC.BitBlt((0, 0), (self.w, self.h), dcObj, self.cropped, win32con.SRCCOPY)
 
         # convert the raw data into a format opencv can read
         #dataBitMap.SaveBitmapFile(cDC, 'debug.bmp')
-        signedIntsArray = dataBitMap.GetBitmapBits(True)
-        img = np.fromstring(signedIntsArray, dtype='uint8')
+        signedIntsArray = self.dataBitMap.GetBitmapBits(True)
+        img = np.frombuffer(signedIntsArray, dtype='uint8')
         img.shape = (self.h, self.w, 4)
 
         # free resources
         dcObj.DeleteDC()
-        cDC.DeleteDC()
         win32gui.ReleaseDC(self.hwnd, wDC)
-        win32gui.DeleteObject(dataBitMap.GetHandle())
-
-        # drop the alpha channel, or cv.matchTemplate() will throw an error like:
-        #   error: (-215:Assertion failed) (depth == CV_8U || depth == CV_32F) && type == _templ.type() 
-        #   && _img.dims() <= 2 in function 'cv::matchTemplate'
-        img = img[...,:3]
 
-        # make image C_CONTIGUOUS to avoid errors that look like:
-        #   File ... in draw_rectangles
-        #   TypeError: an integer is required (got type tuple)
-        # see the discussion here:
+        # drop the alpha channel while copying into the C_CONTIGUOUS output, or cv.matchTemplate()
+        # and the drawing functions will throw errors, see the discussion here:
         # https://github.com/opencv/opencv/issues/14866#issuecomment-580207109
-        img = np.ascontiguousarray(img)
+        cv.cvtColor(img, cv.COLOR_BGRA2BGR, dst=out)
+        return True
+
+    def grab_regions(self, regions, outs):
+        """
+        BitBlt every region side by side into one small strip bitmap and read it at once
+        """
+        if not regions:
+            return True
+        strip_w = sum(region[2] for region in regions)
+        strip_h = max(region[3] for region in regions)
+        cache = self.region_cache
+        # the strips may be freed by stop() while another thread grabs
+        self.region_lock.acquire()
+        wDC = win32gui.GetWindowDC(self.window)
+        dcObj = win32ui.CreateDCFromHandle(wDC)
+        if getattr(cache, "size", None) != (strip_w, strip_h):
+            self.free_strip(cache)
+            cache.cDC = dcObj.CreateCompatibleDC()
+            cache.bitmap = win32ui.CreateBitmap()
+            cache.bitmap.CreateCompatibleBitmap(dcObj, strip_w, strip_h)
+            cache.cDC.SelectObject(cache.bitmap)
+            cache.size = (strip_w, strip_h)
+            if cache not in self.region_caches:
+                self.region_caches.append(cache)
+        strip_x = 0
+        for x, y, w, h in regions:
+            cache.cDC.BitBlt((strip_x, 0), (w, h), dcObj, (self.cropped[0] + x, self.cropped[1] + y), win32con.SRCCOPY)
+            strip_x += w
+        strip = np.frombuffer(cache.bitmap.GetBitmapBits(True), dtype='uint8')
+        strip.shape = (strip_h, strip_w, 4)
 
-        return img
+        # free resources
+        dcObj.DeleteDC()
+        win32gui.ReleaseDC(self.hwnd, wDC)
+
+        strip_x = 0
+        for (x, y, w, h), out in zip(regions, outs):
+            cv.cvtColor(strip[:h, strip_x:strip_x + w], cv.COLOR_BGRA2BGR, dst=out)
+            strip_x += w
+        self.region_lock.release()
+        return True
+
+    @staticmethod
+    def free_strip(cache):
+        """
+        free the memory DC and bitmap of a grab_regions strip
+        """
+        if getattr(cache, "bitmap", None) is not None:
+            cache.cDC.DeleteDC()
+            win32gui.DeleteObject(cache.bitmap.GetHandle())
+        cache.cDC = None
+        cache.bitmap = None
+        cache.size = None
+
+    def free_strips(self):
+        """
+        free the grab_regions strip of every thread
+        """
+        self.region_lock.acquire()
+        for cache in self.region_caches:
+            self.free_strip(cache)
+        self.region_caches = []
+        self.region_lock.release()
+
+    def release(self):
+        """
+        free the reused memory DC and bitmap and the strips of grab_regions
+        """
+        if self.dataBitMap is not None:
+            self.cDC.DeleteDC()
+            win32gui.DeleteObject(self.dataBitMap.GetHandle())
+            self.cDC = None
+            self.dataBitMap = None
+        self.free_strips()
+
+    def stop(self):
+        """
+        stop the capture thread and free the strips of grab_regions, also when the thread was never started
+        """
+        super().stop()
+        self.free_strips()
 
     # find the name of the window you're interested in.
     # once you have it, update window_capture()
@@ -147,37 +217,17 @@ class WindowCapture:
                 print(hex(hwnd), f"\"{win32gui.GetWindowText(hwnd)}\"")
         win32gui.EnumWindows(winEnumHandler, None)
 
-    # threading methods
-    def start(self):
-        """
-        start windowcapture
+    @staticmethod
+    def find_windows(window_name):
         """
-        self.stopped = False
-        self.loop_time = time()
-        self.count = 0
-        t = Thread(target=self.run)
-        t.setDaemon(True)
-        t.start()
-
-    def stop(self):
+        find every visible window whose title starts with window_name
+        e.g. "Bluestacks App Player", "Bluestacks App Player 1", ...
+        :return (list): handle and title of each window, sorted by title
         """
-        stop windowcapture
-        """
-        self.stopped = True
-
-    def run(self):
-        while not self.stopped:
-            # get an updated image of the game
-            screenshot = self.get_screenshot()
-            # lock the thread while updating the results
-            self.lock.acquire()
-            self.screenshot = screenshot
-            self.lock.release()
-            
-            self.fps = (1 / (time() - self.loop_time))
-            self.loop_time = time()
-            self.count += 1
-            if self.count == 1:
-                self.avg_fps = self.fps
-            else:
-                self.avg_fps = (self.avg_fps*self.count+self.fps)/(self.count + 1)
\ No newline at end of file
+        windows = []
+        def winEnumHandler(hwnd, ctx):
+            title = win32gui.GetWindowText(hwnd)
+            if win32gui.IsWindowVisible(hwnd) and title.lower().startswith(window_name.lower()):
+                windows.append((hwnd, title))
+        win32gui.EnumWindows(winEnumHandler, None)
+        return sorted(windows, key=lambda window: window[1])
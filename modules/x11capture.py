@@ -0,0 +1,371 @@
+"""
+The x11capture module captures an X11 window (e.g. an Android emulator on Linux)
+through the MIT-SHM extension. The X server writes the window straight into a shared
+memory segment that is viewed as a numpy array without copying, and XDamage is used
+so the window is only fetched again when its content actually changed.
+The UI probes (grab_regions) fetch their few pixels with XGetImage on a second
+connection, so they see the window as it is now and not the last frame the
+governor let through, and do not wait on the damage events of the capture thread.
+It works under Xvfb, e.g. "Xvfb :99 & DISPLAY=:99 python detection_test.py".
+"""
+
+import ctypes
+import ctypes.util
+import select
+import numpy as np
+import cv2 as cv
+from time import time
+from threading import Lock
+from modules.framesource import FrameSource
+
+# Xlib types
+Display_p = ctypes.c_void_p
+Window = ctypes.c_ulong
+Bool = ctypes.c_int
+Status = ctypes.c_int
+
+ZPixmap = 2
+AllPlanes = ctypes.c_ulong(-1).value
+XDamageNotify = 0
+XDamageReportNonEmpty = 3
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+
+class XWindowAttributes(ctypes.Structure):
+    _fields_ = [("x", ctypes.c_int), ("y", ctypes.c_int),
+                ("width", ctypes.c_int), ("height", ctypes.c_int),
+                ("border_width", ctypes.c_int), ("depth", ctypes.c_int),
+                ("visual", ctypes.c_void_p), ("root", Window),
+                ("class", ctypes.c_int), ("bit_gravity", ctypes.c_int),
+                ("win_gravity", ctypes.c_int), ("backing_store", ctypes.c_int),
+                ("backing_planes", ctypes.c_ulong), ("backing_pixel", ctypes.c_ulong),
+                ("save_under", Bool), ("colormap", ctypes.c_ulong),
+                ("map_installed", Bool), ("map_state", ctypes.c_int),
+                ("all_event_masks", ctypes.c_long), ("your_event_mask", ctypes.c_long),
+                ("do_not_propagate_mask", ctypes.c_long), ("override_redirect", Bool),
+                ("screen", ctypes.c_void_p)]
+
+class XImage(ctypes.Structure):
+    _fields_ = [("width", ctypes.c_int), ("height", ctypes.c_int),
+                ("xoffset", ctypes.c_int), ("format", ctypes.c_int),
+                ("data", ctypes.c_void_p), ("byte_order", ctypes.c_int),
+                ("bitmap_unit", ctypes.c_int), ("bitmap_bit_order", ctypes.c_int),
+                ("bitmap_pad", ctypes.c_int), ("depth", ctypes.c_int),
+                ("bytes_per_line", ctypes.c_int), ("bits_per_pixel", ctypes.c_int),
+                ("red_mask", ctypes.c_ulong), ("green_mask", ctypes.c_ulong),
+                ("blue_mask", ctypes.c_ulong), ("obdata", ctypes.c_void_p),
+                ("funcs", ctypes.c_void_p * 6)]
+
+class XShmSegmentInfo(ctypes.Structure):
+    _fields_ = [("shmseg", ctypes.c_ulong), ("shmid", ctypes.c_int),
+                ("shmaddr", ctypes.c_void_p), ("readOnly", Bool)]
+
+class XEvent(ctypes.Structure):
+    # only the type is read, the rest of the 24 longs union is padding
+    _fields_ = [("type", ctypes.c_int), ("pad", ctypes.c_long * 24)]
+
+def load_library(name):
+    path = ctypes.util.find_library(name)
+    if path is None:
+        raise Exception(f"lib{name} not found. \nPlease install the X11 libraries to use the x11 capture backend")
+    return ctypes.CDLL(path)
+
+def load_xlib():
+    """
+    load Xlib, XShm (libXext), XDamage and libc and declare the functions used
+    """
+    x11 = load_library("X11")
+    xext = load_library("Xext")
+    xdamage = load_library("Xdamage")
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    signatures = [
+        (x11.XInitThreads, Status, []),
+        (x11.XOpenDisplay, Display_p, [ctypes.c_char_p]),
+        (x11.XCloseDisplay, ctypes.c_int, [Display_p]),
+        (x11.XDefaultRootWindow, Window, [Display_p]),
+        (x11.XDefaultScreen, ctypes.c_int, [Display_p]),
+        (x11.XDisplayWidth, ctypes.c_int, [Display_p, ctypes.c_int]),
+        (x11.XDisplayHeight, ctypes.c_int, [Display_p, ctypes.c_int]),
+        (x11.XConnectionNumber, ctypes.c_int, [Display_p]),
+        (x11.XQueryTree, Status, [Display_p, Window, ctypes.POINTER(Window), ctypes.POINTER(Window),
+                                  ctypes.POINTER(ctypes.POINTER(Window)), ctypes.POINTER(ctypes.c_uint)]),
+        (x11.XFetchName, Status, [Display_p, Window, ctypes.POINTER(ctypes.c_void_p)]),
+        (x11.XFree, ctypes.c_int, [ctypes.c_void_p]),
+        (x11.XGetWindowAttributes, Status, [Display_p, Window, ctypes.POINTER(XWindowAttributes)]),
+        (x11.XTranslateCoordinates, Bool, [Display_p, Window, Window, ctypes.c_int, ctypes.c_int,
+                                           ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int),
+                                           ctypes.POINTER(Window)]),
+        (x11.XRaiseWindow, ctypes.c_int, [Display_p, Window]),
+        (x11.XGetImage, ctypes.POINTER(XImage), [Display_p, Window, ctypes.c_int, ctypes.c_int, ctypes.c_uint,
+                                                  ctypes.c_uint, ctypes.c_ulong, ctypes.c_int]),
+        (x11.XFlush, ctypes.c_int, [Display_p]),
+        (x11.XSync, ctypes.c_int, [Display_p, Bool]),
+        (x11.XPending, ctypes.c_int, [Display_p]),
+        (x11.XNextEvent, ctypes.c_int, [Display_p, ctypes.POINTER(XEvent)]),
+        (xext.XShmQueryExtension, Bool, [Display_p]),
+        (xext.XShmCreateImage, ctypes.POINTER(XImage), [Display_p, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int,
+                                                         ctypes.c_void_p, ctypes.POINTER(XShmSegmentInfo),
+                                                         ctypes.c_uint, ctypes.c_uint]),
+        (xext.XShmAttach, Bool, [Display_p, ctypes.POINTER(XShmSegmentInfo)]),
+        (xext.XShmDetach, Bool, [Display_p, ctypes.POINTER(XShmSegmentInfo)]),
+        (xext.XShmGetImage, Bool, [Display_p, Window, ctypes.POINTER(XImage), ctypes.c_int, ctypes.c_int,
+                                   ctypes.c_ulong]),
+        (xdamage.XDamageQueryExtension, Bool, [Display_p, ctypes.POINTER(ctypes.c_int), ctypes.POINTER(ctypes.c_int)]),
+        (xdamage.XDamageCreate, ctypes.c_ulong, [Display_p, Window, ctypes.c_int]),
+        (xdamage.XDamageDestroy, None, [Display_p, ctypes.c_ulong]),
+        (xdamage.XDamageSubtract, None, [Display_p, ctypes.c_ulong, ctypes.c_ulong, ctypes.c_ulong]),
+        (libc.shmget, ctypes.c_int, [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]),
+        (libc.shmat, ctypes.c_void_p, [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]),
+        (libc.shmdt, ctypes.c_int, [ctypes.c_void_p]),
+        (libc.shmctl, ctypes.c_int, [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]),
+    ]
+    for function, restype, argtypes in signatures:
+        function.restype = restype
+        function.argtypes = argtypes
+    # the display is opened in the main thread and used by the capture thread
+    x11.XInitThreads()
+    return x11, xext, xdamage, libc
+
+class X11Capture(FrameSource):
+    # seconds to wait for a damage event before republishing the unchanged window
+    max_idle = 0.5
+    # properties
+    display = None
+    window = None
+    damage = None
+    image = None
+    # connection of grab_regions
+    region_display = None
+
+    def __init__(self, window_name=None, display_name=None):
+        """
+        Constructor for the X11Capture class
+
+        :param window_name (string): name of the window, the root window if None
+        :param display_name (string): X display e.g. ":99", defaults to $DISPLAY
+        """
+        super().__init__()
+        self.x11, self.xext, self.xdamage, self.libc = load_xlib()
+        self.display = self.x11.XOpenDisplay(display_name.encode() if display_name else None)
+        if not self.display:
+            raise Exception(f"Cannot open X display {display_name or '$DISPLAY'}")
+        if not self.xext.XShmQueryExtension(self.display):
+            raise Exception("The X server does not support the MIT-SHM extension")
+        self.root = self.x11.XDefaultRootWindow(self.display)
+        screen = self.x11.XDefaultScreen(self.display)
+        self.screen_resolution = (self.x11.XDisplayWidth(self.display, screen),
+                                  self.x11.XDisplayHeight(self.display, screen))
+
+        # find the window we want to capture
+        if window_name is None:
+            self.window = self.root
+        else:
+            self.window = self.find_window(window_name)
+            if self.window is None:
+                raise Exception(f"{window_name} not found. \nPlease open {window_name} or change the window_name at constants.py")
+
+        # get the window size, the X window is the client area so there is no border or titlebar to crop
+        attributes = XWindowAttributes()
+        self.x11.XGetWindowAttributes(self.display, self.window, ctypes.byref(attributes))
+        if attributes.depth not in (24, 32):
+            raise Exception(f"Unsupported window depth {attributes.depth}, only 24 and 32 bit windows can be captured")
+        self.w = attributes.width
+        self.h = attributes.height
+
+        # translate the window origin into screen coordinates
+        x, y, child = ctypes.c_int(), ctypes.c_int(), Window()
+        self.x11.XTranslateCoordinates(self.display, self.window, self.root, 0, 0,
+                                       ctypes.byref(x), ctypes.byref(y), ctypes.byref(child))
+        self.offset_x = x.value
+        self.offset_y = y.value
+        self.offsets = (self.offset_x, self.offset_y)
+        self.left = self.offset_x
+        self.top = self.offset_y
+        self.right = self.offset_x + self.w
+        self.bottom = self.offset_y + self.h
+
+        self.create_shared_image(attributes)
+        self.create_damage()
+        # the probes run in other threads than the capture, they get their own connection
+        self.region_lock = Lock()
+        self.region_display = self.x11.XOpenDisplay(display_name.encode() if display_name else None)
+
+    def create_shared_image(self, attributes):
+        """
+        create the XShm image and map its shared memory segment as a numpy array
+        """
+        self.shminfo = XShmSegmentInfo()
+        self.image = self.xext.XShmCreateImage(self.display, attributes.visual, attributes.depth, ZPixmap,
+                                               None, ctypes.byref(self.shminfo), self.w, self.h)
+        if not self.image:
+            raise Exception("XShmCreateImage failed")
+        image = self.image.contents
+        size = image.bytes_per_line * image.height
+        self.shminfo.shmid = self.libc.shmget(IPC_PRIVATE, size, IPC_CREAT | 0o600)
+        if self.shminfo.shmid < 0:
+            raise Exception(f"shmget failed with errno {ctypes.get_errno()}")
+        address = self.libc.shmat(self.shminfo.shmid, None, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            raise Exception(f"shmat failed with errno {ctypes.get_errno()}")
+        self.shminfo.shmaddr = address
+        self.shminfo.readOnly = False
+        image.data = address
+        self.xext.XShmAttach(self.display, ctypes.byref(self.shminfo))
+        self.x11.XSync(self.display, False)
+        # the segment is freed by the kernel once both processes detached from it
+        self.libc.shmctl(self.shminfo.shmid, IPC_RMID, None)
+
+        # little endian 32 bits per pixel ZPixmap is laid out as BGRA
+        buffer = (ctypes.c_ubyte * size).from_address(address)
+        rows = np.frombuffer(buffer, dtype=np.uint8).reshape(image.height, image.bytes_per_line)
+        self.shm_view = rows[:, :self.w*4].reshape(self.h, self.w, 4)
+
+    def create_damage(self):
+        """
+        subscribe to damage events of the window, without XDamage every grab refreshes
+        """
+        event_base, error_base = ctypes.c_int(), ctypes.c_int()
+        if self.xdamage.XDamageQueryExtension(self.display, ctypes.byref(event_base), ctypes.byref(error_base)):
+            self.damage_event = event_base.value + XDamageNotify
+            self.damage = self.xdamage.XDamageCreate(self.display, self.window, XDamageReportNonEmpty)
+            self.x11.XFlush(self.display)
+        # the first grab always fetches the window
+        self.damaged = True
+        self.last_refresh = 0
+
+    def find_window(self, window_name, window=None):
+        """
+        depth first search of the window tree for a window called window_name
+        """
+        window = self.root if window is None else window
+        if self.get_window_name(window) == window_name:
+            return window
+        for child in self.get_children(window):
+            found = self.find_window(window_name, child)
+            if found is not None:
+                return found
+        return None
+
+    def get_window_name(self, window):
+        name = ctypes.c_void_p()
+        if self.x11.XFetchName(self.display, window, ctypes.byref(name)) and name.value:
+            window_name = ctypes.string_at(name.value).decode(errors="replace")
+            self.x11.XFree(name)
+            return window_name
+        return None
+
+    def get_children(self, window):
+        root, parent = Window(), Window()
+        children = ctypes.POINTER(Window)()
+        count = ctypes.c_uint()
+        if not self.x11.XQueryTree(self.display, window, ctypes.byref(root), ctypes.byref(parent),
+                                   ctypes.byref(children), ctypes.byref(count)):
+            return []
+        windows = [children[i] for i in range(count.value)]
+        if children:
+            self.x11.XFree(children)
+        return windows
+
+    def set_window(self):
+        """
+        raise the selected window
+        """
+        self.x11.XRaiseWindow(self.display, self.window)
+        self.x11.XFlush(self.display)
+
+    def wait_for_damage(self):
+        """
+        wait until the window reports damage or max_idle seconds passed
+        """
+        if self.damage is None:
+            self.damaged = True
+            return
+        fd = self.x11.XConnectionNumber(self.display)
+        event = XEvent()
+        while not self.damaged:
+            while self.x11.XPending(self.display):
+                self.x11.XNextEvent(self.display, ctypes.byref(event))
+                if event.type == self.damage_event:
+                    self.damaged = True
+            remaining = self.last_refresh + self.max_idle - time()
+            if self.damaged or remaining <= 0 or self.stopped:
+                break
+            select.select([fd], [], [], remaining)
+
+    def grab(self, out):
+        """
+        copy the window into out, fetching it from the X server only when it changed
+        """
+        self.wait_for_damage()
+        if self.damaged:
+            if self.damage is not None:
+                # acknowledge the damage before fetching so no change is missed
+                self.xdamage.XDamageSubtract(self.display, self.damage, 0, 0)
+            self.xext.XShmGetImage(self.display, self.window, self.image, 0, 0, AllPlanes)
+            self.damaged = False
+        self.last_refresh = time()
+        # drop the alpha channel while copying into the ring slot
+        cv.cvtColor(self.shm_view, cv.COLOR_BGRA2BGR, dst=out)
+        return True
+
+    def grab_regions(self, regions, outs):
+        """
+        fetch every region from the X server with XGetImage instead of slicing the last frame
+        """
+        self.region_lock.acquire()
+        success = self.region_display is not None
+        for (x, y, w, h), out in zip(regions, outs):
+            if not success:
+                break
+            image = self.x11.XGetImage(self.region_display, self.window, x, y, w, h, AllPlanes, ZPixmap)
+            if not image:
+                success = False
+                break
+            contents = image.contents
+            buffer = (ctypes.c_ubyte * (contents.bytes_per_line*h)).from_address(contents.data)
+            rows = np.frombuffer(buffer, dtype=np.uint8).reshape(h, contents.bytes_per_line)
+            cv.cvtColor(rows[:, :w*4].reshape(h, w, 4), cv.COLOR_BGRA2BGR, dst=out)
+            # what XDestroyImage does for an image of XGetImage
+            self.x11.XFree(contents.data)
+            self.x11.XFree(image)
+        self.region_lock.release()
+        return success
+
+    def release(self):
+        """
+        detach the shared memory and close the displays
+        """
+        self.region_lock.acquire()
+        if self.region_display is not None:
+            self.x11.XCloseDisplay(self.region_display)
+            self.region_display = None
+        self.region_lock.release()
+        if self.display is None:
+            return
+        if self.damage is not None:
+            self.xdamage.XDamageDestroy(self.display, self.damage)
+            self.damage = None
+        if self.image is not None:
+            self.xext.XShmDetach(self.display, ctypes.byref(self.shminfo))
+            self.x11.XSync(self.display, False)
+            self.shm_view = None
+            self.libc.shmdt(self.shminfo.shmaddr)
+            # XDestroyImage would free the shared data, only free the struct
+            self.image.contents.data = None
+            self.x11.XFree(self.image)
+            self.image = None
+        self.x11.XCloseDisplay(self.display)
+        self.display = None
+
+    @staticmethod
+    def list_window_names():
+        capture = X11Capture()
+        def print_tree(window):
+            name = capture.get_window_name(window)
+            if name:
+                print(hex(window), f"\"{name}\"")
+            for child in capture.get_children(window):
+                print_tree(child)
+        print_tree(capture.root)
+        capture.release()
@@ -0,0 +1,133 @@
+"""
+Quantize the OpenVINO model to INT8 with frames of a recorded session.
+
+Every other frame is used to calibrate the model, the rest to compare the
+quantized model with the original one. The quantized model is written next to
+the original one with a report.json of the per class agreement and latency.
+Set quantized_model = True at constants.py to use it.
+
+usage: python quantize.py recordings/session_20231121_120000
+requires: pip install nncf
+"""
+
+import os
+import json
+import shutil
+import argparse
+import numpy as np
+from time import perf_counter
+from constants import Constants
+from modules.preprocess import Letterbox
+from modules.postprocess import YoloPostprocessor
+from modules.openvinoengine import OpenVINOEngine
+from modules.replaycapture import iter_recording
+from modules.metrics import match_boxes
+from modules.print import bcolors
+
+def load_tensors(recording, imgsz, step, max_frames):
+    """
+    letterbox the recorded frames into input tensors
+    """
+    tensors = []
+    letterbox = None
+    for frame in iter_recording(recording, step):
+        if letterbox is None:
+            letterbox = Letterbox((frame.shape[1], frame.shape[0]), imgsz)
+        tensors.append(letterbox.preprocess(frame, letterbox.new_tensor()))
+        if len(tensors) == max_frames:
+            break
+    if not tensors:
+        raise Exception(f"No frames found in {recording}")
+    return tensors
+
+def quantize(model_path, output_path, calibration):
+    """
+    calibrate and quantize the model, then save it as an IR
+    """
+    import nncf
+    import openvino as ov
+    core = ov.Core()
+    model = core.read_model(model_path)
+    # keep the box decoding of the head in floating point, as recommended for YOLOv8
+    ignored_scope = nncf.IgnoredScope(types=["Multiply", "Subtract", "Sigmoid"])
+    quantized = nncf.quantize(model, nncf.Dataset(calibration), preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(calibration), ignored_scope=ignored_scope)
+    os.makedirs(output_path, exist_ok=True)
+    ov.save_model(quantized, os.path.join(output_path, os.path.basename(model_path)))
+    # ultralytics needs the metadata to load the directory
+    metadata = os.path.join(os.path.dirname(model_path), "metadata.yaml")
+    if os.path.exists(metadata):
+        shutil.copy(metadata, output_path)
+
+def run_model(engine, postprocessor, tensors):
+    """
+    :return: boxes of every tensor and the latency of every inference in ms
+    """
+    boxes = []
+    latencies = []
+    for tensor in tensors:
+        start = perf_counter()
+        output = engine.infer(tensor)
+        latencies.append((perf_counter() - start)*1000)
+        boxes.append(postprocessor(output).copy())
+    return boxes, np.array(latencies)
+
+def compare(reference, quantized, classes):
+    """
+    per class agreement of the quantized detections with the original ones
+    """
+    report = {}
+    for class_id, name in enumerate(classes):
+        matched = reference_count = quantized_count = 0
+        for a, b in zip(reference, quantized):
+            a = a[a[:, 5] == class_id]
+            b = b[b[:, 5] == class_id]
+            matched += int(match_boxes(b, a).sum())
+            reference_count += len(a)
+            quantized_count += len(b)
+        total = reference_count + quantized_count
+        report[name] = {"original": reference_count, "quantized": quantized_count, "matched": matched,
+                        "agreement": round(2*matched/total, 4) if total else 1.0}
+    return report
+
+def latency_stats(latencies):
+    return {"mean": round(float(latencies.mean()), 3),
+            "p50": round(float(np.percentile(latencies, 50)), 3),
+            "p95": round(float(np.percentile(latencies, 95)), 3)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantize the OpenVINO model to INT8")
+    parser.add_argument("recording", help="session directory, video, image directory or .npy stack")
+    parser.add_argument("--model", default=Constants.openvino_model_path, help="OpenVINO model directory")
+    parser.add_argument("--output", default=Constants.quantized_model_path, help="directory of the quantized model")
+    parser.add_argument("--step", type=int, default=5, help="use every step-th recorded frame")
+    parser.add_argument("--frames", type=int, default=600, help="maximum number of frames")
+    args = parser.parse_args()
+
+    reference_engine = OpenVINOEngine(args.model)
+    tensors = load_tensors(args.recording, reference_engine.imgsz, args.step, args.frames)
+    calibration = tensors[0::2]
+    evaluation = tensors[1::2] or calibration
+    print(bcolors.OKBLUE + f"Calibrating on {len(calibration)} frames" + bcolors.ENDC)
+    quantize(reference_engine.model_path, args.output, calibration)
+
+    quantized_engine = OpenVINOEngine(args.output)
+    postprocessor = YoloPostprocessor(Constants.threshold)
+    # warm up both models before timing them
+    for engine in (reference_engine, quantized_engine):
+        for tensor in evaluation[:5]:
+            engine.infer(tensor)
+    reference_boxes, reference_latency = run_model(reference_engine, postprocessor, evaluation)
+    quantized_boxes, quantized_latency = run_model(quantized_engine, postprocessor, evaluation)
+
+    report = {"recording": args.recording,
+              "calibration_frames": len(calibration),
+              "evaluation_frames": len(evaluation),
+              "latency_ms": {"original": latency_stats(reference_latency),
+                             "quantized": latency_stats(quantized_latency)},
+              "classes": compare(reference_boxes, quantized_boxes, Constants.classes)}
+    with open(os.path.join(args.output, "report.json"), "w") as file:
+        json.dump(report, file, indent=1)
+
+    print(json.dumps(report, indent=1))
+    print(bcolors.OKGREEN + f"Quantized model saved at {args.output}" + bcolors.ENDC)
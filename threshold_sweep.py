@@ -0,0 +1,83 @@
+"""
+Find the best class thresholds from the candidates cached by benchmark.py --cache.
+
+The precision and recall of every class at every threshold from 0.01 to 0.99
+are computed in one pass over the cache, no inference is run. The threshold of
+each class is picked for the objective:
+    f1        - best F-beta score (--beta, F1 by default)
+    recall    - best recall with a precision of at least --min-precision
+    precision - best precision with a recall of at least --min-recall
+
+usage: python threshold_sweep.py predictions.npz [--objective f1] [--output sweep.json]
+"""
+
+import json
+import argparse
+import numpy as np
+from constants import Constants
+from modules.predictioncache import PredictionCache
+from modules.metrics import threshold_curve
+from modules.print import bcolors
+
+def score(precision, recall, args):
+    """
+    :return (ndarray): objective of every threshold, -inf where the constraint is not met
+    """
+    if args.objective == "f1":
+        beta2 = args.beta**2
+        return np.where(precision + recall > 0,
+                        (1 + beta2)*precision*recall/np.maximum(beta2*precision + recall, 1e-9), 0.0)
+    if args.objective == "recall":
+        return np.where(precision >= args.min_precision, recall, -np.inf)
+    return np.where(recall >= args.min_recall, precision, -np.inf)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the class thresholds from cached candidates")
+    parser.add_argument("cache", help="npz written by benchmark.py --cache")
+    parser.add_argument("--objective", choices=["f1", "recall", "precision"], default="f1")
+    parser.add_argument("--beta", type=float, default=1.0, help="weight of the recall in the F score")
+    parser.add_argument("--min-precision", type=float, default=0.9)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--output", help="json file of the curves and the best thresholds")
+    args = parser.parse_args()
+
+    cache = PredictionCache.load(args.cache)
+    thresholds = np.round(np.arange(1, 100)/100, 2)
+    thresholds = thresholds[thresholds >= cache.floor]
+    confidences = cache.columns["confidence"]
+    classes = cache.columns["class_id"]
+    tp = cache.columns["tp"]
+    label_classes = cache.labels["class_id"]
+
+    report = {"cache": args.cache, "frames": cache.frames, "objective": args.objective, "classes": {}}
+    best = []
+    for class_id, name in enumerate(cache.class_names):
+        mask = classes == class_id
+        n_targets = int((label_classes == class_id).sum())
+        precision, recall, kept = threshold_curve(confidences[mask], tp[mask], n_targets, thresholds)
+        objective = score(precision, recall, args)
+        # classes past the end of Constants.threshold get the lowest one
+        current = float(Constants.threshold[class_id] if class_id < len(Constants.threshold) else min(Constants.threshold))
+        if n_targets == 0 or not np.isfinite(objective).any():
+            # nothing to tune, keep the current threshold so the printed list stays a drop-in for constants.py
+            print(bcolors.WARNING + f"{name}: no threshold meets the objective, keeping {current}" + bcolors.ENDC)
+            best.append(current)
+            continue
+        # the highest threshold among equally good ones
+        i = len(objective) - 1 - np.argmax(objective[::-1])
+        best.append(float(thresholds[i]))
+        report["classes"][name] = {"labels": n_targets, "threshold": float(thresholds[i]),
+                                   "precision": round(float(precision[i]), 4), "recall": round(float(recall[i]), 4),
+                                   "current_threshold": current,
+                                   "curve": {"threshold": thresholds.tolist(),
+                                             "precision": np.round(precision, 4).tolist(),
+                                             "recall": np.round(recall, 4).tolist(),
+                                             "kept": kept.tolist()}}
+        print(bcolors.OKBLUE + f"{name}: threshold {thresholds[i]:.2f}, precision {precision[i]:.3f}, "
+              f"recall {recall[i]:.3f} (current {current})" + bcolors.ENDC)
+    report["best_thresholds"] = best
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=1)
+    print(bcolors.OKGREEN + f"threshold = {best}" + bcolors.ENDC)